@@ -0,0 +1,64 @@
+"""
+Throughput benchmark of the hashing engine in `wo.utils.io`.
+
+    python benchmarks/bench_hashing.py --size 256 --files 16
+"""
+import argparse, hashlib, tempfile, shutil, time, os
+
+from wo.utils import io
+
+
+def legacy_md5_file(filename):
+    hash_md5 = hashlib.md5()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def measure(name, function, total_bytes):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    print("{:<32} {:>8.2f} s {:>10.1f} MiB/s".format(name, elapsed, total_bytes / elapsed / 1024 ** 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=256, help="Size of the single large file, MiB")
+    parser.add_argument("--files", type=int, default=16, help="Number of files for multi-file hashing")
+    parser.add_argument("--file-size", type=int, default=16, help="Size of each of the files, MiB")
+    arguments = parser.parse_args()
+
+    # The hash index would turn repeated runs into lookups.
+    os.environ["WO_HASH_INDEX"] = ""
+    directory = tempfile.mkdtemp()
+    try:
+        large = os.path.join(directory, "large")
+        with open(large, "wb") as file:
+            file.write(os.urandom(arguments.size * 1024 ** 2))
+        small = []
+        for index in range(arguments.files):
+            small.append(os.path.join(directory, "file-{}".format(index)))
+            with open(small[-1], "wb") as file:
+                file.write(os.urandom(arguments.file_size * 1024 ** 2))
+
+        large_bytes = arguments.size * 1024 ** 2
+        small_bytes = arguments.files * arguments.file_size * 1024 ** 2
+
+        measure("md5, 4KiB reads (legacy)", lambda: legacy_md5_file(large), large_bytes)
+        measure("md5, io.hash_file", lambda: io.hash_file(large, "md5"), large_bytes)
+        try:
+            measure("crc32c, io.hash_file", lambda: io.hash_file(large, "crc32c"), large_bytes)
+        except ImportError:
+            print("crc32c skipped, google-crc32c is not installed")
+        measure("md5 x{}, serial (legacy)".format(arguments.files), 
+            lambda: [legacy_md5_file(f) for f in small], small_bytes)
+        measure("md5 x{}, io.hash_files".format(arguments.files), 
+            lambda: io.hash_files(small, "md5"), small_bytes)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
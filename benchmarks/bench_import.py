@@ -0,0 +1,40 @@
+"""
+Import-time benchmark of `wo`.
+
+    python benchmarks/bench_import.py --runs 10
+
+Each run imports the package in a fresh interpreter, so the timings include
+everything loaded by `import wo`, but not the interpreter start-up itself.
+"""
+import argparse, statistics, subprocess, sys
+
+
+SCRIPT = """
+import time, sys
+started = time.perf_counter()
+import wo
+elapsed = time.perf_counter() - started
+heavy = [m for m in ("boto3", "botocore", "google.cloud.storage", "mlflow") if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10, help="Number of fresh interpreters to import in")
+    arguments = parser.parse_args()
+
+    timings, heavy = [], ""
+    for _ in range(arguments.runs):
+        output = subprocess.run([sys.executable, "-c", SCRIPT], check=True, 
+            stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+        timings.append(float(output[0]))
+        heavy = output[1] if len(output) > 1 else ""
+
+    print("import wo: median {:.1f} ms, min {:.1f} ms, max {:.1f} ms over {} runs".format(
+        statistics.median(timings) * 1000, min(timings) * 1000, max(timings) * 1000, arguments.runs))
+    print("heavy modules loaded: {}".format(heavy or "none"))
+
+
+if __name__ == "__main__":
+    main()
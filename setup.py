@@ -19,7 +19,7 @@ setup(
     install_requires=[
         "mlflow~=1.0",
         "boto3~=1.9.197",
-        "google-cloud-storage~=1.16.1",
+        "google-cloud-storage~=1.33",
     ],
     setup_requires=[
         'pytest-runner'
@@ -0,0 +1,207 @@
+import wo, os, pytest
+import logging
+
+from wo.cloud.local import LocalStorage
+from wo.cloud.registry import Backends
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.storage import Storage
+from wo.utils import io
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def make_tree(root, files):
+    for relpath, data in files.items():
+        root.join(relpath).write_binary(data, ensure=True)
+
+
+def read_tree(root):
+    return dict((relpath, open(path, "rb").read()) for path, relpath in io.walk_files(str(root)))
+
+
+# Tests 
+# -----
+
+def test_registry():
+    assert {"s3", "gs", "file", "memory"} <= set(Backends.schemes())
+    with pytest.raises(ValueError):
+        io.parse_uri("unknown://bucket/key")
+
+    stub = StubStorage(scheme="custom")
+    Backends.register("custom", lambda: stub)
+    assert io.parse_uri("custom://bucket/key") == ("custom", "bucket", "key")
+    assert Storage()._backend("custom") is stub
+
+
+def test_local_backend(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    files = {"a": b"a", "sub/b": b"b" * 1000}
+    make_tree(tmpdir.join("out"), files)
+    remote = "file://{}/remote".format(tmpdir)
+    storage = Storage()
+
+    storage.upload_prefix("out", remote)
+    assert read_tree(tmpdir.join("remote")) == files
+    assert os.stat("out/a").st_ino != os.stat(str(tmpdir.join("remote", "a"))).st_ino
+    assert sorted(relpath for _, relpath in storage.list_prefix(remote)) == ["a", "sub/b"]
+
+    storage.download_prefix(remote, "in")
+    assert read_tree(tmpdir.join("in")) == files
+    with storage.open(remote + "/a", "wb") as file:
+        file.write(b"changed")
+    assert tmpdir.join("in", "a").read_binary() == b"a"
+
+    assert storage.sync_prefix(remote, "synced") == 2
+    assert read_tree(tmpdir.join("synced")) == {"a": b"changed", "sub/b": b"b" * 1000}
+    with storage.open(remote + "/sub/b") as file:
+        file.seek(998)
+        assert file.read() == b"bb"
+
+
+def test_local_writer_is_atomic(tmpdir):
+    bucket, path = str(tmpdir).strip("/"), str(tmpdir.join("object"))
+    with LocalStorage.open(bucket, "object", "wb") as file:
+        file.write(b"contents")
+    assert file.committed
+
+    file = LocalStorage.open(bucket, "object", "wb")
+    file.write(b"trunc")
+    del file
+    with pytest.raises(RuntimeError):
+        with LocalStorage.open(bucket, "object", "wb") as file:
+            file.write(b"trunc")
+            raise RuntimeError()
+    assert not file.committed
+    assert open(path, "rb").read() == b"contents"
+    assert os.listdir(str(tmpdir)) == ["object"]
+
+
+def test_memory_backend(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    make_tree(tmpdir.join("out"), {"a": b"a", "sub/b": b"b"})
+    storage = Storage()
+
+    storage.upload_prefix("out", "memory://bucket/run")
+    assert storage.object_exists("memory://bucket/run/sub/b")
+    storage.download_prefix("memory://bucket/run", "in")
+    assert read_tree(tmpdir.join("in")) == {"a": b"a", "sub/b": b"b"}
+
+
+def test_copy_within_storage():
+    stub = StubStorage(scheme="copies")
+    Backends.register("copies", lambda: stub)
+    for relpath in ("a", "sub/b"):
+        stub.write_object("staging", "model/" + relpath, relpath.encode() * 100)
+    storage = Storage()
+
+    assert storage.copy_prefix("copies://staging/model", "copies://prod/model") == 2
+    assert stub.read_object("prod", "model/sub/b") == b"sub/b" * 100
+    copied = []
+    stub.copy_object = lambda *args, **kwargs: copied.append(args)
+    storage.copy_prefix("copies://staging/model", "copies://prod/model")
+    storage.copy("copies://staging/model/a", "copies://prod/model/a")
+    assert copied == []
+
+    stub.write_object("staging", "model/a", b"changed")
+    storage.copy_prefix("copies://staging/model", "copies://prod/model")
+    assert copied == [("staging", "model/a", "prod", "model/a")]
+    with pytest.raises(FileNotFoundError):
+        storage.copy("copies://staging/missing", "copies://prod/missing")
+
+
+def test_copy_across_storages(tmpdir):
+    storage = Storage()
+    storage.transfer_config = wo.TransferConfig(part_size=1024)
+    data = os.urandom(5000)
+    with storage.open("memory://bucket/release/weights", "wb") as file:
+        file.write(data)
+
+    remote = "file://{}/mirror".format(tmpdir)
+    storage.copy("memory://bucket/release/weights", remote + "/weights")
+    assert tmpdir.join("mirror", "weights").read_binary() == data
+    storage.copy_prefix(remote, "memory://bucket/restored")
+    with storage.open("memory://bucket/restored/weights") as file:
+        assert file.read() == data
+
+
+def test_manifest_is_not_data(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    make_tree(tmpdir.join("out"), {"a": b"a", "sub/b": b"b"})
+    storage = Storage()
+    storage.sync_prefix("out", "memory://bucket/synced")
+
+    assert sorted(relpath for _, relpath in storage.list_prefix("memory://bucket/synced")) == ["a", "sub/b"]
+    assert sorted(relpath for relpath, _ in storage.iter_objects("memory://bucket/synced")) == ["a", "sub/b"]
+    storage.download_prefix("memory://bucket/synced", "in", shard=wo.Shard(0, 1))
+    assert read_tree(tmpdir.join("in")) == {"a": b"a", "sub/b": b"b"}
+
+
+def test_sharded_sync_keeps_other_shards(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    files = dict(("part-{}".format(index), str(index).encode()) for index in range(20))
+    make_tree(tmpdir.join("out"), files)
+    storage = Storage()
+    storage.upload_prefix("out", "memory://bucket/sharded")
+
+    for rank in range(2):
+        storage.sync_prefix("memory://bucket/sharded", "in", delete=True, shard=wo.Shard(rank, 2))
+    assert read_tree(tmpdir.join("in")) == files
+
+    deleted = ["part-{}".format(index) for index in range(5)]
+    for relpath in deleted:
+        storage._backend("memory").delete_object("bucket", "sharded/" + relpath)
+        del files[relpath]
+    storage.sync_prefix("memory://bucket/sharded", "in", delete=True, shard=wo.Shard(0, 2))
+    remaining = set(read_tree(tmpdir.join("in")))
+    assert set(files) <= remaining
+    assert remaining - set(files) == set(relpath for relpath in deleted if not wo.Shard(0, 2).owns(relpath))
+    storage.sync_prefix("memory://bucket/sharded", "in", delete=True, shard=wo.Shard(1, 2, balance=True))
+    assert read_tree(tmpdir.join("in")) == files
+
+
+def test_orchestrator_open_modes(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("local").write_binary(b"local")
+    orchestrator = wo.Orchestrator(dev=True)
+    with orchestrator.open("memory://bucket/opened", "wb") as file:
+        file.write(b"remote")
+    with orchestrator.open("memory://bucket/opened") as file:
+        assert file.read() == b"remote"
+    with orchestrator.open("local") as file:
+        assert file.read() == "local"
+
+
+def test_manifest_records_uploaded_contents(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    make_tree(tmpdir.join("out"), {"a": b"old"})
+    storage = Storage()
+    upload_file = storage.upload_file
+    def rewriting_upload_file(source_path, destination_path, *args, **kwargs):
+        upload_file(source_path, destination_path, *args, **kwargs)
+        make_tree(tmpdir.join("out"), {"a": b"new"})
+    storage.upload_file = rewriting_upload_file
+    storage.sync_prefix("out", "memory://bucket/rewritten")
+    del storage.upload_file
+
+    storage.sync_prefix("out", "memory://bucket/rewritten")
+    with storage.open("memory://bucket/rewritten/a") as file:
+        assert file.read() == b"new"
+
+
+def test_sharded_download_of_missing_prefix(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    make_tree(tmpdir.join("out"), {"a": b"a"})
+    storage = Storage()
+    storage.upload_prefix("out", "memory://bucket/single")
+
+    # Another worker may get no files, but a missing prefix is not an empty shard
+    for rank in range(2):
+        storage.download_prefix("memory://bucket/single", "in", shard=wo.Shard(rank, 2))
+    assert read_tree(tmpdir.join("in")) == {"a": b"a"}
+    for shard in (wo.Shard(0, 2), wo.Shard(0, 2, balance=True)):
+        with pytest.raises(ValueError):
+            storage.download_prefix("memory://bucket/misspelled", "in", shard=shard)
@@ -0,0 +1,87 @@
+import wo, os, pytest
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def write_file(path, size):
+    with open(path, "wb") as file:
+        file.write(os.urandom(size))
+    return path
+
+
+# Tests 
+# -----
+
+@pytest.fixture
+def cache(tmpdir):
+    yield wo.DownloadCache(str(tmpdir.join("cache")), max_bytes=1000)
+
+
+def test_cache_miss_and_hit(cache, tmpdir):
+    source = write_file(str(tmpdir.join("source")), 100)
+    destination = str(tmpdir.join("destination"))
+
+    assert not cache.fetch("s3://bucket", "key", "digest", destination)
+    cache.store("s3://bucket", "key", "digest", source)
+    assert cache.fetch("s3://bucket", "key", "digest", destination)
+
+    with open(source, "rb") as expected, open(destination, "rb") as actual:
+        assert expected.read() == actual.read()
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_cache_keyed_by_digest(cache, tmpdir):
+    source = write_file(str(tmpdir.join("source")), 100)
+    cache.store("s3://bucket", "key", "old", source)
+    assert not cache.fetch("s3://bucket", "key", "new", str(tmpdir.join("destination")))
+
+
+def test_cache_evicts_least_recently_used(cache, tmpdir):
+    for index in range(4):
+        source = write_file(str(tmpdir.join("source-{}".format(index))), 300)
+        cache.store("s3://bucket", str(index), "digest", source)
+        if index == 2:
+            assert cache.fetch("s3://bucket", "0", "digest", str(tmpdir.join("destination")))
+
+    assert cache.evictions == 1
+    assert not cache.fetch("s3://bucket", "1", "digest", str(tmpdir.join("destination")))
+    assert cache.fetch("s3://bucket", "0", "digest", str(tmpdir.join("destination")))
+
+
+def test_cache_entry_is_independent(cache, tmpdir):
+    source = write_file(str(tmpdir.join("source")), 100)
+    mode = os.stat(source).st_mode
+    cache.store("s3://bucket", "key", "digest", source)
+    assert os.stat(source).st_mode == mode
+    with open(source, "r+b") as file:
+        file.write(b"changed")
+    destination = str(tmpdir.join("destination"))
+    assert cache.fetch("s3://bucket", "key", "digest", destination)
+    assert open(destination, "rb").read(7) != b"changed"
+
+    # Copied destinations stay writable
+    assert os.stat(destination).st_mode & 0o200 and os.stat(destination).st_nlink == 1
+    with open(destination, "r+b") as file:
+        file.write(b"changed")
+    assert cache.fetch("s3://bucket", "key", "digest", str(tmpdir.join("other")))
+    assert open(str(tmpdir.join("other")), "rb").read(7) != b"changed"
+
+
+def test_cache_links_on_request(tmpdir):
+    cache = wo.DownloadCache(str(tmpdir.join("cache")), max_bytes=1000, link=True)
+    source = write_file(str(tmpdir.join("source")), 100)
+    cache.store("s3://bucket", "key", "digest", source)
+    destination = str(tmpdir.join("destination"))
+    assert cache.fetch("s3://bucket", "key", "digest", destination)
+    assert os.stat(destination).st_nlink == 2
+
+    # A hardlinked destination, modified in place, e.g. by root, does not corrupt later fetches
+    os.chmod(destination, 0o644)
+    with open(destination, "r+b") as file:
+        file.write(b"changed")
+    assert not cache.fetch("s3://bucket", "key", "digest", str(tmpdir.join("other")))
@@ -0,0 +1,63 @@
+import wo, os, random, pytest
+import logging
+
+from wo.orchestrator.storage import Storage
+from wo.utils.chunking import chunk_boundaries
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SIZES = dict(min_size=4 * 1024, avg_size=16 * 1024, max_size=64 * 1024)
+
+
+# Helper functions
+# ----------------
+
+def random_bytes(size, seed=0):
+    return random.Random(seed).getrandbits(8 * size).to_bytes(size, "little")
+
+
+# Tests 
+# -----
+
+def test_chunk_boundaries():
+    data = random_bytes(1024 ** 2)
+    chunks = list(chunk_boundaries(data, **SIZES))
+    assert sum(size for _, size in chunks) == len(data)
+    assert all(SIZES["min_size"] <= size <= SIZES["max_size"] for _, size in chunks[:-1])
+    assert list(chunk_boundaries(b"", **SIZES)) == []
+    assert list(chunk_boundaries(b"\0" * 100000, **SIZES)) == [(0, 65536), (65536, 34464)]
+
+    edited = data[:500000] + b"inserted" + data[500000:]
+    original = set(data[offset:offset + size] for offset, size in chunks)
+    shared = [edited[offset:offset + size] in original for offset, size in chunk_boundaries(edited, **SIZES)]
+    assert shared.count(False) <= 2
+
+
+def test_chunked_roundtrip(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    storage, data = Storage(), random_bytes(1024 ** 2)
+    tmpdir.join("model.bin").write_binary(data)
+
+    total = storage.upload_chunked("model.bin", "memory://bucket/model.bin", **SIZES)
+    assert total > 10
+    assert storage.upload_chunked("model.bin", "memory://bucket/model.bin", **SIZES) == 0
+    assert storage.download_file("memory://bucket/model.bin", "copy.bin", chunked=True) == total
+    assert tmpdir.join("copy.bin").read_binary() == data
+
+    edited = data[:300000] + b"X" * 100 + data[300100:]
+    tmpdir.join("model.bin").write_binary(edited)
+    assert 0 < storage.upload_chunked("model.bin", "memory://bucket/model.bin", **SIZES) <= 2
+    assert 0 < storage.download_chunked("memory://bucket/model.bin", "copy.bin") <= 2
+    assert tmpdir.join("copy.bin").read_binary() == edited
+
+
+def test_plain_object_is_not_a_recipe(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("plain").write_binary(b"plain contents")
+    storage = Storage()
+    storage.upload_file("plain", "memory://bucket/plain")
+    storage.download_file("memory://bucket/plain", "copy", chunked=True)
+    assert tmpdir.join("copy").read_binary() == b"plain contents"
+    with pytest.raises(FileNotFoundError):
+        storage.download_chunked("memory://bucket/missing", "missing")
@@ -0,0 +1,42 @@
+import os, threading, pytest
+import logging
+
+from wo.cloud.clients import Clients
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Tests 
+# -----
+
+@pytest.fixture(autouse=True)
+def reset():
+    max_pool_connections = Clients.max_pool_connections
+    Clients.reset()
+    yield
+    Clients.configure(max_pool_connections)
+    Clients.reset()
+
+
+def test_s3_client_is_shared_between_threads():
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(Clients.s3("us-east-1"))) for _ in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len({id(client) for client in clients}) == 1
+
+
+def test_s3_client_per_region():
+    assert Clients.s3("us-east-1") is not Clients.s3("eu-west-1")
+
+
+def test_configure_pool_size():
+    Clients.configure(max_pool_connections=33)
+    assert Clients.s3("us-east-1").meta.config.max_pool_connections == 33
+
+
+def test_reset_drops_clients():
+    client = Clients.s3("us-east-1")
+    Clients.reset()
+    assert Clients.s3("us-east-1") is not client
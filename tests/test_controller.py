@@ -0,0 +1,88 @@
+import wo, os, pytest
+import logging, botocore.exceptions
+
+from wo.cloud.controller import RequestController, ThrottlingError, classify, THROTTLED, RETRYABLE
+from wo.cloud.stub import StubStorage
+from wo.utils.transfer import TransferPool
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def client_error(code, status):
+    response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+    return botocore.exceptions.ClientError(response, "HeadObject")
+
+
+def upload_all(stub, tmpdir, count=200, concurrency=16):
+    tmpdir.join("file").write_binary(b"contents")
+    tasks = ((str(tmpdir.join("file")), "key-{}".format(index)) for index in range(count))
+    TransferPool(concurrency).run(lambda source, key: stub.upload_file("bucket", source, key, cache=False), tasks)
+
+
+# Tests 
+# -----
+
+def test_classify():
+    assert classify(client_error("SlowDown", 503)) == THROTTLED
+    assert classify(client_error("InternalError", 500)) == RETRYABLE
+    assert classify(client_error("404", 404)) is None
+    assert classify(ThrottlingError()) == THROTTLED
+    assert classify(ConnectionError()) == RETRYABLE
+    assert classify(ValueError()) is None
+
+
+def test_classify_wrapped_errors():
+    import boto3.exceptions
+    try:
+        try:
+            raise client_error("SlowDown", 503)
+        except botocore.exceptions.ClientError:
+            raise boto3.exceptions.S3UploadFailedError("Failed to upload")
+    except Exception as e:
+        assert classify(e) == THROTTLED
+    try:
+        try:
+            raise ConnectionError()
+        except ConnectionError:
+            raise ValueError("Unrelated error")
+    except Exception as e:
+        assert classify(e) is None
+
+
+def test_controller_does_not_retry_permanent_errors():
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        RequestController(sleep=lambda delay: None).call(request)
+    assert len(attempts) == 1
+
+
+def test_controller_gives_up_after_max_attempts():
+    controller = RequestController(max_attempts=3, sleep=lambda delay: None)
+    with pytest.raises(ThrottlingError):
+        controller.call(lambda: (_ for _ in ()).throw(ThrottlingError()))
+    assert controller.retries == 2
+
+
+def test_controller_retries_transient_failures(tmpdir):
+    stub = StubStorage(failure_rate=0.3, seed=0, controller=RequestController(sleep=lambda delay: None))
+    upload_all(stub, tmpdir)
+    assert len(stub.objects) == 200
+    assert stub.controller.retries > 0
+
+
+def test_controller_adapts_to_throttling(tmpdir):
+    controller = RequestController(max_concurrency=32, cooldown=0.0, base_delay=0.001)
+    stub = StubStorage(capacity=4, latency=0.002, controller=controller)
+    upload_all(stub, tmpdir, concurrency=32)
+    assert len(stub.objects) == 200
+    assert controller.throttles > 0
+    assert controller.limit < 32
@@ -0,0 +1,117 @@
+import logging
+
+from wo.cloud.local import LocalStorage
+from wo.cloud.registry import Backends
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.storage import Storage
+from wo.utils.filters import PathFilter
+from wo.utils import io
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+FILES = ("a.npz", "b.csv", "train/x.npz", "train/y.csv", "train/deep/z.npz", "test/x.npz")
+
+
+def make_stub(scheme):
+    stub = StubStorage(scheme=scheme)
+    Backends.register(scheme, lambda: stub)
+    for relpath in FILES:
+        stub.write_object("bucket", "data/" + relpath, relpath.encode())
+
+    listed, list_page = [], stub._list
+    def recording_list(bucket, prefix, *args):
+        listed.append(prefix)
+        return list_page(bucket, prefix, *args)
+    stub._list = recording_list
+    return stub, listed
+
+
+# Tests
+# -----
+
+def test_path_filter():
+    path_filter = PathFilter(include=["*.npz", "train/"], exclude="**/deep/**")
+    assert [relpath for relpath in FILES if path_filter.matches(relpath)] == \
+        ["a.npz", "train/x.npz", "train/y.csv", "test/x.npz"]
+    assert PathFilter(max_depth=1).matches("a.npz") and not PathFilter(max_depth=1).matches("train/x.npz")
+    assert PathFilter("train/[!y]*").matches("train/x.npz") and not PathFilter("train/[!y]*").matches("train/y.csv")
+    assert PathFilter("train/**/*.npz").matches("train/deep/z.npz")
+    assert PathFilter("train/**/*.npz").matches("train/x.npz")
+    assert PathFilter.from_options() is None
+
+    assert path_filter.prefixes() == [""]
+    assert PathFilter(["train/**/*.npz", "train/deep/*", "test/x.npz"]).prefixes() == ["test/x.npz", "train/"]
+    assert PathFilter("train/").contains("train") and not PathFilter("train/").contains("test")
+
+
+def test_listing_is_narrowed(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    stub, listed = make_stub("filtered")
+    storage = Storage()
+
+    files = list(storage.list_prefix("filtered://bucket/data", include=["train/**/*.npz", "test/*.npz"]))
+    assert files == [
+        ("filtered://bucket/data/test/x.npz", "test/x.npz"),
+        ("filtered://bucket/data/train/deep/z.npz", "train/deep/z.npz"),
+        ("filtered://bucket/data/train/x.npz", "train/x.npz"),
+    ]
+    assert listed == ["data/test/", "data/train/"]
+
+    entries = [relpath for _, relpath in storage.list_prefix("filtered://bucket/data", delimiter="/")]
+    assert entries == ["a.npz", "b.csv", "test/", "train/"]
+    entries = [relpath for _, relpath in storage.list_prefix("filtered://bucket/data", delimiter="/",
+        exclude="test/")]
+    assert entries == ["a.npz", "b.csv", "train/"]
+    assert [relpath for _, relpath in storage.list_prefix("filtered://bucket/data", max_depth=1)] == \
+        ["a.npz", "b.csv"]
+
+
+def test_download_prefix_filtered(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    stub, listed = make_stub("selective")
+    storage = Storage()
+
+    storage.download_prefix("selective://bucket/data", "data", include="train/*", exclude="*.csv")
+    assert sorted(relpath for _, relpath in io.walk_files("data")) == ["train/x.npz"]
+    assert listed == ["data/train/"]
+
+    # A filter, which selects nothing, is not an error
+    assert storage.download_prefix("selective://bucket/data", "data", include="valid/*") == 0
+
+
+def test_upload_prefix_filtered(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    for relpath in FILES:
+        tmpdir.join("data", relpath).write_binary(relpath.encode(), ensure=True)
+    stub = StubStorage(scheme="outputs")
+    Backends.register("outputs", lambda: stub)
+    storage = Storage()
+
+    storage.upload_prefix("data", "outputs://bucket/data", exclude=["*.csv", "train/deep/"])
+    assert sorted(key for _, key in stub.objects) == ["data/a.npz", "data/test/x.npz", "data/train/x.npz"]
+
+
+def test_packed_prefix_filtered(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    for relpath in FILES:
+        tmpdir.join("data", relpath).write_binary(relpath.encode(), ensure=True)
+    storage = Storage()
+
+    storage.upload_packed("data", "memory://bucket/packed-filtered", shard_size=16)
+    assert storage.download_packed("memory://bucket/packed-filtered", "restored", include="test/**") == 1
+    assert [relpath for _, relpath in io.walk_files("restored")] == ["test/x.npz"]
+
+
+def test_local_backend_delimiter(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    for relpath in FILES:
+        tmpdir.join("data", relpath).write_binary(relpath.encode(), ensure=True)
+
+    infos = list(LocalStorage.list_objects(str(tmpdir).strip("/"), "data/", delimiter="/"))
+    assert [(info.key, info.size) for info in infos] == \
+        [("data/a.npz", 5), ("data/b.csv", 5), ("data/test/", None), ("data/train/", None)]
@@ -0,0 +1,37 @@
+import subprocess, sys, json
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def run_isolated(script):
+    output = subprocess.run([sys.executable, "-c", script], check=True, 
+        stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output)
+
+
+# Tests 
+# -----
+
+def test_import_does_not_load_sdks():
+    loaded = run_isolated(
+        "import sys, json, wo; "
+        "print(json.dumps([m for m in ('boto3', 'botocore', 'google.cloud.storage', 'google.auth', 'mlflow') "
+        "if m in sys.modules]))")
+    assert loaded == []
+
+
+def test_import_does_not_configure_logging():
+    handlers = run_isolated("import logging, json, wo; print(json.dumps(len(logging.getLogger().handlers)))")
+    assert handlers == 0
+
+
+def test_s3_does_not_load_other_sdks():
+    loaded = run_isolated(
+        "import sys, json, wo; wo.Orchestrator(dev=True)._backend('s3'); "
+        "print(json.dumps([m for m in ('boto3', 'google.cloud.storage', 'mlflow') if m in sys.modules]))")
+    assert loaded == ["boto3"]
@@ -0,0 +1,93 @@
+import wo, os, pytest, hashlib
+import logging
+
+from wo.utils import io
+from wo.utils.hashindex import HashIndex
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Tests 
+# -----
+
+@pytest.fixture
+def index(tmpdir, monkeypatch):
+    monkeypatch.setenv("WO_HASH_INDEX", str(tmpdir.join("hashes.db")))
+    yield HashIndex.default()
+    HashIndex.reset()
+
+
+def test_md5_file(index, tmpdir):
+    path = tmpdir.join("file")
+    path.write_binary(b"contents")
+    assert io.md5_file(str(path)) == hashlib.md5(b"contents").hexdigest()
+
+
+def test_md5_file_uses_index(index, tmpdir):
+    path = tmpdir.join("file")
+    path.write_binary(b"contents")
+    io.md5_file(str(path))
+
+    stat = os.stat(str(path))
+    index.store(str(path), stat, "stored")
+    assert io.md5_file(str(path)) == "stored"
+
+
+def test_md5_file_rehashes_changed_file(index, tmpdir):
+    path = tmpdir.join("file")
+    path.write_binary(b"contents")
+    io.md5_file(str(path))
+
+    path.write_binary(b"changed contents")
+    assert io.md5_file(str(path)) == hashlib.md5(b"changed contents").hexdigest()
+
+
+def test_md5_file_without_index(tmpdir, monkeypatch):
+    monkeypatch.setenv("WO_HASH_INDEX", "")
+    path = tmpdir.join("file")
+    path.write_binary(b"contents")
+    assert io.md5_file(str(path)) == hashlib.md5(b"contents").hexdigest()
+    assert HashIndex.default() is None
+
+
+def test_default_index_location(tmpdir, monkeypatch):
+    monkeypatch.delenv("WO_HASH_INDEX", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir.join("cache")))
+    monkeypatch.chdir(tmpdir)
+    try:
+        tmpdir.join("data", "file").write_binary(b"contents", ensure=True)
+        io.md5_file("data/file")
+        assert HashIndex.default().path == str(tmpdir.join("cache", "wo", "hashes.db"))
+        assert tmpdir.join("cache", "wo", "hashes.db").check()
+    finally:
+        HashIndex.reset()
+
+    tmpdir.join("data", ".wo-manifest.json").write_binary(b"{}")
+    assert [relpath for _, relpath in io.walk_files("data")] == ["file"]
+    assert sorted(relpath for _, relpath in io.walk_files("data", hidden=True)) == [".wo-manifest.json", "file"]
+
+
+def test_hash_file_algorithms(index, tmpdir):
+    path = tmpdir.join("file")
+    path.write_binary(b"contents")
+    assert io.hash_file(str(path), "sha256") == hashlib.sha256(b"contents").hexdigest()
+    assert io.hash_file(str(path), "md5") == hashlib.md5(b"contents").hexdigest()
+
+
+def test_hash_file_crc32c(index, tmpdir):
+    google_crc32c = pytest.importorskip("google_crc32c")
+    path = tmpdir.join("file")
+    path.write_binary(b"contents")
+    assert io.hash_file(str(path), "crc32c") == google_crc32c.value(b"contents").to_bytes(4, "big").hex()
+
+
+def test_hash_files_parallel(index, tmpdir):
+    paths = []
+    for number in range(8):
+        paths.append(tmpdir.join("file-{}".format(number)))
+        paths[-1].write_binary(str(number).encode())
+    expected = [hashlib.md5(str(number).encode()).hexdigest() for number in range(8)]
+    assert io.hash_files([str(path) for path in paths], processes=4) == expected
+    assert io.combined_md5([str(path) for path in paths], processes=4) == io.md5_string("".join(expected))
+    assert io.md5_files([str(path) for path in paths]) == hashlib.md5(b"01234567").hexdigest()
@@ -0,0 +1,109 @@
+import os, time, pytest
+import logging
+
+from wo.cloud.registry import Backends
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.storage import Storage
+from wo.utils.journal import TransferJournal
+from wo.utils.transfer import download_ranges
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def make_reader(data, fail_at=None):
+    requested = []
+
+    def read_range(start, end):
+        requested.append(start)
+        if start == fail_at:
+            raise ConnectionError("Preempted")
+        return [data[start:end + 1]]
+    return read_range, requested
+
+
+# Tests
+# -----
+
+def test_download_resumes_ranges(tmpdir):
+    journal = TransferJournal(str(tmpdir.join("journal.db")))
+    destination, data = str(tmpdir.join("file")), os.urandom(1000)
+
+    read_range, requested = make_reader(data, fail_at=600)
+    with pytest.raises(ConnectionError):
+        download_ranges(destination, len(data), read_range, 200, 1, journal=journal, version="v1")
+    assert not os.path.exists(destination) and os.path.exists(destination + ".wo-part")
+
+    read_range, requested = make_reader(data)
+    download_ranges(destination, len(data), read_range, 200, 1, journal=journal, version="v1")
+    # The last range may have been downloaded before the failure was noticed
+    assert requested[0] == 600 and set(requested) <= {600, 800}
+    assert open(destination, "rb").read() == data
+    assert journal.ranges(destination + ".wo-part", "v1", len(data), 200) == set()
+
+
+def test_download_restarts_changed_object(tmpdir):
+    journal = TransferJournal(str(tmpdir.join("journal.db")))
+    destination, data = str(tmpdir.join("file")), os.urandom(1000)
+
+    read_range, _ = make_reader(data, fail_at=600)
+    with pytest.raises(ConnectionError):
+        download_ranges(destination, len(data), read_range, 200, 1, journal=journal, version="v1")
+
+    data = os.urandom(1000)
+    read_range, requested = make_reader(data)
+    download_ranges(destination, len(data), read_range, 200, 1, journal=journal, version="v2")
+    assert requested == [0, 200, 400, 600, 800]
+    assert open(destination, "rb").read() == data
+
+
+def test_download_prefix_skips_completed_files(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    stub = StubStorage(scheme="journaled")
+    Backends.register("journaled", lambda: stub)
+    for relpath in ("a", "b", "sub/c"):
+        stub.write_object("bucket", "data/" + relpath, relpath.encode())
+    storage = Storage()
+    storage.journal = TransferJournal(str(tmpdir.join("journal.db")))
+
+    storage.download_prefix("journaled://bucket/data", "data")
+    requests = stub.requests
+    storage.download_prefix("journaled://bucket/data", "data")
+    assert stub.requests == requests + 1
+
+    stub.write_object("bucket", "data/a", b"changed")
+    tmpdir.join("data", "b").write_binary(b"modified")
+    requests = stub.requests
+    storage.download_prefix("journaled://bucket/data", "data")
+    assert stub.requests == requests + 3
+    assert tmpdir.join("data", "a").read_binary() == b"changed"
+    assert tmpdir.join("data", "b").read_binary() == b"b"
+
+
+def test_abandoned_uploads(tmpdir, monkeypatch):
+    journal = TransferJournal(str(tmpdir.join("journal.db")))
+    for name in ("unchanged", "changed"):
+        tmpdir.join(name).write_binary(b"data")
+    journal.start_upload("memory://bucket/stream", "1")
+    journal.start_upload("memory://bucket/unchanged", "2", str(tmpdir.join("unchanged")), 100)
+    journal.start_upload("memory://bucket/changed", "3", str(tmpdir.join("changed")), 100)
+    tmpdir.join("changed").write_binary(b"other data")
+    assert journal.abandoned(max_age=0) == []
+
+    # The uploads were started by another, preempted process
+    monkeypatch.setattr(TransferJournal, "_owner", "restarted")
+    assert journal.abandoned() == [("memory://bucket/changed", "3")]
+    time.sleep(0.01)
+    assert sorted(journal.abandoned(max_age=0)) == [("memory://bucket/changed", "3"), ("memory://bucket/stream", "1")]
+    assert journal.find_upload("memory://bucket/unchanged", str(tmpdir.join("unchanged")), 100) == ("2", {})
+
+    aborted = []
+    monkeypatch.setattr(Backends.get("memory"), "abort_upload", lambda *args: aborted.append(args), raising=False)
+    storage = Storage()
+    storage.journal = journal
+    assert storage.abort_abandoned(max_age=0) == 2
+    assert sorted(aborted) == [("bucket", "changed", "3"), ("bucket", "stream", "1")]
+    assert journal.abandoned(max_age=0) == []
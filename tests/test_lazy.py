@@ -0,0 +1,74 @@
+import wo, os, pytest
+import logging
+
+from wo.orchestrator.lazy import LazyInputs
+from wo.utils.transfer import TransferConfig
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+class FakeStorage:
+
+    transfer_config = TransferConfig(concurrency=2)
+
+    def __init__(self, objects):
+        self.objects, self.downloads = objects, []
+
+    def object_exists(self, path):
+        return path in self.objects
+
+    def list_prefix(self, source_prefix):
+        for uri in sorted(self.objects):
+            if uri.startswith(source_prefix + "/"):
+                yield uri, uri[len(source_prefix) + 1:]
+
+    def download_file(self, source_path, destination_path):
+        self.downloads.append(source_path)
+        os.makedirs(os.path.dirname(destination_path) or ".", exist_ok=True)
+        with open(destination_path, "wb") as file:
+            file.write(self.objects[source_path])
+
+
+def objects():
+    return {
+        "s3://bucket/data/a": b"a", "s3://bucket/data/b": b"b", "s3://bucket/data/c": b"c",
+        "s3://bucket/data/sub/d": b"d", "s3://bucket/model": b"model",
+    }
+
+
+# Tests 
+# -----
+
+def test_files_are_downloaded_on_access(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    storage = FakeStorage(objects())
+    inputs = LazyInputs(storage, [("s3://bucket/data", "data"), ("s3://bucket/model", "model")]).load()
+    assert len(inputs.files) == 5
+    assert storage.downloads == []
+    
+    with inputs.open("data/b", "rb") as file:
+        assert file.read() == b"b"
+    assert inputs.path("model") == "model"
+    inputs.path("./data/b")
+    assert storage.downloads == ["s3://bucket/data/b", "s3://bucket/model"]
+
+    inputs.path("data/sub")
+    assert os.path.exists("data/sub/d")
+    assert not os.path.exists("data/a")
+    inputs.close()
+
+
+def test_prefetch_follows_listing_order(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    storage = FakeStorage(objects())
+    inputs = LazyInputs(storage, [("s3://bucket/data", "data")], prefetch=2).load()
+
+    inputs.path("data/a")
+    for future in list(inputs._fetches.values()):
+        future.result()
+    inputs.close()
+    assert sorted(storage.downloads) == ["s3://bucket/data/a", "s3://bucket/data/b", "s3://bucket/data/c"]
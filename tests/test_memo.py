@@ -0,0 +1,71 @@
+import wo, pytest
+import logging
+
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.memo import StepCache
+from wo.orchestrator.storage import Storage
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+class StubbedStorage(Storage):
+
+    def __init__(self):
+        self.stub = StubStorage()
+
+    def _backend(self, scheme):
+        return self.stub
+
+
+def put(storage, key, data):
+    storage.stub.write_object("bucket", key, data)
+
+
+# Tests 
+# -----
+
+def test_fingerprint_depends_on_contents_parameters_and_code():
+    storage = StubbedStorage()
+    put(storage, "data/a", b"a")
+    put(storage, "data/b", b"b")
+    cache = StepCache(storage, "s3://bucket/steps")
+    inputs = [("s3://bucket/data", "data")]
+
+    fingerprint = cache.fingerprint(inputs, {"alpha": 1})
+    assert fingerprint == cache.fingerprint(inputs, {"alpha": 1})
+    assert fingerprint != cache.fingerprint(inputs, {"alpha": 2})
+    assert fingerprint != StepCache(storage, "s3://bucket/steps", "v2").fingerprint(inputs, {"alpha": 1})
+
+    put(storage, "moved/a", b"a")
+    put(storage, "moved/b", b"b")
+    assert fingerprint == cache.fingerprint([("s3://bucket/moved", "data")], {"alpha": 1})
+
+    put(storage, "data/b", b"changed")
+    assert fingerprint != cache.fingerprint(inputs, {"alpha": 1})
+
+
+def test_restore_outputs():
+    storage = StubbedStorage()
+    put(storage, "data/a", b"a")
+    put(storage, "run-1/model/weights", b"weights")
+    put(storage, "run-1/report", b"report")
+    cache = StepCache(storage, "s3://bucket/steps")
+    outputs = [("model", "s3://bucket/run-1/model"), ("report", "s3://bucket/run-1/report")]
+
+    fingerprint = cache.fingerprint([("s3://bucket/data", "data")], {})
+    assert cache.lookup(fingerprint) is None
+    cache.publish(fingerprint, outputs)
+    record = cache.lookup(fingerprint)
+
+    assert cache.restore(record, outputs)
+    assert cache.restore(record, [("model", "s3://bucket/run-2/model"), ("report", "s3://bucket/run-2/report")])
+    assert storage.stub.read_object("bucket", "run-2/model/weights") == b"weights"
+    assert storage.stub.read_object("bucket", "run-2/report") == b"report"
+
+    assert not cache.restore(record, [("other", "s3://bucket/run-2/other")])
+    put(storage, "run-1/model/weights", b"overwritten")
+    assert not cache.restore(record, outputs)
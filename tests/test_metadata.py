@@ -0,0 +1,101 @@
+import threading, time, os
+import logging
+
+from wo.cloud.metadata import MetadataCache
+from wo.cloud.registry import Backends
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.storage import Storage
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def make_storage(ttl=60.0):
+    stub = StubStorage(scheme="meta")
+    Backends.register("meta", lambda: stub)
+    storage = Storage()
+    storage.metadata_cache = MetadataCache(ttl)
+    for relpath in ("a", "b", "sub/c"):
+        stub.write_object("bucket", "data/" + relpath, relpath.encode())
+    stub.requests = 0
+    return storage, stub
+
+
+# Tests
+# -----
+
+def test_lookups_are_cached(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    storage, stub = make_storage()
+
+    assert storage.object_exists("meta://bucket/data/a")
+    assert storage.object_exists("meta://bucket/data/a")
+    assert not storage.object_exists("meta://bucket/data")
+    assert not storage.object_exists("meta://bucket/data")
+    assert stub.requests == 2
+
+    storage.download_prefix("meta://bucket/data", "data")
+    assert open("data/sub/c", "rb").read() == b"sub/c"
+    requests = stub.requests
+    for relpath in ("a", "b", "sub/c"):
+        assert storage.object_exists("meta://bucket/data/" + relpath)
+    assert stub.requests == requests
+
+
+def test_writes_invalidate(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    storage, stub = make_storage()
+    tmpdir.join("file").write_binary(b"new")
+
+    assert not storage.object_exists("meta://bucket/out/file")
+    storage.upload_file("file", "meta://bucket/out/file")
+    assert storage.object_exists("meta://bucket/out/file")
+
+    assert not storage.object_exists("meta://bucket/out/stream")
+    with storage.open("meta://bucket/out/stream", "wb") as file:
+        file.write(b"data")
+        assert not storage.object_exists("meta://bucket/out/stream")
+    assert storage.object_exists("meta://bucket/out/stream")
+
+
+def test_entries_expire():
+    storage, stub = make_storage(ttl=0)
+    storage.object_exists("meta://bucket/data/a")
+    storage.object_exists("meta://bucket/data/a")
+    assert stub.requests == 2
+
+
+def test_concurrent_lookups_share_request():
+    cache, calls = MetadataCache(), []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return "info"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("meta://bucket/a", "head", fetch)))
+        for _ in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert results == ["info"] * 8
+    assert len(calls) == 1
+
+
+def test_invalidation_discards_fetch_in_flight():
+    cache, started = MetadataCache(), threading.Event()
+
+    def fetch():
+        started.set()
+        time.sleep(0.1)
+        return "stale"
+
+    thread = threading.Thread(target=cache.get, args=("meta://bucket/a", "head", fetch))
+    thread.start()
+    started.wait()
+    cache.invalidate("meta://bucket/a")
+    thread.join()
+    assert cache.peek("meta://bucket/a", "head") == (False, None)
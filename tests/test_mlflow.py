@@ -0,0 +1,152 @@
+import wo, time, pytest
+import logging
+
+mlflow = pytest.importorskip("mlflow")
+
+from mlflow.tracking import MlflowClient
+from wo.frameworks.mlflow import BufferedLogger
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+@pytest.fixture
+def run(tmpdir, monkeypatch):
+    # Newer releases of MLflow only keep the file store behind a flag
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    mlflow.set_tracking_uri("file://{}".format(tmpdir.join("mlruns")))
+    with mlflow.start_run() as run:
+        yield run.info.run_id
+
+
+def count_batches(monkeypatch):
+    batches, log_batch = [], MlflowClient.log_batch
+    def counting_log_batch(self, run_id, metrics=(), params=(), *args, **kwargs):
+        batches.append((len(metrics), len(params)))
+        return log_batch(self, run_id, metrics, params, *args, **kwargs)
+    monkeypatch.setattr(MlflowClient, "log_batch", counting_log_batch)
+    return batches
+
+
+class UnreachableTracker:
+
+    def start(self):
+        return self
+
+    def close(self):
+        raise ConnectionError("Injected outage")
+
+
+# Tests
+# -----
+
+def test_entries_are_sent_on_exit(run, monkeypatch):
+    batches = count_batches(monkeypatch)
+    with BufferedLogger(interval=60) as tracker:
+        tracker.log_parameters({"lr": 0.1, "layers": 3})
+        for step in range(5):
+            tracker.log_metrics({"loss": 1.0 / (step + 1), "accuracy": step / 5}, step=step)
+        assert batches == []
+    assert batches == [(0, 2), (10, 0)]
+
+    data = MlflowClient().get_run(run).data
+    assert data.params == {"lr": "0.1", "layers": "3"}
+    history = MlflowClient().get_metric_history(run, "loss")
+    assert sorted((metric.step, metric.value) for metric in history) == [(step, 1.0 / (step + 1)) for step in range(5)]
+
+
+def test_flush_by_size(run, monkeypatch):
+    batches = count_batches(monkeypatch)
+    tracker = BufferedLogger(interval=60, max_items=4).start()
+    for step in range(4):
+        tracker.log_metrics({"loss": step}, step=step)
+    deadline = time.monotonic() + 5
+    while not batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert batches == [(4, 0)]
+    tracker.close()
+    assert batches == [(4, 0)]
+
+
+def test_batches_are_split(run, monkeypatch):
+    batches = count_batches(monkeypatch)
+    tracker = BufferedLogger(interval=60)
+    tracker.log_parameters(dict(("param{}".format(index), index) for index in range(150)))
+    tracker.log_metrics(dict(("metric{}".format(index), index) for index in range(1000)))
+    tracker.flush()
+    assert batches == [(0, 100), (0, 50), (1000, 0)]
+    assert len(MlflowClient().get_run(run).data.params) == 150
+
+
+def test_failed_batch_is_kept(run, monkeypatch):
+    tracker = BufferedLogger(interval=60)
+    tracker.log_metrics({"loss": 1.0}, step=0)
+    def failing_log_batch(*args, **kwargs):
+        raise ConnectionError("Injected failure")
+    with monkeypatch.context() as patch:
+        patch.setattr(MlflowClient, "log_batch", failing_log_batch)
+        with pytest.raises(ConnectionError):
+            tracker.flush()
+    tracker.log_metrics({"loss": 0.5}, step=1)
+    tracker.flush()
+    history = MlflowClient().get_metric_history(run, "loss")
+    assert sorted(metric.step for metric in history) == [0, 1]
+
+
+def test_invalid_batch_is_dropped(run, monkeypatch):
+    from mlflow.exceptions import MlflowException
+    from mlflow.protos.databricks_pb2 import INVALID_PARAMETER_VALUE
+    tracker = BufferedLogger(interval=60)
+    tracker.log_metrics({"loss": 1.0}, step=0)
+    def rejecting_log_batch(*args, **kwargs):
+        raise MlflowException("Injected rejection", error_code=INVALID_PARAMETER_VALUE)
+    with monkeypatch.context() as patch:
+        patch.setattr(MlflowClient, "log_batch", rejecting_log_batch)
+        tracker.flush()
+    tracker.log_metrics({"loss": 0.5}, step=1)
+    tracker.flush()
+    history = MlflowClient().get_metric_history(run, "loss")
+    assert [metric.step for metric in history] == [1]
+
+
+def test_conflicting_parameter_is_dropped(run):
+    tracker = BufferedLogger(interval=60, max_retries=1)
+    tracker.log_parameters({"lr": 0.1})
+    tracker.flush()
+    tracker.log_parameters({"lr": 0.01, "layers": 3})
+    for step in range(3):
+        tracker.log_metrics({"loss": step}, step=step)
+        tracker.flush()
+    history = MlflowClient().get_metric_history(run, "loss")
+    assert sorted(metric.step for metric in history) == [0, 1, 2]
+    assert MlflowClient().get_run(run).data.params == {"lr": "0.1", "layers": "3"}
+
+
+def test_retries_are_capped(run, monkeypatch):
+    tracker = BufferedLogger(interval=60, max_retries=2)
+    tracker.log_metrics({"loss": 1.0}, step=0)
+    def failing_log_batch(*args, **kwargs):
+        raise ConnectionError("Injected failure")
+    with monkeypatch.context() as patch:
+        patch.setattr(MlflowClient, "log_batch", failing_log_batch)
+        for attempt in range(3):
+            with pytest.raises(ConnectionError):
+                tracker.flush()
+    tracker.log_metrics({"loss": 0.5}, step=1)
+    tracker.flush()
+    history = MlflowClient().get_metric_history(run, "loss")
+    assert [metric.step for metric in history] == [1]
+
+
+def test_outputs_are_uploaded_despite_tracker(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("out", "model").write_binary(b"model", ensure=True)
+    orchestrator = wo.Orchestrator(dev=True, outputs=[("out/model", "memory://bucket/tracked/model")])
+    orchestrator.tracker = UnreachableTracker()
+    with orchestrator:
+        pass
+    with orchestrator.open("memory://bucket/tracked/model", "rb") as file:
+        assert file.read() == b"model"
@@ -0,0 +1,54 @@
+import wo, os, pytest
+import logging
+
+from wo.orchestrator.storage import Storage
+from wo.utils import io
+from wo.utils.pack import PackIndex, plan_shards
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def make_tree(root, count=50):
+    files = dict(("dir-{}/file-{}".format(index % 3, index), os.urandom(index * 37)) for index in range(count))
+    for relpath, data in files.items():
+        root.join(relpath).write_binary(data, ensure=True)
+    return files
+
+
+def read_tree(root):
+    return dict((relpath, open(path, "rb").read()) for path, relpath in io.walk_files(str(root)))
+
+
+# Tests 
+# -----
+
+def test_plan_shards(tmpdir):
+    for index, size in enumerate((10, 10, 25, 5, 5)):
+        tmpdir.join(str(index)).write_binary(b"x" * size)
+    files = [(str(tmpdir.join(str(index))), str(index)) for index in range(5)]
+    shards = plan_shards(files, shard_size=20)
+    assert [[relpath for _, relpath in shard] for shard in shards] == [["0", "1"], ["2"], ["3", "4"]]
+
+
+@pytest.mark.parametrize("compression", [None, "gz"])
+def test_packed_roundtrip(tmpdir, monkeypatch, compression):
+    monkeypatch.chdir(tmpdir)
+    files = make_tree(tmpdir.join("out"))
+    prefix = "memory://bucket/packed-{}".format(compression)
+    storage = Storage()
+
+    shards = storage.upload_packed("out", prefix, shard_size=8 * 1024, compression=compression, concurrency=4)
+    index = storage._pack_index(prefix)
+    assert shards == len(index.shards) and 1 < shards < len(files)
+    assert sorted(index.members) == sorted(files)
+
+    assert storage.download_prefix(prefix, "in", packed=True) == shards
+    assert read_tree(tmpdir.join("in")) == files
+    for relpath in ("dir-0/file-0", "dir-2/file-29", "dir-1/file-49"):
+        assert storage.read_packed(prefix, relpath) == files[relpath]
+    with pytest.raises(FileNotFoundError):
+        storage.read_packed(prefix, "missing")
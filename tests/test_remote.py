@@ -0,0 +1,127 @@
+import wo, io, pytest
+import logging
+
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.storage import Storage
+from wo.utils.remote import RemoteReader, RemoteWriter
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def reader(data, **kwargs):
+    requests = []
+
+    def read_range(start, end):
+        requests.append((start, end))
+        return data[start:end + 1]
+
+    return RemoteReader(len(data), read_range, **kwargs), requests
+
+
+class MemoryUpload:
+
+    def __init__(self):
+        self.parts, self.completed, self.aborted = [], None, False
+
+    def upload_part(self, number, data):
+        self.parts.append(number)
+        return data
+
+    def complete(self, parts, md5):
+        self.completed = b"".join(parts)
+
+    def abort(self):
+        self.aborted = True
+
+
+# Tests 
+# -----
+
+def test_reader_seeks_and_reads():
+    data = bytes(range(256)) * 100
+    file, requests = reader(data, block_size=1000, read_ahead=4000)
+
+    file.seek(-10, io.SEEK_END)
+    assert file.read() == data[-10:]
+    assert requests == [(25000, 25599)]
+
+    file.seek(10)
+    assert file.read(5) == data[10:15]
+    assert file.tell() == 15
+    assert file.read(2000) == data[15:2015]
+    assert requests[1:] == [(0, 999), (1000, 4999)]
+    assert file.read() == data[2015:]
+    assert file.read() == b""
+
+
+def test_reader_caches_blocks():
+    data = b"x" * 10000
+    file, requests = reader(data, block_size=1000, read_ahead=1000, cache_blocks=2)
+    for _ in range(3):
+        file.seek(0)
+        file.read(100)
+    assert len(requests) == 1
+
+    file.seek(5000); file.read(1)
+    file.seek(8000); file.read(1)
+    file.seek(0); file.read(1)
+    assert len(requests) == 4
+
+
+def test_writer_uploads_parts():
+    upload, puts = MemoryUpload(), []
+    with RemoteWriter(lambda data, md5: puts.append(data), lambda: upload, part_size=4, concurrency=2) as file:
+        file.write(b"0123456789")
+    assert upload.parts == [1, 2, 3]
+    assert upload.completed == b"0123456789" and puts == []
+
+    with RemoteWriter(lambda data, md5: puts.append(data), lambda: upload, part_size=4) as file:
+        file.write(b"01")
+    assert puts == [b"01"]
+
+
+def test_writer_aborts_on_error():
+    upload = MemoryUpload()
+    with pytest.raises(RuntimeError):
+        with RemoteWriter(None, lambda: upload, part_size=4) as file:
+            file.write(b"0123456789")
+            raise RuntimeError()
+    assert upload.aborted and upload.completed is None
+
+    storage = Storage()
+    for mode, data in (("wb", b"partial"), ("w", "partial")):
+        with pytest.raises(RuntimeError):
+            with storage.open("memory://bucket/aborted", mode) as file:
+                file.write(data)
+                raise RuntimeError()
+        assert not storage.object_exists("memory://bucket/aborted")
+
+
+def test_dropped_writer_is_discarded():
+    upload, puts = MemoryUpload(), []
+    file = RemoteWriter(lambda data, md5: puts.append(data), lambda: upload, part_size=4)
+    file.write(b"0123456789")
+    del file
+    assert upload.aborted and upload.completed is None
+
+    file = RemoteWriter(lambda data, md5: puts.append(data), lambda: upload, part_size=4)
+    file.write(b"01")
+    del file
+    assert puts == []
+
+    with RemoteWriter(lambda data, md5: puts.append(data), lambda: upload, part_size=4) as file:
+        file.write(b"01")
+    assert file.committed and puts == [b"01"]
+
+
+def test_stub_open():
+    stub = StubStorage()
+    with stub.open("bucket", "key", "wb") as file:
+        file.write(b"contents")
+    with stub.open("bucket", "key") as file:
+        file.seek(3)
+        assert file.read() == b"tents"
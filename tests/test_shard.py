@@ -0,0 +1,53 @@
+import wo, os, json, pytest
+import logging
+
+from wo.utils.shard import Shard
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+def keys(count=1000):
+    return ["data/part-{:05d}".format(index) for index in range(count)]
+
+
+def identity(key):
+    return key
+
+
+# Tests 
+# -----
+
+def test_shards_partition_keys():
+    shards = [list(Shard(rank, 4).select(keys(), key=identity)) for rank in range(4)]
+    assert sorted(sum(shards, [])) == keys()
+    assert all(150 < len(shard) < 350 for shard in shards)
+    assert shards[1] == list(Shard(1, 4).select(reversed(keys()), key=identity))[::-1]
+
+
+def test_balanced_shards():
+    sizes = dict((key, index ** 2) for index, key in enumerate(keys(100)))
+    shards = [list(Shard(rank, 3, balance=True).select(keys(100), key=identity, size=sizes.get)) 
+        for rank in range(3)]
+    assert sorted(sum(shards, [])) == keys(100)
+    loads = [sum(sizes[key] for key in shard) for shard in shards]
+    assert max(loads) - min(loads) <= max(sizes.values())
+
+
+def test_shard_from_env(monkeypatch):
+    for name in ("RANK", "WORLD_SIZE", "OMPI_COMM_WORLD_RANK", "PMI_RANK", "SLURM_PROCID", "TF_CONFIG"):
+        monkeypatch.delenv(name, raising=False)
+    assert Shard.from_env() is None
+
+    monkeypatch.setenv("TF_CONFIG", json.dumps({
+        "cluster": {"chief": ["a:1"], "worker": ["b:1", "c:1"]}, "task": {"type": "worker", "index": 1}}))
+    shard = Shard.from_env()
+    assert (shard.rank, shard.world_size) == (2, 3)
+
+    monkeypatch.setenv("RANK", "1")
+    monkeypatch.setenv("WORLD_SIZE", "2")
+    shard = Shard.from_env(balance=True)
+    assert (shard.rank, shard.world_size, shard.balance) == (1, 2, True)
@@ -77,6 +77,16 @@ def test_list_dir(w):
     for full_path, relative_path in w.list_prefix(test_existing_dir_prefix):
         expected.remove(relative_path)
     assert len(expected) == 0
+
+
+def test_list_dir_paginated(w):
+    listed = [relpath for _, relpath in w.list_prefix(test_existing_dir_prefix, page_size=1)]
+    assert sorted(listed) == ["imgs.npz", "labels.npz"]
+
+
+def test_list_dir_start_after(w):
+    listed = [relpath for _, relpath in w.list_prefix(test_existing_dir_prefix, start_after="imgs.npz")]
+    assert listed == ["labels.npz"]
     
 
 def test_download_file_with_equal_source_and_destination(w):
@@ -122,6 +132,22 @@ def test_upload_file(w):
         os.remove(filename)
 
 
+def test_upload_file_multipart(w):
+    try: 
+        filename = "random-multipart.file"
+        with open(filename, "wb") as file:
+            file.write(os.urandom(6 * 1024 ** 2))
+        destination = with_bucket("data/sample-version=test/test_upload_file_multipart")
+        w.transfer_config = wo.TransferConfig(multipart_threshold=5 * 1024 ** 2, part_size=5 * 1024 ** 2)
+        w.upload_file(filename, destination)
+
+        bucket, key = parse_uri(destination)
+        head = s3.meta.client.head_object(Bucket=bucket, Key=key)
+        assert head["Metadata"]["md5"] == wo.utils.io.md5_file(filename)
+    finally:
+        os.remove(filename)
+
+
 def test_upload_dir(w):
     filename1 = random_file()
     filename2 = random_file()
@@ -151,4 +177,23 @@ def test_context_manager(w):
         filename1, filename2 = create_file(), create_file()
         
     assert head_file_s3(with_bucket(f"data/sample-version=test/test_context_manager_dir/{filename1}"))
-    assert head_file_s3(with_bucket(f"data/sample-version=test/test_context_manager_dir/{filename2}"))
\ No newline at end of file
+    assert head_file_s3(with_bucket(f"data/sample-version=test/test_context_manager_dir/{filename2}"))
+
+def test_sync_dir(w):
+    filename1 = random_file()
+    filename2 = random_file()
+    shutil.move(filename1, "data")
+    shutil.move(filename2, "data")
+
+    test_sync_dir_path = with_bucket("data/sample-version=test/test_sync_dir")
+    w.sync_prefix("data", test_sync_dir_path)
+    assert head_file_s3(os.path.join(test_sync_dir_path, filename1))
+    assert head_file_s3(os.path.join(test_sync_dir_path, ".wo-manifest.json"))
+
+    os.remove(os.path.join("data", filename2))
+    w.sync_prefix("data", test_sync_dir_path, delete=True)
+    remote = [relpath for _, relpath in w.list_prefix(test_sync_dir_path)]
+    assert remote == [filename1]
+
+    w.sync_prefix(test_sync_dir_path, "artifacts")
+    assert os.path.exists(os.path.join("artifacts", filename1))
@@ -0,0 +1,128 @@
+import wo, os, pytest, threading, time
+import logging
+
+from wo.cloud.stub import StubStorage
+from wo.orchestrator.storage import Storage
+from wo.utils.transfer import TransferPool, download_ranges, prefetch
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Tests 
+# -----
+
+def test_transfer_pool_runs_all_tasks():
+    done = []
+    lock = threading.Lock()
+
+    def transfer(source, destination, cache=True):
+        with lock:
+            done.append((source, destination, cache))
+
+    tasks = ((str(i), "dst/{}".format(i)) for i in range(100))
+    assert TransferPool(concurrency=4).run(transfer, tasks, cache=False) == 100
+    assert sorted(done) == sorted((str(i), "dst/{}".format(i), False) for i in range(100))
+
+
+def test_transfer_pool_is_bounded():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def transfer(source, destination):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    TransferPool(concurrency=3).run(transfer, ((i, i) for i in range(30)))
+    assert peak[0] <= 3
+
+
+def test_transfer_pool_groups_errors():
+
+    def transfer(source, destination):
+        if source % 10 == 0:
+            raise IOError(source)
+
+    with pytest.raises(wo.TransferError) as error:
+        TransferPool(concurrency=4).run(transfer, ((i, i) for i in range(50)))
+    assert sorted(source for source, _ in error.value.errors) == [0, 10, 20, 30, 40]
+
+
+def test_download_ranges(tmpdir):
+    data = os.urandom(1000)
+    requested = []
+
+    def read_range(start, end):
+        requested.append((start, end))
+        return [data[start:start + 10], data[start + 10:end + 1]]
+
+    destination = str(tmpdir.join("file"))
+    download_ranges(destination, len(data), read_range, part_size=300, concurrency=3)
+    with open(destination, "rb") as file:
+        assert file.read() == data
+    assert sorted(requested) == [(0, 299), (300, 599), (600, 899), (900, 999)]
+
+
+def test_download_ranges_incomplete(tmpdir):
+    destination = str(tmpdir.join("file"))
+    with pytest.raises(IOError):
+        download_ranges(destination, 100, lambda start, end: [b"x"], part_size=50, concurrency=2)
+    assert not os.listdir(str(tmpdir))
+
+
+@pytest.mark.parametrize("journaled", [False, True])
+def test_concurrent_downloads_to_same_path(tmpdir, journaled):
+    destination, barrier = str(tmpdir.join("file")), threading.Barrier(2)
+    payloads = [os.urandom(1000), os.urandom(1000)]
+
+    def download(data):
+        def read_range(start, end):
+            if start == 500:
+                # Both downloads are in progress
+                barrier.wait(timeout=5)
+            return [data[start:end + 1]]
+        journal = wo.TransferJournal(str(tmpdir.join("journal.db"))) if journaled else None
+        download_ranges(destination, len(data), read_range, 500, 1, journal=journal, version=data.hex())
+
+    threads = [threading.Thread(target=download, args=(data,)) for data in payloads]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert open(destination, "rb").read() in payloads
+    assert not [name for name in os.listdir(str(tmpdir)) if name.endswith(".wo-part")]
+
+
+def test_prefetch_keeps_order_and_is_bounded():
+    started = []
+
+    def square(item):
+        started.append(item)
+        return item * item
+
+    results = prefetch(square, range(100), depth=4, concurrency=2)
+    assert next(results) == (0, 0)
+    time.sleep(0.05)
+    assert len(started) <= 5
+    assert list(results) == [(i, i * i) for i in range(1, 100)]
+
+
+def test_iter_objects():
+    stub = StubStorage()
+    for index in range(10):
+        stub.write_object("bucket", "data/{}".format(index), str(index).encode())
+
+    class StubbedStorage(Storage):
+        def list_prefix(self, source_prefix):
+            for info in stub.list_objects("bucket", "data/"):
+                yield "s3://bucket/" + info.key, info.key[len("data/"):]
+        def _backend(self, scheme):
+            return stub
+
+    storage = StubbedStorage()
+    assert list(storage.iter_objects("s3://bucket/data", depth=3)) == \
+        [(str(i), str(i).encode()) for i in range(10)]
+    shuffled = list(storage.iter_objects("s3://bucket/data", shuffle=True, seed=1))
+    assert shuffled != sorted(shuffled) and sorted(shuffled) == [(str(i), str(i).encode()) for i in range(10)]
@@ -0,0 +1,88 @@
+import wo, os, time, pytest
+import logging
+
+from wo.orchestrator.uploader import BackgroundUploader
+from wo.utils.transfer import TransferConfig, TransferError
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+# Helper functions
+# ----------------
+
+class RecordingStorage:
+
+    transfer_config = TransferConfig(concurrency=2)
+
+    def __init__(self, fail=()):
+        self.uploads, self.fail = [], fail
+
+    def upload_file(self, source_path, destination_path, cache=True, chunked=False):
+        if os.path.basename(source_path) in self.fail:
+            raise ConnectionError("Injected failure")
+        with open(source_path, "rb") as file:
+            self.uploads.append((destination_path, file.read()))
+
+
+def touch(path, data, mtime):
+    path.write_binary(data, ensure=True)
+    os.utime(str(path), ns=(mtime, mtime))
+
+
+def wait(uploader):
+    while uploader._pending:
+        time.sleep(0.01)
+
+
+# Tests 
+# -----
+
+def test_uploads_settled_files(tmpdir):
+    storage = RecordingStorage()
+    touch(tmpdir.join("out", "a"), b"a", 1)
+    uploader = BackgroundUploader(storage, [(str(tmpdir.join("out")), "s3://bucket/out")], settle=0)
+
+    uploader.scan()
+    wait(uploader)
+    assert storage.uploads == []
+    uploader.scan()
+    wait(uploader)
+    assert storage.uploads == [("s3://bucket/out/a", b"a")]
+
+    uploader.scan()
+    touch(tmpdir.join("out", "a"), b"aa", 2)
+    uploader.scan()
+    uploader.scan()
+    wait(uploader)
+    assert storage.uploads[1:] == [("s3://bucket/out/a", b"aa")]
+
+    touch(tmpdir.join("out", "b"), b"b", 1)
+    uploader.flush()
+    assert storage.uploads[2:] == [("s3://bucket/out/b", b"b")]
+
+
+def test_flush_reports_failures(tmpdir):
+    storage = RecordingStorage(fail={"b"})
+    touch(tmpdir.join("a"), b"a", 1)
+    touch(tmpdir.join("b"), b"b", 1)
+    outputs = [(str(tmpdir.join("a")), "s3://bucket/a"), (str(tmpdir.join("b")), "s3://bucket/b")]
+
+    uploader = BackgroundUploader(storage, outputs, interval=0.01).start()
+    with pytest.raises(TransferError):
+        uploader.flush()
+    assert storage.uploads == [("s3://bucket/a", b"a")]
+
+
+def test_file_rewritten_during_upload(tmpdir):
+    class RewritingStorage(RecordingStorage):
+        def upload_file(self, source_path, destination_path, cache=True, chunked=False):
+            super().upload_file(source_path, destination_path, cache, chunked)
+            if len(self.uploads) == 1:
+                touch(tmpdir.join("a"), b"v2", 2)
+
+    storage = RewritingStorage()
+    touch(tmpdir.join("a"), b"v1", 1)
+    uploader = BackgroundUploader(storage, [(str(tmpdir.join("a")), "s3://bucket/a")], interval=60).start()
+    uploader.flush()
+    assert storage.uploads == [("s3://bucket/a", b"v1"), ("s3://bucket/a", b"v2")]
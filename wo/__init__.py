@@ -1,2 +1,9 @@
 from wo.orchestrator.orchestrator import Orchestrator
-from wo.utils.io import parse_uri, parse_bucket, parse_path
\ No newline at end of file
+from wo.utils.io import parse_uri, parse_bucket, parse_path
+from wo.utils.transfer import TransferConfig, TransferError
+from wo.utils.cache import DownloadCache
+from wo.utils.journal import TransferJournal
+from wo.utils.shard import Shard
+from wo.cloud.registry import Backends
+from wo.cloud.metadata import MetadataCache
+from wo.frameworks.mlflow import BufferedLogger
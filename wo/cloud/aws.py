@@ -1,21 +1,30 @@
-import logging, sys, os
-import boto3, botocore
+import logging, sys, os, itertools, concurrent.futures
+import boto3, boto3.s3.transfer, botocore
 from wo.utils import io
+from wo.utils.transfer import TransferConfig, download_ranges
+from wo.utils.remote import RemoteReader, RemoteWriter
+from wo.cloud.clients import Clients
+from wo.cloud.base import ObjectInfo
+from wo.cloud.controller import RequestController, classify
 
 __all__ = ["S3"]
 
-logging.basicConfig(level=logging.INFO, 
-    format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 
 class S3: 
 
+    controller = RequestController()
+
     @staticmethod
-    def download_file(bucket, source_path, destination_path, cache=True):
+    def download_file(bucket, source_path, destination_path, cache=True, config=None, info=None, journal=None):
         """
         Download file from bucket.
 
+        The object is fetched in byte ranges of `config.part_size`, up to 
+        `config.part_concurrency` of which are downloaded at the same time, 
+        once its size reaches `config.multipart_threshold`.
+
         Parameters
         ----------
         source_path: str
@@ -26,21 +35,58 @@ class S3:
             Bucket name, where file is located.
         cache: bool
             If file already persists locally, skip downloading if md5 checksums are similar. 
+        config: TransferConfig
+            Configuration of the ranged download.
+        info=None: ObjectInfo
+            Metadata of the object, e.g. from a listing, which saves a HEAD request.
+            Its md5 hash is compared with the existing file.
+        journal=None: TransferJournal
+            Journal, in which downloaded ranges are recorded, so that an 
+            interrupted download of the same object can be resumed.
         """
-        s3 = boto3.resource('s3')
+        s3, config = Clients.s3(), config or TransferConfig()
+        if info is None:
+            info = S3._object_info(source_path, S3.controller.call(s3.head_object, Bucket=bucket, Key=source_path))
 
         if os.path.exists(destination_path) and cache:
-            head = s3.meta.client.head_object(Bucket=bucket, Key=source_path)
-            if head.get("Metadata", {}).get("md5") == io.md5_file(destination_path):
+            if info.md5 and info.md5 == io.md5_file(destination_path):
                 return logger.debug("Local and remote objects are the same, skipping download")
 
-        s3.Object(bucket, source_path).download_file(destination_path)
+        def read_range(start, end):
+            # A connection, which breaks while the body is read, is resumed from
+            # the last received byte instead of failing the whole download
+            position, attempt = start, 1
+            while position <= end:
+                body = S3.controller.call(s3.get_object, Bucket=bucket, Key=source_path, 
+                    IfMatch='"{}"'.format(info.etag), Range="bytes={}-{}".format(position, end))["Body"]
+                try:
+                    for chunk in body.iter_chunks(1024 ** 2):
+                        position += len(chunk)
+                        yield chunk
+                except Exception as e:
+                    if classify(e) is None or attempt >= S3.controller.max_attempts:
+                        raise
+                    logger.debug("Resuming range {}-{} of {} at {} after {!r}".format(
+                        start, end, source_path, position, e))
+                    attempt += 1
+
+        size = info.size
+        part_size = config.part_size if size >= config.multipart_threshold else max(size, 1)
+        download_ranges(destination_path, size, read_range, part_size, config.part_concurrency, 
+            journal=journal, version=info.etag)
 
     @staticmethod
-    def upload_file(bucket, source_path, destination_path, cache=True):
+    def upload_file(bucket, source_path, destination_path, cache=True, config=None, journal=None):
         """
         Upload file to bucket. 
 
+        Smaller files are sent with a single PUT request, files larger than 
+        `config.multipart_threshold` are uploaded in parts. 
+        The md5 checksum is recorded in the metadata of the object, when the 
+        upload is created. It is taken from the hash index, if the file has not 
+        changed since it was last hashed, otherwise the file is hashed first, 
+        since metadata cannot be set on completion without copying the object.
+
         Parameters
         ----------
         source_path: str
@@ -51,30 +97,191 @@ class S3:
             Bucket name, where file has to be uploaded.
         cache: bool
             If file already exists, upload file only when md5 checksums are different. 
+        config: TransferConfig
+            Configuration of the multipart upload.
+        journal=None: TransferJournal
+            Journal, in which the multipart upload and its parts are recorded. An 
+            interrupted upload of the same, unchanged file is resumed from the 
+            missing parts instead of being aborted.
         """
-        s3 = boto3.resource('s3')
+        s3, config = Clients.s3(), config or TransferConfig()
+        size, md5 = os.path.getsize(source_path), io.indexed_md5(source_path)
 
         if cache:
             try:
-                head = s3.meta.client.head_object(Bucket=bucket, Key=destination_path)
-                if head.get("Metadata", {}).get("md5") == io.md5_file(source_path):
-                    return logger.debug("Local and remote objects are the same, skipping upload")
+                head = S3.controller.call(s3.head_object, Bucket=bucket, Key=destination_path)
+                if head.get("Metadata", {}).get("md5") and head["ContentLength"] == size:
+                    md5 = md5 or io.md5_file(source_path)
+                    if head["Metadata"]["md5"] == md5:
+                        return logger.debug("Local and remote objects are the same, skipping upload")
             except boto3.exceptions.botocore.exceptions.ClientError as e:
                 logger.debug(e)
-            
-        s3.meta.client.upload_file(
-            Filename=source_path, 
+
+        if size >= config.multipart_threshold:
+            md5 = md5 or io.md5_file(source_path)
+            return S3._upload_multipart(s3, bucket, source_path, destination_path, md5, config, journal)
+
+        md5 = md5 or io.md5_file(source_path)
+
+        def put():
+            # The file is opened by each attempt, so that a retry sends it from the start
+            with open(source_path, "rb") as file:
+                return s3.put_object(Bucket=bucket, Key=destination_path, Body=file, Metadata={"md5": md5})
+        S3.controller.call(put)
+
+    @staticmethod
+    def _upload_multipart(s3, bucket, source_path, destination_path, md5, config, journal=None):
+        stat = os.stat(source_path)
+        part_size = max(config.part_size, -(-stat.st_size // 10000))
+        uri = "s3://{}/{}".format(bucket, destination_path)
+        resumed = journal and journal.find_upload(uri, source_path, part_size)
+        if resumed:
+            upload_id, uploaded = resumed
+            logger.info("Resuming upload of {}, {} parts are present".format(uri, len(uploaded)))
+        else:
+            upload_id = S3.controller.call(s3.create_multipart_upload,
+                Bucket=bucket, Key=destination_path, Metadata={"md5": md5})["UploadId"]
+            uploaded = {}
+            if journal:
+                journal.start_upload(uri, upload_id, source_path, part_size)
+
+        def upload_part(number, data):
+            etag = S3.controller.call(s3.upload_part, Bucket=bucket, Key=destination_path, 
+                UploadId=upload_id, PartNumber=number, Body=data)["ETag"]
+            if journal:
+                journal.add_part(upload_id, number, etag)
+            return etag
+
+        try:
+            futures, pending = [], set()
+            with concurrent.futures.ThreadPoolExecutor(config.part_concurrency) as executor, \
+                    open(source_path, "rb") as file:
+                for number in itertools.count(1):
+                    data = file.read(part_size)
+                    if not data:
+                        break
+                    if number in uploaded:
+                        future = concurrent.futures.Future()
+                        future.set_result(uploaded[number])
+                        futures.append(future)
+                        continue
+                    future = executor.submit(upload_part, number, data)
+                    futures.append(future); pending.add(future)
+                    if len(pending) >= config.part_concurrency:
+                        done, pending = concurrent.futures.wait(
+                            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done: future.result()
+                parts = [{"ETag": future.result(), "PartNumber": number} 
+                    for number, future in enumerate(futures, 1)]
+            S3.controller.call(s3.complete_multipart_upload, Bucket=bucket, Key=destination_path, 
+                UploadId=upload_id, MultipartUpload={"Parts": parts})
+        except botocore.exceptions.ClientError as e:
+            if resumed and e.response.get("Error", {}).get("Code") == "NoSuchUpload":
+                # The upload was aborted in the meantime, e.g. by a lifecycle rule
+                journal.finish_upload(upload_id)
+                return S3._upload_multipart(s3, bucket, source_path, destination_path, md5, config, journal)
+            if not journal:
+                S3.abort_upload(bucket, destination_path, upload_id)
+            raise
+        except BaseException:
+            # A journaled upload is kept, so that the restarted step resumes it
+            if not journal:
+                S3.abort_upload(bucket, destination_path, upload_id)
+            raise
+        if journal:
+            journal.finish_upload(upload_id)
+
+    @staticmethod
+    def abort_upload(bucket, path, upload_id):
+        """
+        Abort a multipart upload, discarding its parts. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the uploaded object.
+        bucket: str
+            Bucket name, where the object is uploaded.
+        upload_id: str
+            Identifier of the upload.
+        """
+        try:
+            S3.controller.call(Clients.s3().abort_multipart_upload, Bucket=bucket, Key=path, UploadId=upload_id)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                raise
+
+    @staticmethod
+    def _record_md5(s3, bucket, path, md5, config):
+        # Metadata cannot be set on completion of a multipart upload, only by a copy.
+        logger.debug("Recording md5 checksum of s3://{}/{}".format(bucket, path))
+        S3.controller.call(s3.copy,
+            CopySource={"Bucket": bucket, "Key": path}, 
             Bucket=bucket, 
-            Key=destination_path, 
+            Key=path, 
             ExtraArgs={
                 "Metadata": {
-                    "md5": io.md5_file(source_path)
-                }, 
+                    "md5": md5
+                },
+                "MetadataDirective": "REPLACE",
             },
+            Config=S3._transfer_config(config),
         )
 
     @staticmethod
-    def list_folder(bucket, source_folder):
+    def _transfer_config(config):
+        return boto3.s3.transfer.TransferConfig(
+            multipart_threshold=config.multipart_threshold, 
+            multipart_chunksize=config.part_size, 
+            max_concurrency=config.part_concurrency,
+        )
+
+    @staticmethod
+    def list_objects(bucket, prefix, page_size=1000, start_after=None, delimiter=None):
+        """
+        List all objects in the bucket under a specified prefix. 
+
+        Objects are fetched lazily page by page, following continuation tokens, 
+        so only a single page is held in memory at a time.
+
+        Parameters
+        ----------
+        prefix: str
+            Prefix of the keys to look up.
+        bucket: str
+            Bucket name, where to look up objects.
+        page_size=1000: int
+            Maximum number of keys, requested per single listing call.
+        start_after=None: str
+            Key in the bucket, after which listing should start.
+        delimiter=None: str
+            Delimiter, e.g. `/`. Keys, which contain it after the prefix, are 
+            grouped into common prefixes, reported with size None.
+        
+        Returns
+        -------
+        iter: ObjectInfo
+        """
+        s3 = Clients.s3()
+        kwargs = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": page_size}
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        if delimiter:
+            kwargs["Delimiter"] = delimiter
+
+        while True:
+            result = S3.controller.call(s3.list_objects_v2, **kwargs)
+            for path in result.get("Contents", []):
+                yield ObjectInfo(path["Key"], path["Size"], path["ETag"].strip('"'), None)
+            for common in result.get("CommonPrefixes", []):
+                yield ObjectInfo(common["Prefix"], None, None, None)
+
+            if not result.get("IsTruncated"):
+                break
+            kwargs["ContinuationToken"] = result["NextContinuationToken"]
+
+    @staticmethod
+    def list_folder(bucket, source_folder, page_size=1000, start_after=None):
         """
         List all files in the bucket under a specified path. 
 
@@ -84,6 +291,10 @@ class S3:
             Path, from which to look up folder down the tree.
         bucket: str
             Bucket name, where to look up files.
+        page_size=1000: int
+            Maximum number of keys, requested per single listing call.
+        start_after=None: str
+            Key in the bucket, after which listing should start.
         
         Returns
         -------
@@ -96,19 +307,15 @@ class S3:
         ValueError
             Raise if there aren't any objects under specified path.
         """
+        found = False
+        for info in S3.list_objects(bucket, source_folder, page_size, start_after):
+            found = True
+            yield '/'.join(("s3:/", bucket, info.key.strip('/'))), \
+                os.path.relpath(info.key, source_folder)
 
-        s3 = boto3.resource('s3')
-        result = s3.meta.client.list_objects_v2(Bucket=bucket, Prefix=source_folder)
-
-        if result["IsTruncated"]: 
-            logger.warning("Result of the files look up will be truncated to 1000 objects.")
-        if not result.get("Contents"):
+        if not found and not start_after:
             raise ValueError("Could not find any contents under a specified folder")
 
-        for path in result["Contents"]:
-            yield '/'.join(("s3:/", bucket, path["Key"].strip('/'))), \
-                os.path.relpath(path["Key"], source_folder)
-
     @staticmethod
     def object_exists(bucket, path):
         """
@@ -126,8 +333,227 @@ class S3:
         bool: 
             Return True if object exists, otherwise return False. 
         """
-        s3 = boto3.resource('s3')
+        s3 = Clients.s3()
         try:
-            return s3.meta.client.head_object(Bucket=bucket, Key=path) and True
+            return S3.controller.call(s3.head_object, Bucket=bucket, Key=path) and True
         except botocore.exceptions.ClientError:
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def head_object(bucket, path):
+        """
+        Get metadata of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where to look up the object.
+        
+        Returns
+        -------
+        ObjectInfo or None
+            Metadata of the object with the md5 hash, it was uploaded with, or 
+            None if there is no object under specified path.
+        """
+        try:
+            return S3._object_info(path, S3.controller.call(Clients.s3().head_object, Bucket=bucket, Key=path))
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "NotFound", "404"):
+                return None
+            raise
+
+    @staticmethod
+    def _object_info(path, head):
+        return ObjectInfo(path, head["ContentLength"], head["ETag"].strip('"'), head.get("Metadata", {}).get("md5"))
+
+    @staticmethod
+    def object_digest(bucket, path):
+        """
+        Get content hash of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where to look up the object.
+        
+        Returns
+        -------
+        str: 
+            MD5 hash of the object if it was uploaded with one, otherwise ETag
+            of the object. 
+        """
+        head = S3.controller.call(Clients.s3().head_object, Bucket=bucket, Key=path)
+        return head.get("Metadata", {}).get("md5") or head["ETag"].strip('"')
+
+    @staticmethod
+    def read_object(bucket, path):
+        """
+        Read contents of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object is located.
+
+        Returns
+        -------
+        bytes
+
+        Raises
+        ------
+        FileNotFoundError
+            Raise if there is no object under specified path.
+        """
+        try:
+            return S3.controller.call(lambda: Clients.s3().get_object(Bucket=bucket, Key=path)["Body"].read())
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise FileNotFoundError("s3://{}/{}".format(bucket, path)) from e
+            raise
+
+    @staticmethod
+    def write_object(bucket, path, data):
+        """
+        Write contents of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object should be written.
+        data: bytes
+            Contents of the object.
+        """
+        S3.controller.call(Clients.s3().put_object, Bucket=bucket, Key=path, Body=data)
+
+    @staticmethod
+    def delete_object(bucket, path):
+        """
+        Delete the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object is located.
+        """
+        S3.controller.call(Clients.s3().delete_object, Bucket=bucket, Key=path)
+
+    @staticmethod
+    def copy_object(bucket, source_path, destination_bucket, destination_path, config=None):
+        """
+        Copy the object on the server side, preserving its metadata. 
+
+        Parameters
+        ----------
+        bucket: str
+            Bucket name, where the source object is located.
+        source_path: str
+            Path to the source object.
+        destination_bucket: str
+            Bucket name, where the object should be copied.
+        destination_path: str
+            Path, where the object should be copied.
+        config: TransferConfig
+            Configuration of the multipart copy, used for large objects.
+        """
+        s3, config = Clients.s3(), config or TransferConfig()
+        head = S3.controller.call(s3.head_object, Bucket=bucket, Key=source_path)
+        extra_args = {"Metadata": head.get("Metadata", {}), "MetadataDirective": "REPLACE"}
+        if head.get("ContentType"):
+            extra_args["ContentType"] = head["ContentType"]
+
+        S3.controller.call(s3.copy, 
+            CopySource={"Bucket": bucket, "Key": source_path}, 
+            Bucket=destination_bucket, 
+            Key=destination_path, 
+            ExtraArgs=extra_args, 
+            Config=S3._transfer_config(config),
+        )
+
+    @staticmethod
+    def open(bucket, path, mode="rb", config=None, journal=None, **kwargs):
+        """
+        Open the object as a binary file. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object is located.
+        mode="rb": str
+            Either "rb" to read the object with range requests, or "wb" to write
+            it with a multipart upload. The md5 checksum of a written object is 
+            only known, when it is closed, so objects larger than a part are 
+            copied onto themselves to record it in the metadata, which takes a 
+            server-side copy of the whole object.
+        config: TransferConfig
+            Configuration of the multipart upload.
+        journal=None: TransferJournal
+            Journal, in which the multipart upload is recorded while it is open,
+            so that it can be aborted, if the process dies.
+        **kwargs
+            Parameters of `RemoteReader`, e.g. `read_ahead`.
+
+        Returns
+        -------
+        RemoteReader or RemoteWriter
+        """
+        s3, config = Clients.s3(), config or TransferConfig()
+        name = "s3://{}/{}".format(bucket, path)
+
+        if mode == "wb":
+            def put(data, md5):
+                S3.controller.call(s3.put_object, Bucket=bucket, Key=path, Body=data, Metadata={"md5": md5})
+            return RemoteWriter(put, lambda: _MultipartUpload(s3, bucket, path, config, journal), 
+                config.part_size, config.part_concurrency, name=name)
+
+        try:
+            head = S3.controller.call(s3.head_object, Bucket=bucket, Key=path)
+        except botocore.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise FileNotFoundError(name) from e
+            raise
+
+        def read_range(start, end):
+            return S3.controller.call(lambda: s3.get_object(Bucket=bucket, Key=path, IfMatch=head["ETag"], 
+                Range="bytes={}-{}".format(start, end))["Body"].read())
+
+        return RemoteReader(head["ContentLength"], read_range, name=name, **kwargs)
+
+
+class _MultipartUpload:
+    """ Multipart upload of a single object, fed by `RemoteWriter`. """
+
+    def __init__(self, s3, bucket, path, config, journal=None):
+        self.s3, self.bucket, self.path, self.config, self.journal = s3, bucket, path, config, journal
+        self.upload_id = S3.controller.call(s3.create_multipart_upload, Bucket=bucket, Key=path)["UploadId"]
+        if journal:
+            journal.start_upload("s3://{}/{}".format(bucket, path), self.upload_id)
+
+    def upload_part(self, number, data):
+        return S3.controller.call(self.s3.upload_part, Bucket=self.bucket, Key=self.path, 
+            UploadId=self.upload_id, PartNumber=number, Body=data)["ETag"]
+
+    def complete(self, parts, md5):
+        S3.controller.call(self.s3.complete_multipart_upload, Bucket=self.bucket, Key=self.path, 
+            UploadId=self.upload_id, MultipartUpload={
+                "Parts": [{"ETag": etag, "PartNumber": number} for number, etag in enumerate(parts, 1)]})
+        S3._record_md5(self.s3, self.bucket, self.path, md5, self.config)
+        if self.journal:
+            self.journal.finish_upload(self.upload_id)
+
+    def abort(self):
+        S3.controller.call(self.s3.abort_multipart_upload, 
+            Bucket=self.bucket, Key=self.path, UploadId=self.upload_id)
+        if self.journal:
+            self.journal.finish_upload(self.upload_id)
@@ -0,0 +1,54 @@
+import collections
+
+__all__ = ["ObjectInfo", "collapse"]
+
+
+ObjectInfo = collections.namedtuple("ObjectInfo", ["key", "size", "etag", "md5"])
+ObjectInfo.__doc__ = """
+Metadata of a remote object, as reported by a listing or a HEAD request.
+
+Parameters
+----------
+key: str
+    Relative path of the object in the bucket.
+size: int
+    Size of the object in bytes, or None for a common prefix, reported by a 
+    listing with a delimiter.
+etag: str
+    Entity tag of the object.
+md5: str
+    Hex-encoded MD5 hash of the object contents, or None if the backend 
+    does not report it.
+"""
+
+
+def collapse(infos, prefix, delimiter):
+    """
+    Group objects, which keys contain the delimiter after the prefix, into 
+    common prefixes, like listings with a delimiter do. Used by backends, 
+    which cannot list with a delimiter on the server side.
+
+    Parameters
+    ----------
+    infos: iter
+        Objects in the order of their keys.
+    prefix: str
+        Prefix of the listing.
+    delimiter: str
+        Delimiter, e.g. `/`.
+
+    Returns
+    -------
+    iter: ObjectInfo
+    """
+    previous = None
+    for info in infos:
+        index = info.key.find(delimiter, len(prefix))
+        if index == -1:
+            yield info
+            continue
+        common = info.key[:index + len(delimiter)]
+        # Keys with the same prefix are adjacent in the order of keys
+        if common != previous:
+            previous = common
+            yield ObjectInfo(common, None, None, None)
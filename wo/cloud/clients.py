@@ -0,0 +1,119 @@
+import logging, threading, os
+
+__all__ = ["Clients"]
+
+logger = logging.getLogger(__name__)
+
+
+class Clients:
+    """
+    Process-wide registry of cloud clients.
+
+    A single client is kept per backend and region/project, so that sessions,
+    credentials and HTTP connection pools are shared between all transfers
+    of the process. Clients are created lazily and are safe to use from
+    multiple threads.
+    """
+
+    max_pool_connections = 10
+
+    _lock = threading.Lock()
+    _clients = {}
+
+    @classmethod
+    def s3(cls, region=None):
+        """
+        Get shared S3 client.
+
+        Parameters
+        ----------
+        region=None: str
+            AWS region of the client. If not specified, region is resolved from
+            the environment.
+
+        Returns
+        -------
+        botocore.client.S3
+        """
+        return cls._get(("s3", region), cls._create_s3, region)
+
+    @classmethod
+    def gcs(cls, project=None):
+        """
+        Get shared Google Cloud Storage client.
+
+        Parameters
+        ----------
+        project=None: str
+            GCP project of the client. If not specified, project is resolved from
+            the environment.
+
+        Returns
+        -------
+        google.cloud.storage.Client
+        """
+        return cls._get(("gs", project), cls._create_gcs, project)
+
+    @classmethod
+    def configure(cls, max_pool_connections):
+        """
+        Set size of the HTTP connection pool of each client. Already created
+        clients are dropped, if the size has changed.
+
+        Parameters
+        ----------
+        max_pool_connections: int
+            Maximum number of connections, kept open by a single client. Should
+            be at least as high as the transfer concurrency.
+        """
+        with cls._lock:
+            if max_pool_connections == cls.max_pool_connections:
+                return
+            logger.debug("Set clients connection pool size to {}".format(max_pool_connections))
+            cls.max_pool_connections = max_pool_connections
+            cls._clients = {}
+
+    @classmethod
+    def reset(cls):
+        """
+        Drop all created clients. Must be called in the child process after fork,
+        since clients hold sockets, which cannot be shared between processes.
+        """
+        cls._lock = threading.Lock()
+        cls._clients = {}
+
+    @classmethod
+    def _get(cls, key, factory, *args):
+        client = cls._clients.get(key)
+        if client is None:
+            with cls._lock:
+                client = cls._clients.get(key)
+                if client is None:
+                    client = cls._clients[key] = factory(*args)
+        return client
+
+    @classmethod
+    def _create_s3(cls, region):
+        import boto3, botocore.config
+        # Retries are left to RequestController, so that it observes throttling.
+        config = botocore.config.Config(
+            max_pool_connections=cls.max_pool_connections, retries={"max_attempts": 0})
+        return boto3.session.Session().client("s3", region_name=region, config=config)
+
+    @classmethod
+    def _create_gcs(cls, project):
+        import google.auth, requests.adapters
+        from google.auth.transport.requests import AuthorizedSession
+        from google.cloud import storage
+
+        credentials, default_project = google.auth.default(scopes=storage.Client.SCOPE)
+        session = AuthorizedSession(credentials)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=cls.max_pool_connections, pool_maxsize=cls.max_pool_connections)
+        session.mount("https://", adapter)
+        return storage.Client(
+            project=project or default_project, credentials=credentials, _http=session)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Clients.reset)
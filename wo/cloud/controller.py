@@ -0,0 +1,174 @@
+import logging, threading, random, time
+
+__all__ = ["RequestController", "ThrottlingError", "classify", "THROTTLED", "RETRYABLE"]
+
+logger = logging.getLogger(__name__)
+
+THROTTLED, RETRYABLE = "throttled", "retryable"
+
+_throttling_codes = {
+    "SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded", "RequestThrottled",
+    "TooManyRequestsException", "ProvisionedThroughputExceededException", "ServiceUnavailable",
+}
+_retryable_codes = {"InternalError", "RequestTimeout", "RequestTimeoutException"}
+_retryable_errors = {
+    "EndpointConnectionError", "ConnectionClosedError", "ReadTimeoutError", "ConnectTimeoutError",
+    "ConnectionError", "ChunkedEncodingError", "IncompleteReadError", "ResponseStreamingError", "ProtocolError",
+}
+_wrapping_errors = {"S3UploadFailedError", "RetriesExceededError"}
+
+
+class ThrottlingError(Exception):
+    """ Raised by a backend, when it asks the client to slow down. """
+
+
+def classify(error):
+    """
+    Classify an error, raised by a storage call.
+
+    Parameters
+    ----------
+    error: Exception
+
+    Returns
+    -------
+    str or None
+        `THROTTLED` if the backend asked to slow down, `RETRYABLE` if the call
+        failed transiently, otherwise None. Errors, which wrap another one, e.g.
+        `S3UploadFailedError` of managed transfers, are classified by the 
+        wrapped error.
+    """
+    if isinstance(error, ThrottlingError):
+        return THROTTLED
+    # Managed transfers raise their wrapper while handling the original error
+    cause = error.__cause__ or (error.__context__ if type(error).__name__ in _wrapping_errors else None)
+    if getattr(error, "response", None) is None and cause is not None:
+        kind = classify(cause)
+        if kind is not None:
+            return kind
+
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        # botocore.exceptions.ClientError
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    else:
+        # google.api_core.exceptions.GoogleAPICallError
+        code = status = getattr(error, "code", None)
+
+    if code in _throttling_codes or status in (429, 503):
+        return THROTTLED
+    if code in _retryable_codes or status in (500, 502, 504):
+        return RETRYABLE
+    if isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in _retryable_errors:
+        return RETRYABLE
+    return None
+
+
+class RequestController:
+    """
+    Retries storage calls and adapts the number of in-flight requests.
+
+    Failed calls are retried with exponentially growing, fully jittered delays.
+    The number of requests in flight is limited with an AIMD policy: each
+    successful call raises the limit by `increase / limit`, i.e. by roughly
+    `increase` per window of requests, and each throttling response multiplies
+    it by `decrease`, at most once per `cooldown` seconds.
+    """
+
+    def __init__(self, max_concurrency=64, min_concurrency=1, max_attempts=8, base_delay=0.1,
+        max_delay=20.0, increase=1.0, decrease=0.5, cooldown=1.0, classify=classify, sleep=time.sleep
+    ):
+        """
+        Parameters
+        ----------
+        max_concurrency=64: int
+            Upper bound of the in-flight requests limit, which is also its initial value.
+        min_concurrency=1: int
+            Lower bound of the in-flight requests limit.
+        max_attempts=8: int
+            Maximum number of attempts of a single call.
+        base_delay=0.1: float
+            Delay before the first retry in seconds, before jitter is applied.
+        max_delay=20.0: float
+            Maximum delay between retries in seconds.
+        increase=1.0: float
+            Additive increase of the limit per window of successful requests.
+        decrease=0.5: float
+            Multiplicative decrease of the limit on throttling.
+        cooldown=1.0: float
+            Minimum interval between two decreases in seconds, so that a burst of
+            throttling responses to requests sent together is handled as one.
+        classify: callable
+            Function, which classifies an error, see `classify`.
+        sleep: callable
+            Function, used to wait between retries.
+        """
+        assert 1 <= min_concurrency <= max_concurrency, "`min_concurrency` must be in [1, max_concurrency]"
+        self.max_concurrency, self.min_concurrency = max_concurrency, min_concurrency
+        self.max_attempts, self.base_delay, self.max_delay = max_attempts, base_delay, max_delay
+        self.increase, self.decrease, self.cooldown = increase, decrease, cooldown
+        self.classify, self.sleep = classify, sleep
+
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.retries, self.throttles = 0, 0
+        self._condition = threading.Condition()
+        self._last_decrease = 0.0
+
+    def call(self, function, *args, **kwargs):
+        """
+        Call function, retrying it on transient errors.
+
+        Parameters
+        ----------
+        function: callable
+            Function, which performs a single storage request.
+
+        Returns
+        -------
+        object
+            Result of the function.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self._acquire()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                self._release()
+                kind = self.classify(error)
+                if kind == THROTTLED:
+                    self._throttled()
+                if kind is None or attempt == self.max_attempts:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                logger.debug("Retrying {} in {:.2f}s after {!r}".format(
+                    getattr(function, "__name__", function), delay, error))
+                with self._condition:
+                    self.retries += 1
+                self.sleep(delay)
+            else:
+                self._release(succeeded=True)
+                return result
+
+    def _acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def _release(self, succeeded=False):
+        with self._condition:
+            self.in_flight -= 1
+            if succeeded:
+                self.limit = min(self.max_concurrency, self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+
+    def _throttled(self):
+        with self._condition:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                logger.debug("Throttled, lowering in-flight requests limit to {}".format(int(self.limit)))
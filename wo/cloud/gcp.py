@@ -1,21 +1,30 @@
-import logging, sys, os
-from google.cloud import storage
+import logging, sys, os, base64
 from wo.utils import io
+from wo.utils.transfer import TransferConfig, download_ranges
+from wo.utils.remote import RemoteReader, RemoteWriter
+from wo.cloud.clients import Clients
+from wo.cloud.base import ObjectInfo
+from wo.cloud.controller import RequestController
 
 __all__ = ["GoogleStorage"]
 
-logging.basicConfig(level=logging.INFO, 
-    format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 
 class GoogleStorage: 
 
+    controller = RequestController()
+    _chunk_alignment = 256 * 1024
+
     @staticmethod
-    def download_file(bucket, source_path, destination_path, **kwargs):
+    def download_file(bucket, source_path, destination_path, cache=True, config=None, journal=None, **kwargs):
         """
         Download file from bucket.
 
+        The blob is fetched in byte ranges of `config.part_size`, up to 
+        `config.part_concurrency` of which are downloaded at the same time, 
+        once its size reaches `config.multipart_threshold`.
+
         Parameters
         ----------
         source_path: str
@@ -24,14 +33,39 @@ class GoogleStorage:
             Path, where file should be downloaded.
         bucket: str
             Bucket name, where file is located.
+        cache: bool
+            If file already persists locally, skip downloading if md5 checksums are similar. 
+        config: TransferConfig
+            Configuration of the ranged download.
+        journal=None: TransferJournal
+            Journal, in which downloaded ranges are recorded, so that an 
+            interrupted download of the same generation of the blob can be resumed.
         """
-        storage.Client().get_bucket(bucket).blob(source_path).download_to_filename(destination_path)
+        config = config or TransferConfig()
+        blob = GoogleStorage.controller.call(Clients.gcs().bucket(bucket).get_blob, source_path)
+        if blob is None:
+            raise FileNotFoundError("gs://{}/{}".format(bucket, source_path))
+
+        if os.path.exists(destination_path) and cache and GoogleStorage._matches(blob, destination_path):
+            return logger.debug("Local and remote objects are the same, skipping download")
+
+        def read_range(start, end):
+            # The blob carries its generation, so all of the ranges come from the same revision.
+            return [GoogleStorage.controller.call(blob.download_as_bytes, start=start, end=end)]
+
+        part_size = config.part_size if blob.size >= config.multipart_threshold else max(blob.size, 1)
+        download_ranges(destination_path, blob.size, read_range, part_size, config.part_concurrency, 
+            journal=journal, version=str(blob.generation))
 
     @staticmethod
-    def upload_file(bucket, source_path, destination_path, **kwargs):
+    def upload_file(bucket, source_path, destination_path, cache=True, config=None, **kwargs):
         """
         Upload file to bucket. 
 
+        Google Cloud Storage computes md5 checksum of the uploaded object itself,
+        so the file is read only once, unless it has to be compared with an 
+        existing object of the same size.
+
         Parameters
         ----------
         source_path: str
@@ -40,11 +74,72 @@ class GoogleStorage:
             Relative path in the bucket, where file should be uploaded. 
         bucket: str
             Bucket name, where file has to be uploaded.
+        cache: bool
+            If file already exists, upload file only when md5 checksums are different. 
+        config: TransferConfig
+            Configuration of the upload. Files larger than `config.multipart_threshold`
+            are uploaded in resumable chunks of `config.part_size`.
+        """
+        config, client = config or TransferConfig(), Clients.gcs()
+
+        if cache:
+            blob = GoogleStorage.controller.call(client.bucket(bucket).get_blob, destination_path)
+            if blob is not None and GoogleStorage._matches(blob, source_path):
+                return logger.debug("Local and remote objects are the same, skipping upload")
+
+        chunk_size = None
+        if os.path.getsize(source_path) >= config.multipart_threshold:
+            chunk_size = max(1, config.part_size // GoogleStorage._chunk_alignment) * GoogleStorage._chunk_alignment
+        blob = client.bucket(bucket).blob(destination_path, chunk_size=chunk_size)
+        GoogleStorage.controller.call(blob.upload_from_filename, source_path)
+
+    @staticmethod
+    def list_objects(bucket, prefix, page_size=1000, start_after=None, delimiter=None):
+        """
+        List all objects in the bucket under a specified prefix. 
+
+        Blobs are fetched lazily page by page, so only a single page is held 
+        in memory at a time.
+
+        Parameters
+        ----------
+        prefix: str
+            Prefix of the blob names to look up.
+        bucket: str
+            Bucket name, where to look up blobs.
+        page_size=1000: int
+            Maximum number of blobs, requested per single listing call.
+        start_after=None: str
+            Blob name in the bucket, after which listing should start.
+        delimiter=None: str
+            Delimiter, e.g. `/`. Names, which contain it after the prefix, are 
+            grouped into common prefixes, reported with size None.
+        
+        Returns
+        -------
+        iter: ObjectInfo
         """
-        storage.Client().get_bucket(bucket.name).blob(destination_path).upload_from_filename(source_path)
+        def list_page(token):
+            iterator = Clients.gcs().bucket(bucket).list_blobs(prefix=prefix, max_results=page_size, 
+                page_size=page_size, page_token=token, start_offset=start_after, delimiter=delimiter)
+            page = next(iterator.pages, None)
+            if page is None:
+                return [], (), None
+            return list(page), page.prefixes, iterator.next_page_token
+
+        token = None
+        while True:
+            blobs, prefixes, token = GoogleStorage.controller.call(list_page, token)
+            for blob in blobs:
+                if blob.name != start_after:
+                    yield GoogleStorage._object_info(blob)
+            for common in sorted(prefixes):
+                yield ObjectInfo(common, None, None, None)
+            if not token:
+                break
 
     @staticmethod
-    def list_folder(bucket, source_folder, **kwargs): 
+    def list_folder(bucket, source_folder, page_size=1000, start_after=None, **kwargs): 
         """
         List all files in the bucket under a specified path. 
 
@@ -54,13 +149,264 @@ class GoogleStorage:
             Path, from which to look up folder down the tree.
         bucket: str
             Bucket name, where to look up files.
+        page_size=1000: int
+            Maximum number of blobs, requested per single listing call.
+        start_after=None: str
+            Blob name in the bucket, after which listing should start.
         
         Returns
         -------
         iter: (full_path, relative_path)
-            Returns an iterator, which produces a tuple of full s3 uri to the file and
+            Returns an iterator, which produces a tuple of full gs uri to the file and
             a relative path from a given prefix `source_folder`.
         """
-        for blob in storage.Client().get_bucket(bucket.name).list_blobs(prefix=source_folder):
-            yield '/'.join(("gc:/", bucket, blob.strip('/'))), \
-                os.path.relpath(blob.name, source_folder) 
\ No newline at end of file
+        for info in GoogleStorage.list_objects(bucket, source_folder, page_size, start_after):
+            yield '/'.join(("gs:/", bucket, info.key.strip('/'))), \
+                os.path.relpath(info.key, source_folder)
+
+    @staticmethod
+    def object_exists(bucket, path):
+        """
+        Check, if object exists under specified path. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where to look up the object.
+        
+        Returns
+        -------
+        bool: 
+            Return True if object exists, otherwise return False. 
+        """
+        return GoogleStorage.controller.call(Clients.gcs().bucket(bucket).blob(path).exists)
+
+    @staticmethod
+    def head_object(bucket, path):
+        """
+        Get metadata of the blob. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the blob.
+        bucket: str
+            Bucket name, where to look up the blob.
+        
+        Returns
+        -------
+        ObjectInfo or None
+            Metadata of the blob, or None if there is no blob under specified path.
+        """
+        blob = GoogleStorage.controller.call(Clients.gcs().bucket(bucket).get_blob, path)
+        return blob and GoogleStorage._object_info(blob)
+
+    @staticmethod
+    def object_digest(bucket, path):
+        """
+        Get content hash of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where to look up the object.
+        
+        Returns
+        -------
+        str: 
+            Base64-encoded MD5 hash of the object, or its CRC32C for composite objects.
+
+        Raises
+        ------
+        FileNotFoundError
+            Raise if there is no object under specified path.
+        """
+        blob = GoogleStorage.controller.call(Clients.gcs().bucket(bucket).get_blob, path)
+        if blob is None:
+            raise FileNotFoundError("gs://{}/{}".format(bucket, path))
+        return blob.md5_hash or blob.crc32c
+
+    @staticmethod
+    def read_object(bucket, path):
+        """
+        Read contents of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object is located.
+
+        Returns
+        -------
+        bytes
+
+        Raises
+        ------
+        FileNotFoundError
+            Raise if there is no object under specified path.
+        """
+        from google.api_core.exceptions import NotFound
+        try:
+            return GoogleStorage.controller.call(Clients.gcs().bucket(bucket).blob(path).download_as_bytes)
+        except NotFound as e:
+            raise FileNotFoundError("gs://{}/{}".format(bucket, path)) from e
+
+    @staticmethod
+    def write_object(bucket, path, data):
+        """
+        Write contents of the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object should be written.
+        data: bytes
+            Contents of the object.
+        """
+        GoogleStorage.controller.call(Clients.gcs().bucket(bucket).blob(path).upload_from_string, data)
+
+    @staticmethod
+    def delete_object(bucket, path):
+        """
+        Delete the object. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the object.
+        bucket: str
+            Bucket name, where the object is located.
+        """
+        GoogleStorage.controller.call(Clients.gcs().bucket(bucket).blob(path).delete)
+
+    @staticmethod
+    def copy_object(bucket, source_path, destination_bucket, destination_path, **kwargs):
+        """
+        Copy the blob on the server side, preserving its metadata. 
+
+        Parameters
+        ----------
+        bucket: str
+            Bucket name, where the source blob is located.
+        source_path: str
+            Path to the source blob.
+        destination_bucket: str
+            Bucket name, where the blob should be copied.
+        destination_path: str
+            Path, where the blob should be copied.
+        """
+        client = Clients.gcs()
+        source = client.bucket(bucket).blob(source_path)
+        destination = client.bucket(destination_bucket).blob(destination_path)
+
+        # Large blobs are rewritten in several calls, each returning a continuation token.
+        token = None
+        while True:
+            token, _, _ = GoogleStorage.controller.call(destination.rewrite, source, token=token)
+            if token is None:
+                break
+
+    @staticmethod
+    def open(bucket, path, mode="rb", config=None, **kwargs):
+        """
+        Open the blob as a binary file. 
+
+        Parameters
+        ----------
+        path: str
+            Path to the blob.
+        bucket: str
+            Bucket name, where the blob is located.
+        mode="rb": str
+            Either "rb" to read the blob with range requests, or "wb" to write
+            it with a parallel composite upload.
+        config: TransferConfig
+            Configuration of the composite upload.
+        **kwargs
+            Parameters of `RemoteReader`, e.g. `read_ahead`.
+
+        Returns
+        -------
+        RemoteReader or RemoteWriter
+        """
+        config, client = config or TransferConfig(), Clients.gcs()
+        name = "gs://{}/{}".format(bucket, path)
+
+        if mode == "wb":
+            def put(data, md5):
+                GoogleStorage.controller.call(client.bucket(bucket).blob(path).upload_from_string, data)
+            return RemoteWriter(put, lambda: _ComposeUpload(client.bucket(bucket), path), 
+                config.part_size, config.part_concurrency, name=name)
+
+        blob = GoogleStorage.controller.call(client.bucket(bucket).get_blob, path)
+        if blob is None:
+            raise FileNotFoundError(name)
+
+        def read_range(start, end):
+            return GoogleStorage.controller.call(blob.download_as_bytes, start=start, end=end)
+
+        return RemoteReader(blob.size, read_range, name=name, **kwargs)
+
+    @staticmethod
+    def _matches(blob, filename):
+        # Composite objects carry no md5, only crc32c.
+        if blob.size != os.path.getsize(filename):
+            return False
+        if blob.md5_hash:
+            return base64.b64decode(blob.md5_hash).hex() == io.hash_file(filename, "md5")
+        if blob.crc32c:
+            return base64.b64decode(blob.crc32c).hex() == io.hash_file(filename, "crc32c")
+        return False
+
+    @staticmethod
+    def _object_info(blob):
+        md5 = blob.md5_hash and base64.b64decode(blob.md5_hash).hex()
+        return ObjectInfo(blob.name, blob.size, blob.etag, md5)
+
+
+class _ComposeUpload:
+    """ 
+    Parallel composite upload, fed by `RemoteWriter`. Parts are uploaded as 
+    temporary blobs, which are composed into the destination on completion. 
+    """
+
+    _max_sources = 32
+
+    def __init__(self, bucket, path):
+        self.bucket, self.path = bucket, path
+        self.parts = []
+
+    def upload_part(self, number, data):
+        part = self.bucket.blob("{}.wo-parts/{:05d}".format(self.path, number))
+        self.parts.append(part)
+        GoogleStorage.controller.call(part.upload_from_string, data)
+        return part
+
+    def complete(self, parts, md5):
+        # A single compose request takes a limited number of sources, so the
+        # remaining parts are appended to the destination in further requests.
+        destination = self.bucket.blob(self.path)
+        sources, remaining = parts[:self._max_sources], parts[self._max_sources:]
+        while True:
+            GoogleStorage.controller.call(destination.compose, sources)
+            if not remaining:
+                break
+            count = self._max_sources - 1
+            sources, remaining = [destination] + remaining[:count], remaining[count:]
+        self.abort()
+
+    def abort(self):
+        from google.api_core.exceptions import NotFound
+        for part in self.parts:
+            try:
+                GoogleStorage.controller.call(part.delete)
+            except NotFound:
+                pass
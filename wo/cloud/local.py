@@ -0,0 +1,280 @@
+import logging, threading, contextlib, shutil, fcntl, errno, os, io as _io
+
+from wo.utils import io
+from wo.cloud.base import ObjectInfo, collapse
+
+__all__ = ["LocalStorage"]
+
+logger = logging.getLogger(__name__)
+
+_FICLONE = 0x40049409
+_temporary_suffix = ".wo-tmp"
+
+
+class LocalStorage:
+    """
+    Storage backend over a local or shared file system, e.g. a volume mounted 
+    by all steps of a pipeline. 
+
+    URIs have the form `file:///path/to/object`, a host part is taken as the 
+    first directory of the path. Files are transferred with reflinks, which 
+    share blocks until either copy is modified, where the file system supports 
+    them. Otherwise downloads and copies are hardlinked, unless `hardlinks` is 
+    False, and uploads are copied, since steps often rewrite their outputs in 
+    place, which would change a hardlinked object too. Objects are always 
+    replaced atomically, so a hardlinked download keeps its contents, when the
+    object is overwritten.
+    """
+
+    hardlinks = True
+
+    @staticmethod
+    def download_file(bucket, source_path, destination_path, cache=True, **kwargs):
+        """
+        Download file from bucket.
+
+        Parameters
+        ----------
+        source_path: str
+            Relative path in the bucket, where file is located.
+        destination_path: str
+            Path, where file should be downloaded.
+        bucket: str
+            Bucket name, where file is located.
+        cache: bool
+            If file already persists locally, skip downloading if md5 checksums are similar. 
+        """
+        source_path = LocalStorage._path(bucket, source_path)
+        if cache and LocalStorage._same(source_path, destination_path):
+            return logger.debug("Local and remote objects are the same, skipping download")
+        LocalStorage._transfer(source_path, destination_path)
+
+    @staticmethod
+    def upload_file(bucket, source_path, destination_path, cache=True, **kwargs):
+        """
+        Upload file to bucket. 
+
+        Parameters
+        ----------
+        source_path: str
+            Path to target file, which have to be uploaded.
+        destination_path: str
+            Relative path in the bucket, where file should be uploaded. 
+        bucket: str
+            Bucket name, where file has to be uploaded.
+        cache: bool
+            If file already exists, upload file only when md5 checksums are different. 
+        """
+        destination_path = LocalStorage._path(bucket, destination_path)
+        if cache and LocalStorage._same(source_path, destination_path):
+            return logger.debug("Local and remote objects are the same, skipping upload")
+        LocalStorage._transfer(source_path, destination_path, link=False)
+
+    @staticmethod
+    def list_objects(bucket, prefix, page_size=1000, start_after=None, delimiter=None):
+        """
+        List all objects in the bucket under a specified prefix, in the order of
+        their keys. 
+
+        Parameters
+        ----------
+        bucket: str
+            Bucket name.
+        prefix: str
+            Prefix of the keys.
+        page_size=1000: int
+            Not used, the directory tree is walked at once.
+        start_after=None: str
+            Key, after which listing should start.
+        delimiter=None: str
+            Delimiter, e.g. `/`. Keys, which contain it after the prefix, are 
+            grouped into common prefixes, reported with size None.
+
+        Returns
+        -------
+        iter: ObjectInfo
+            ETags are derived from the inode, size and modification time of the 
+            files, md5 hashes are not computed.
+        """
+        root = LocalStorage._path(bucket, "")
+        directory = os.path.join(root, os.path.dirname(prefix))
+        keys = []
+        # Objects are listed as they are, including manifests and pack indices
+        for path, _ in io.walk_files(directory, hidden=True):
+            key = os.path.relpath(path, root).replace(os.sep, "/")
+            if key.startswith(prefix) and key > (start_after or "") and not key.endswith(_temporary_suffix):
+                keys.append(key)
+
+        if delimiter:
+            keys = [info.key for info in collapse((ObjectInfo(key, 0, None, None) for key in sorted(keys)), 
+                prefix, delimiter)]
+        for key in sorted(keys):
+            if delimiter and key.endswith(delimiter):
+                yield ObjectInfo(key, None, None, None)
+                continue
+            try:
+                stat = os.stat(os.path.join(root, key))
+            except FileNotFoundError:
+                continue
+            yield LocalStorage._object_info(key, stat)
+
+    @staticmethod
+    def list_folder(bucket, source_folder, page_size=1000, start_after=None):
+        """
+        List all files in the folder. 
+
+        Parameters
+        ----------
+        bucket: str
+            Bucket name.
+        source_folder: str
+            Path to the folder.
+        page_size=1000: int
+            Not used, the directory tree is walked at once.
+        start_after=None: str
+            Key, after which listing should start.
+
+        Returns
+        -------
+        iter: (full_path, relative_path)
+        """
+        if not source_folder.strip("/"):
+            raise ValueError("Listing the whole bucket is not supported, provide a folder")
+        prefix = source_folder.strip("/") + "/"
+        for info in LocalStorage.list_objects(bucket, prefix, page_size, start_after):
+            yield LocalStorage._uri(bucket, info.key), info.key[len(prefix):]
+
+    @staticmethod
+    def object_exists(bucket, path):
+        return os.path.isfile(LocalStorage._path(bucket, path))
+
+    @staticmethod
+    def head_object(bucket, path):
+        try:
+            return LocalStorage._object_info(path, os.stat(LocalStorage._path(bucket, path)))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def object_digest(bucket, path):
+        return io.md5_file(LocalStorage._path(bucket, path))
+
+    @staticmethod
+    def read_object(bucket, path):
+        with open(LocalStorage._path(bucket, path), "rb") as file:
+            return file.read()
+
+    @staticmethod
+    def write_object(bucket, path, data):
+        path = LocalStorage._path(bucket, path)
+        temporary = LocalStorage._temporary(path)
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def delete_object(bucket, path):
+        try:
+            os.remove(LocalStorage._path(bucket, path))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def copy_object(bucket, source_path, destination_bucket, destination_path, **kwargs):
+        LocalStorage._transfer(
+            LocalStorage._path(bucket, source_path), LocalStorage._path(destination_bucket, destination_path))
+
+    @staticmethod
+    def open(bucket, path, mode="rb", **kwargs):
+        path = LocalStorage._path(bucket, path)
+        if mode == "wb":
+            return _AtomicFile(path)
+        return open(path, mode)
+
+    @staticmethod
+    def _path(bucket, key):
+        return os.path.join(os.sep, bucket, key)
+
+    @staticmethod
+    def _object_info(key, stat):
+        etag = "{:x}-{:x}-{:x}".format(stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        return ObjectInfo(key, stat.st_size, etag, None)
+
+    @staticmethod
+    def _uri(bucket, key):
+        return "file://{}/{}".format(bucket, key)
+
+    @staticmethod
+    def _temporary(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return "{}.{}.{}{}".format(path, os.getpid(), threading.get_ident(), _temporary_suffix)
+
+    @staticmethod
+    def _same(source_path, destination_path):
+        try:
+            source, destination = os.stat(source_path), os.stat(destination_path)
+        except FileNotFoundError:
+            return False
+        if (source.st_dev, source.st_ino) == (destination.st_dev, destination.st_ino):
+            return True
+        return source.st_size == destination.st_size \
+            and io.md5_file(source_path) == io.md5_file(destination_path)
+
+    @staticmethod
+    def _transfer(source_path, destination_path, link=True):
+        temporary = LocalStorage._temporary(destination_path)
+        if not LocalStorage._reflink(source_path, temporary):
+            try:
+                if not (link and LocalStorage.hardlinks):
+                    raise OSError(errno.EPERM, "Hardlinks are disabled")
+                os.link(source_path, temporary)
+            except OSError:
+                shutil.copyfile(source_path, temporary)
+        os.replace(temporary, destination_path)
+
+    @staticmethod
+    def _reflink(source_path, destination_path):
+        with open(source_path, "rb") as source, open(destination_path, "wb") as destination:
+            try:
+                fcntl.ioctl(destination.fileno(), _FICLONE, source.fileno())
+                return True
+            except OSError:
+                pass
+        os.remove(destination_path)
+        return False
+
+
+class _AtomicFile(_io.FileIO):
+    """ 
+    Writable file, which replaces the destination, once it is closed. A file,
+    which is aborted or dropped without being closed, leaves the destination
+    untouched.
+    """
+
+    def __init__(self, path):
+        self.destination, self.committed = path, False
+        super().__init__(LocalStorage._temporary(path), "wb")
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        os.replace(self.name, self.destination)
+        self.committed = True
+
+    def abort(self):
+        """ Discard written data. """
+        if self.closed:
+            return
+        super().close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.name)
+
+    def __exit__(self, error_type, error_value, error_traceback):
+        if error_type is None:
+            return self.close()
+        self.abort()
+
+    def __del__(self):
+        # FileIO closes dropped files, which would replace the destination
+        self.abort()
@@ -0,0 +1,237 @@
+import logging, threading, time, os, concurrent.futures
+
+__all__ = ["MetadataCache", "CachedBackend"]
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCache:
+    """
+    In-memory cache of object metadata for the duration of a run.
+
+    Results of HEAD requests and entries of listings are kept for `ttl`
+    seconds, keyed by the URI of the object and the kind of the lookup, e.g.
+    `head` or `digest`. Concurrent lookups of the same entry share a single
+    request. Entries of an object are dropped, when it is written through
+    `CachedBackend`; writes by other processes are only picked up after the
+    entries expire.
+    """
+
+    def __init__(self, ttl=60.0):
+        """
+        Parameters
+        ----------
+        ttl=60.0: float
+            Time in seconds, during which an entry is served from memory.
+        """
+        self.ttl = ttl
+        self.hits, self.misses = 0, 0
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(self, uri, kind, fetch):
+        """
+        Get an entry, calling `fetch` if it is missing or expired.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        kind: str
+            Kind of the entry.
+        fetch: callable
+            Function without arguments, which requests the entry from the storage.
+
+        Returns
+        -------
+        object
+            Result of `fetch`, possibly shared with other callers.
+        """
+        with self._lock:
+            found, value = self._lookup(uri, kind)
+            if found:
+                self.hits += 1
+                return value
+            future = self._pending.get((uri, kind))
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._pending[(uri, kind)] = concurrent.futures.Future()
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                if self._pending.get((uri, kind)) is future:
+                    del self._pending[(uri, kind)]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            # The entry was invalidated while it was being fetched, so the result may be stale
+            if self._pending.get((uri, kind)) is future:
+                del self._pending[(uri, kind)]
+                self._store(uri, kind, value)
+        future.set_result(value)
+        return value
+
+    def peek(self, uri, kind):
+        """
+        Get an entry without fetching it.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        kind: str
+            Kind of the entry.
+
+        Returns
+        -------
+        tuple: (found, value)
+        """
+        with self._lock:
+            return self._lookup(uri, kind)
+
+    def record(self, uri, kind, value):
+        """
+        Store an entry, which was obtained by another request, e.g. a listing.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        kind: str
+            Kind of the entry.
+        value: object
+        """
+        with self._lock:
+            self._store(uri, kind, value)
+
+    def invalidate(self, uri):
+        """
+        Drop all entries of the object.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        """
+        with self._lock:
+            self._entries.pop(uri, None)
+            for key in [key for key in self._pending if key[0] == uri]:
+                del self._pending[key]
+
+    def clear(self):
+        """ Drop all entries. """
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def _lookup(self, uri, kind):
+        value, expires = self._entries.get(uri, {}).get(kind, (None, 0))
+        if expires <= time.monotonic():
+            return False, None
+        return True, value
+
+    def _store(self, uri, kind, value):
+        self._entries.setdefault(uri, {})[kind] = (value, time.monotonic() + self.ttl)
+
+
+class CachedBackend:
+    """
+    Storage backend, which serves metadata lookups of another backend from a
+    `MetadataCache`.
+
+    Objects, found by `list_objects`, are recorded, so that the following
+    `object_exists` and `download_file` calls do not request them again.
+    `download_file` receives the cached metadata of the object as `info`, if
+    any, which backends may use instead of their own HEAD request. Writes invalidate
+    the entries of the written object. All other methods are delegated as is.
+    """
+
+    def __init__(self, backend, scheme, cache):
+        """
+        Parameters
+        ----------
+        backend: object
+            Backend, implementing the storage interface.
+        scheme: str
+            URI scheme of the backend.
+        cache: MetadataCache
+        """
+        self.backend, self.scheme, self.cache = backend, scheme, cache
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def head_object(self, bucket, path):
+        return self.cache.get(self._uri(bucket, path), "head", lambda: self.backend.head_object(bucket, path))
+
+    def object_exists(self, bucket, path):
+        found, info = self.cache.peek(self._uri(bucket, path), "listing")
+        return found or self.head_object(bucket, path) is not None
+
+    def object_digest(self, bucket, path):
+        return self.cache.get(self._uri(bucket, path), "digest", lambda: self.backend.object_digest(bucket, path))
+
+    def list_objects(self, bucket, prefix, *args, **kwargs):
+        for info in self.backend.list_objects(bucket, prefix, *args, **kwargs):
+            if info.size is not None:
+                self.cache.record(self._uri(bucket, info.key), "listing", info)
+            yield info
+
+    def download_file(self, bucket, source_path, destination_path, cache=True, **kwargs):
+        uri = self._uri(bucket, source_path)
+        found, info = self.cache.peek(uri, "head")
+        if found and info is None:
+            raise FileNotFoundError(uri)
+        # Listings carry no md5 hashes of S3 objects, which are needed to
+        # compare them with an existing file, only HEAD requests do.
+        if not found and not (cache and os.path.exists(destination_path)):
+            found, info = self.cache.peek(uri, "listing")
+        if found:
+            kwargs["info"] = info
+        return self.backend.download_file(bucket, source_path, destination_path, cache=cache, **kwargs)
+
+    def upload_file(self, bucket, source_path, destination_path, *args, **kwargs):
+        try:
+            return self.backend.upload_file(bucket, source_path, destination_path, *args, **kwargs)
+        finally:
+            self.cache.invalidate(self._uri(bucket, destination_path))
+
+    def write_object(self, bucket, path, data):
+        try:
+            return self.backend.write_object(bucket, path, data)
+        finally:
+            self.cache.invalidate(self._uri(bucket, path))
+
+    def delete_object(self, bucket, path):
+        try:
+            return self.backend.delete_object(bucket, path)
+        finally:
+            self.cache.invalidate(self._uri(bucket, path))
+
+    def copy_object(self, bucket, source_path, destination_bucket, destination_path, **kwargs):
+        try:
+            return self.backend.copy_object(bucket, source_path, destination_bucket, destination_path, **kwargs)
+        finally:
+            self.cache.invalidate(self._uri(destination_bucket, destination_path))
+
+    def open(self, bucket, path, mode="rb", **kwargs):
+        file = self.backend.open(bucket, path, mode, **kwargs)
+        if mode == "wb":
+            # The object appears, when the file is closed
+            close, uri = file.close, self._uri(bucket, path)
+            def invalidating_close():
+                try:
+                    close()
+                finally:
+                    self.cache.invalidate(uri)
+            file.close = invalidating_close
+        return file
+
+    def _uri(self, bucket, path):
+        return "{}://{}/{}".format(self.scheme, bucket, path)
@@ -0,0 +1,107 @@
+import logging, threading
+
+__all__ = ["Backends"]
+
+logger = logging.getLogger(__name__)
+
+
+class Backends:
+    """
+    Registry of storage backends, keyed by URI scheme.
+
+    A backend is registered with a factory, which is called on the first use 
+    of its scheme, so SDKs of unused backends are never imported. Backends 
+    implement a common interface: `download_file`, `upload_file`, `list_objects`,
+    `list_folder`, `object_exists`, `head_object`, `object_digest`, `read_object`,
+    `write_object`, `delete_object`, `copy_object` and `open`, see `wo.cloud.aws.S3`.
+
+    ```
+    Backends.register("minio", lambda: MinioStorage(endpoint="http://minio:9000"))
+    ```
+    """
+
+    _lock = threading.Lock()
+    _factories = {}
+    _backends = {}
+
+    @classmethod
+    def register(cls, scheme, factory):
+        """
+        Register backend for the scheme, replacing the previous one.
+
+        Parameters
+        ----------
+        scheme: str
+            URI scheme, e.g. `s3`.
+        factory: callable
+            Function without arguments, which returns the backend.
+        """
+        with cls._lock:
+            cls._factories[scheme] = factory
+            cls._backends.pop(scheme, None)
+
+    @classmethod
+    def get(cls, scheme):
+        """
+        Get backend of the scheme.
+
+        Parameters
+        ----------
+        scheme: str
+            URI scheme, e.g. `s3`.
+
+        Returns
+        -------
+        object
+            Backend, implementing the storage interface.
+
+        Raises
+        ------
+        ValueError
+            Raise if no backend is registered for the scheme.
+        """
+        backend = cls._backends.get(scheme)
+        if backend is None:
+            with cls._lock:
+                if scheme not in cls._factories:
+                    raise ValueError("No storage backend is registered for scheme {!r}".format(scheme))
+                backend = cls._backends.get(scheme)
+                if backend is None:
+                    backend = cls._backends[scheme] = cls._factories[scheme]()
+        return backend
+
+    @classmethod
+    def schemes(cls):
+        """
+        Returns
+        -------
+        List[str]
+            Registered schemes.
+        """
+        return sorted(cls._factories)
+
+
+def _s3():
+    from wo.cloud.aws import S3
+    return S3
+
+
+def _gcs():
+    from wo.cloud.gcp import GoogleStorage
+    return GoogleStorage
+
+
+def _local():
+    from wo.cloud.local import LocalStorage
+    return LocalStorage
+
+
+def _memory():
+    from wo.cloud.stub import StubStorage
+    return StubStorage(scheme="memory")
+
+
+Backends.register("s3", _s3)
+Backends.register("gs", _gcs)
+Backends.register("file", _local)
+Backends.register("memory", _memory)
@@ -0,0 +1,176 @@
+import logging, threading, hashlib, random, time, os
+
+from wo.cloud.base import ObjectInfo, collapse
+from wo.cloud.controller import RequestController, ThrottlingError
+from wo.utils.remote import RemoteReader, RemoteWriter
+from wo.utils.transfer import TransferConfig
+
+__all__ = ["StubStorage"]
+
+logger = logging.getLogger(__name__)
+
+
+class StubStorage:
+    """
+    In-memory storage backend, which injects faults.
+
+    Implements the same interface as `S3` and `GoogleStorage` and routes each
+    request through its `controller`, so that transfers, retries and throttling
+    can be tested offline. A process-wide instance without faults is registered
+    for `memory://` URIs. Requests are throttled when more than `capacity` of
+    them are in flight, or randomly with `throttle_rate` probability, and fail
+    transiently with `failure_rate` probability.
+    """
+
+    def __init__(self, capacity=None, throttle_rate=0.0, failure_rate=0.0, latency=0.0,
+        seed=None, controller=None, scheme="stub"
+    ):
+        """
+        Parameters
+        ----------
+        capacity=None: int
+            Maximum number of requests in flight, above which requests are throttled.
+        throttle_rate=0.0: float
+            Probability of a request to be throttled.
+        failure_rate=0.0: float
+            Probability of a request to fail with ConnectionError.
+        latency=0.0: float
+            Duration of a single request in seconds.
+        seed=None: int
+            Seed of the fault injection.
+        controller=None: RequestController
+            Controller of the requests. A new controller is created by default.
+        scheme="stub": str
+            Scheme of the URIs, produced by `list_folder`.
+        """
+        self.capacity, self.latency = capacity, latency
+        self.throttle_rate, self.failure_rate = throttle_rate, failure_rate
+        self.controller = controller or RequestController()
+        self.scheme = scheme
+        self.objects = {}
+        self.requests, self.in_flight, self.peak_in_flight = 0, 0, 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def download_file(self, bucket, source_path, destination_path, cache=True, **kwargs):
+        data, _ = self._call(self._get, bucket, source_path)
+        with open(destination_path, "wb") as file:
+            file.write(data)
+
+    def upload_file(self, bucket, source_path, destination_path, cache=True, **kwargs):
+        with open(source_path, "rb") as file:
+            data = file.read()
+        md5 = hashlib.md5(data).hexdigest()
+        if cache and self.object_exists(bucket, destination_path) \
+                and self.object_digest(bucket, destination_path) == md5:
+            return logger.debug("Local and remote objects are the same, skipping upload")
+        self._call(self._put, bucket, destination_path, data)
+
+    def list_objects(self, bucket, prefix, page_size=1000, start_after=None, delimiter=None):
+        if delimiter:
+            yield from collapse(self.list_objects(bucket, prefix, page_size, start_after), prefix, delimiter)
+            return
+        start_after = start_after or ""
+        while True:
+            page = self._call(self._list, bucket, prefix, page_size, start_after)
+            yield from page
+            if len(page) < page_size:
+                break
+            start_after = page[-1].key
+
+    def list_folder(self, bucket, source_folder, page_size=1000, start_after=None):
+        for info in self.list_objects(bucket, source_folder, page_size, start_after):
+            yield "{}://{}/{}".format(self.scheme, bucket, info.key.strip("/")), os.path.relpath(info.key, source_folder)
+
+    def object_exists(self, bucket, path):
+        return self._call(self._head, bucket, path) is not None
+
+    def head_object(self, bucket, path):
+        return self._call(self._head, bucket, path)
+
+    def object_digest(self, bucket, path):
+        info = self._call(self._head, bucket, path)
+        if info is None:
+            raise FileNotFoundError("stub://{}/{}".format(bucket, path))
+        return info.md5
+
+    def read_object(self, bucket, path):
+        return self._call(self._get, bucket, path)[0]
+
+    def write_object(self, bucket, path, data):
+        self._call(self._put, bucket, path, data)
+
+    def delete_object(self, bucket, path):
+        self._call(self.objects.pop, (bucket, path), None)
+
+    def copy_object(self, bucket, source_path, destination_bucket, destination_path, **kwargs):
+        data, _ = self._call(self._get, bucket, source_path)
+        self._call(self._put, destination_bucket, destination_path, data)
+
+    def open(self, bucket, path, mode="rb", config=None, **kwargs):
+        if mode == "wb":
+            put = lambda data, md5: self.write_object(bucket, path, data)
+            return RemoteWriter(put, lambda: _StubUpload(self, bucket, path), 
+                (config or TransferConfig()).part_size, name=path)
+        data = self.read_object(bucket, path)
+        return RemoteReader(len(data), lambda start, end: self._call(data.__getitem__, slice(start, end + 1)), 
+            name=path, **kwargs)
+
+    def _call(self, function, *args):
+        return self.controller.call(self._request, function, *args)
+
+    def _request(self, function, *args):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            overloaded = self.capacity is not None and self.in_flight > self.capacity
+            throttled = self._random.random() < self.throttle_rate
+            failed = self._random.random() < self.failure_rate
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if overloaded or throttled:
+                raise ThrottlingError("SlowDown")
+            if failed:
+                raise ConnectionError("Injected failure")
+            return function(*args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _get(self, bucket, path):
+        try:
+            return self.objects[(bucket, path)]
+        except KeyError:
+            raise FileNotFoundError("stub://{}/{}".format(bucket, path))
+
+    def _put(self, bucket, path, data):
+        self.objects[(bucket, path)] = (data, hashlib.md5(data).hexdigest())
+
+    def _head(self, bucket, path):
+        if (bucket, path) not in self.objects:
+            return None
+        data, md5 = self.objects[(bucket, path)]
+        return ObjectInfo(path, len(data), md5, md5)
+
+    def _list(self, bucket, prefix, page_size, start_after):
+        keys = sorted(key for b, key in list(self.objects) if b == bucket
+            and key.startswith(prefix) and key > start_after)
+        return [self._head(bucket, key) for key in keys[:page_size]]
+
+
+class _StubUpload:
+
+    def __init__(self, stub, bucket, path):
+        self.stub, self.bucket, self.path = stub, bucket, path
+
+    def upload_part(self, number, data):
+        self.stub._call(len, data)
+        return data
+
+    def complete(self, parts, md5):
+        self.stub.write_object(self.bucket, self.path, b"".join(parts))
+
+    def abort(self):
+        pass
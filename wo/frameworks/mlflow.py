@@ -1,14 +1,12 @@
-import mlflow
-import logging, sys, pprint
+import logging, threading, time, sys, pprint
 
-__all__ = ["MLflow"]
+__all__ = ["MLflow", "BufferedLogger"]
 
-logging.basicConfig(level=logging.INFO, 
-    format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 
 class MLflow:
+    """ Tracking through MLflow. The `mlflow` package is imported on first use. """
 
     @staticmethod
     def set_endpoint(uri):
@@ -21,6 +19,7 @@ class MLflow:
             URI, where MLflow instance is deployed.
         """
         logger.info("Set MLflow tracking server to {}".format(uri))
+        import mlflow
         mlflow.set_tracking_uri(uri)
 
     @staticmethod
@@ -34,6 +33,7 @@ class MLflow:
             Name of the experiment, where experiment will be tracked. 
         """
         logger.info("Set experiment to be `{}`".format(experiment))
+        import mlflow
         mlflow.set_experiment(experiment)
         
     @staticmethod
@@ -47,6 +47,7 @@ class MLflow:
             Dictionary with parameters.
         """
         logger.info("Logging parameters to MLflow:\n{}".format(pprint.pformat(parameters)))
+        import mlflow
         mlflow.log_params(parameters)
 
     @staticmethod
@@ -62,4 +63,212 @@ class MLflow:
             Step, at which given metrics were recorded. 
         """   
         logger.info("Logging metrics to MLflow:\n{}".format(pprint.pformat(metrics)))
-        mlflow.log_metrics(metrics)
+        import mlflow
+        mlflow.log_metrics(metrics, step=step)
+
+
+class BufferedLogger:
+    """
+    Logs metrics and parameters to MLflow from a background thread, so that a 
+    training loop does not wait for the tracking server.
+
+    Metrics are recorded in memory with their step and timestamp, parameters 
+    are recorded by name, the last value wins. The buffer is sent with 
+    `log_batch` every `interval` seconds, or as soon as it holds `max_items` 
+    entries. A batch, which fails, is kept and sent again with the next one,
+    at most `max_retries` times in a row, then it is dropped. A batch, which 
+    the server rejects as invalid, is dropped at once, as are parameters, 
+    which were already logged to the run with another value. Parameters are
+    sent in their own batches, so that a rejected one does not hold back the
+    metrics. `flush` 
+    sends all of the remaining entries, it is called on exit.
+
+    ```
+    with BufferedLogger() as tracker:
+        for step in range(epochs):
+            tracker.log_metrics({"loss": train()}, step=step)
+    ```
+    """
+
+    # Limits of a single `log_batch` request
+    max_batch_metrics, max_batch_params, max_batch_items = 1000, 100, 1000
+
+    def __init__(self, run_id=None, interval=5.0, max_items=1000, max_retries=5):
+        """
+        Parameters
+        ----------
+        run_id=None: str
+            Run, where the entries are logged. Defaults to the active run, which 
+            is started if there is none, when the first entry is logged.
+        interval=5.0: float
+            Interval between two flushes in seconds.
+        max_items=1000: int
+            Number of buffered entries, which triggers a flush before the interval 
+            elapses.
+        max_retries=5: int
+            Number of times failed entries are sent again, before they are dropped.
+        """
+        self.run_id, self.interval, self.max_items = run_id, interval, max_items
+        self.max_retries, self.failures = max_retries, 0
+        self._metrics, self._params = [], {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._stop, self._wake = threading.Event(), threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Start flushing the buffer in a background thread. """
+        self._thread = threading.Thread(target=self._run, name="wo-mlflow-logger", daemon=True)
+        self._thread.start()
+        return self
+
+    def log_metrics(self, metrics, step=None, timestamp=None):
+        """
+        Record metrics, without waiting for them to be sent.
+
+        Parameters
+        ----------
+        metrics: dict
+            Dictionary with metrics.
+        step=None: int
+            Step, at which the metrics were recorded. Defaults to 0.
+        timestamp=None: int
+            Time in milliseconds since the epoch. Defaults to the current time.
+        """
+        from mlflow.entities import Metric
+        self._resolve_run()
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        entries = [Metric(key, float(value), timestamp, step or 0) for key, value in metrics.items()]
+        with self._lock:
+            self._metrics.extend(entries)
+            self._notify()
+
+    def log_parameters(self, parameters):
+        """
+        Record parameters, without waiting for them to be sent.
+
+        Parameters
+        ----------
+        parameters: dict
+            Dictionary with parameters.
+        """
+        self._resolve_run()
+        with self._lock:
+            self._params.update((key, str(value)) for key, value in parameters.items())
+            self._notify()
+
+    def flush(self):
+        """
+        Send all of the buffered entries.
+
+        Raises
+        ------
+        Exception
+            Raise if the entries could not be sent. They are kept in the buffer,
+            unless they have been retried `max_retries` times.
+        """
+        with self._send_lock:
+            with self._lock:
+                metrics, params = self._metrics, self._params
+                self._metrics, self._params = [], {}
+            if not metrics and not params:
+                return
+            logger.debug("Sending {} metrics and {} parameters to MLflow".format(len(metrics), len(params)))
+            from mlflow.tracking import MlflowClient
+            from mlflow.entities import Param
+            from mlflow.exceptions import MlflowException
+            client, params = MlflowClient(), [Param(key, value) for key, value in params.items()]
+            # Parameters are sent in their own batches, so that a rejected one 
+            # does not hold back the metrics
+            while params:
+                batch = params[:self.max_batch_params]
+                try:
+                    client.log_batch(self.run_id, params=batch)
+                except MlflowException as e:
+                    try:
+                        conflicts = self._conflicts(client, batch)
+                    except Exception:
+                        conflicts = set()
+                    if conflicts:
+                        logger.warning("Parameters {} were already logged with other values, dropping them".format(
+                            sorted(conflicts)))
+                        params = [param for param in params if param.key not in conflicts]
+                        continue
+                    self._reject(e, metrics, params, "{} parameters".format(len(batch)))
+                except Exception:
+                    self._keep(metrics, params)
+                    raise
+                self.failures = 0
+                params = params[len(batch):]
+
+            while metrics:
+                batch = metrics[:min(self.max_batch_metrics, self.max_batch_items)]
+                try:
+                    client.log_batch(self.run_id, metrics=batch)
+                except MlflowException as e:
+                    self._reject(e, metrics, [], "{} metrics".format(len(batch)))
+                except Exception:
+                    self._keep(metrics, [])
+                    raise
+                self.failures = 0
+                metrics = metrics[len(batch):]
+
+    def close(self):
+        """ Stop the background thread and send the remaining entries. """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _conflicts(self, client, params):
+        logged = client.get_run(self.run_id).data.params
+        return set(param.key for param in params if param.key in logged and logged[param.key] != param.value)
+
+    def _reject(self, error, metrics, params, entries):
+        # Sending an invalid batch again would fail the same way
+        if error.error_code != "INVALID_PARAMETER_VALUE":
+            self._keep(metrics, params)
+            raise error
+        logger.warning("MLflow rejected {}, dropping them: {!r}".format(entries, error))
+
+    def _keep(self, metrics, params):
+        self.failures += 1
+        if self.failures > self.max_retries:
+            logger.warning("Failed to log to MLflow {} times, dropping {} metrics and {} parameters".format(
+                self.failures, len(metrics), len(params)))
+            self.failures = 0
+            return
+        with self._lock:
+            # Entries, recorded meanwhile, are kept after the failed ones
+            self._metrics = metrics + self._metrics
+            self._params = dict([(param.key, param.value) for param in params], **self._params)
+
+    def _resolve_run(self):
+        # The active run is local to the thread, so it is resolved by the caller
+        if self.run_id is None:
+            import mlflow
+            run = mlflow.active_run() or mlflow.start_run()
+            self.run_id = run.info.run_id
+
+    def _notify(self):
+        if len(self._metrics) + len(self._params) >= self.max_items:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Failed to log to MLflow: {!r}".format(e))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, error_type, error_value, error_traceback):
+        self.close()
@@ -2,8 +2,6 @@ import os, json, logging, sys, pprint
 
 __all__ = ["Kubeflow"]
 
-logging.basicConfig(level=logging.INFO, 
-    format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 
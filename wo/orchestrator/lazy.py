@@ -0,0 +1,139 @@
+import concurrent.futures, threading, builtins, logging, os
+
+from wo.utils import io
+
+__all__ = ["LazyInputs"]
+
+logger = logging.getLogger(__name__)
+
+
+class LazyInputs:
+    """
+    Inputs of a step, which are downloaded on first access.
+
+    `load` only lists the input sources and records which remote object backs
+    each local path. A file is downloaded when it is requested with `path` or
+    `open`, concurrent requests of the same file share a single download. With
+    `prefetch` set, each access also schedules downloads of the files, which
+    follow the accessed one in the listing of its input, so sequential reads
+    find their files already in place.
+    """
+
+    def __init__(self, storage, inputs, prefetch=0, concurrency=None):
+        """
+        Parameters
+        ----------
+        storage: Storage
+            Storage, used to list and download the inputs.
+        inputs: List[tuple]
+            Inputs of the step, as passed to `Orchestrator`.
+        prefetch=0: int
+            Number of files, downloaded ahead of the accessed one.
+        concurrency=None: int
+            Number of files, prefetched at the same time. Defaults to 
+            `transfer_config.concurrency` of the storage.
+        """
+        self.storage, self.inputs, self.prefetch = storage, inputs, prefetch
+        self.files = {}
+        self._order, self._fetches = {}, {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency or storage.transfer_config.concurrency)
+
+    def load(self):
+        """ List the input sources and record the files they contain. """
+        for source, destination, *options in self.inputs:
+            destination = self._normalize(destination)
+            if self.storage.object_exists(source):
+                listing = [(destination, source)]
+            else:
+                listing = [(os.path.join(destination, os.path.normpath(relpath)), uri) 
+                    for uri, relpath in self.storage.list_prefix(source, **dict(*options))]
+            for index, (path, uri) in enumerate(listing):
+                self.files[path] = uri
+                self._order[path] = listing, index
+        logger.info("Recorded {} input files".format(len(self.files)))
+        return self
+
+    def path(self, path):
+        """
+        Make sure a local input path is in place. Directories are materialized 
+        with all of the input files under them.
+
+        Parameters
+        ----------
+        path: str
+            Local path of an input file or directory.
+
+        Returns
+        -------
+        str
+            The same path, which can now be read.
+        """
+        normalized = self._normalize(path)
+        if normalized in self.files:
+            self._prefetch(normalized)
+            self._fetch(normalized).result()
+        else:
+            futures = [self._fetch(file, background=True) for file in self.files 
+                if file.startswith(normalized + os.sep)]
+            for future in futures:
+                future.result()
+        return path
+
+    def open(self, path, mode="r", **kwargs):
+        """
+        Open a local input file, downloading it first if needed.
+
+        Parameters
+        ----------
+        path: str
+            Local path of an input file.
+        mode="r": str
+            Mode, in which the file is opened.
+
+        Returns
+        -------
+        file object
+        """
+        return builtins.open(self.path(path), mode, **kwargs)
+
+    def close(self):
+        """ Cancel scheduled prefetches and wait for the running downloads. """
+        with self._lock:
+            for future in self._fetches.values():
+                future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _fetch(self, path, background=False):
+        with self._lock:
+            future = self._fetches.get(path)
+            if future is not None:
+                return future
+            if background:
+                future = self._fetches[path] = self._executor.submit(self._download, path)
+                return future
+            future = self._fetches[path] = concurrent.futures.Future()
+        try:
+            future.set_result(self._download(path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _download(self, path):
+        try:
+            return self.storage.download_file(self.files[path], path)
+        except Exception:
+            # Let the next access retry the download
+            with self._lock:
+                self._fetches.pop(path, None)
+            raise
+
+    def _prefetch(self, path):
+        listing, index = self._order[path]
+        for file, _ in listing[index + 1:index + 1 + self.prefetch]:
+            self._fetch(file, background=True)
+
+    @staticmethod
+    def _normalize(path):
+        return os.path.normpath(io.parse_path(path))
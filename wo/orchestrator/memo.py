@@ -0,0 +1,168 @@
+import datetime, logging, json
+
+from wo.utils import io
+from wo.utils.manifest import Manifest
+from wo.utils.filters import PathFilter
+
+__all__ = ["StepCache"]
+
+logger = logging.getLogger(__name__)
+
+
+class StepCache:
+    """
+    Memoization of step results.
+
+    A step is identified by a fingerprint of the contents of its inputs, its
+    parameters and an optional code version. Once the step has published its
+    outputs, a record with their locations is stored under the cache URI. A
+    later run with the same fingerprint restores the outputs from the record,
+    by reference when the destinations are the same, or by server-side copy
+    otherwise.
+    """
+
+    def __init__(self, storage, uri, code_version=None):
+        """
+        Parameters
+        ----------
+        storage: Storage
+            Storage, used to access inputs, outputs and records.
+        uri: str
+            Remote prefix, where records are stored.
+        code_version=None: str
+            Version of the step code, e.g. a git commit or an image tag.
+        """
+        self.storage, self.uri, self.code_version = storage, uri.rstrip("/"), code_version
+
+    def fingerprint(self, inputs, parameters):
+        """
+        Compute fingerprint of the step.
+
+        Parameters
+        ----------
+        inputs: List[tuple]
+            Inputs of the step, as passed to `Orchestrator`. Only the contents of 
+            the sources are taken into account, not their locations.
+        parameters: dict
+            Resolved parameters of the step.
+
+        Returns
+        -------
+        str
+        """
+        hasher = io.new_hash("md5")
+        hasher.update(json.dumps({"parameters": parameters, "code_version": self.code_version}, 
+            sort_keys=True, default=str).encode("utf-8"))
+        for source, _, *options in inputs:
+            hasher.update("{}\n".format(self.state(source, **dict(*options))).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def state(self, uri, include=None, exclude=None, max_depth=None):
+        """
+        Compute digest of the contents of a remote object or prefix. ETags and 
+        hashes are taken from a single listing of the prefix and its manifest, 
+        objects are not read.
+
+        Parameters
+        ----------
+        uri: str
+        include=None, exclude=None, max_depth=None
+            Selection of the files of a prefix, see `Storage.download_prefix`.
+
+        Returns
+        -------
+        str
+        """
+        scheme, bucket, key = io.parse_uri(uri)
+        backend = self.storage._backend(scheme)
+        if key and backend.object_exists(bucket, key):
+            return backend.object_digest(bucket, key)
+
+        prefix = key and key + "/"
+        try:
+            manifest = Manifest.loads(backend.read_object(bucket, prefix + Manifest.name))
+        except FileNotFoundError:
+            manifest = Manifest()
+
+        hasher = io.new_hash("md5")
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        objects = backend.list_objects(bucket, prefix) if path_filter is None \
+            else self.storage._list_filtered(backend, bucket, prefix, path_filter)
+        for info in objects:
+            relpath = info.key[len(prefix):]
+            if relpath != Manifest.name:
+                hasher.update("{}\0{}\n".format(relpath, manifest.md5(relpath, info) or info.etag).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def lookup(self, fingerprint):
+        """
+        Parameters
+        ----------
+        fingerprint: str
+
+        Returns
+        -------
+        dict or None
+            Record of the earlier run with the same fingerprint, if any.
+        """
+        scheme, bucket, key = io.parse_uri(self._record_uri(fingerprint))
+        try:
+            return json.loads(self.storage._backend(scheme).read_object(bucket, key).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def restore(self, record, outputs):
+        """
+        Restore outputs, published by the recorded run.
+
+        Parameters
+        ----------
+        record: dict
+            Record, returned by `lookup`.
+        outputs: List[tuple]
+            Outputs of the step, as passed to `Orchestrator`.
+
+        Returns
+        -------
+        bool
+            True if all of the outputs were restored, False if some of them are 
+            missing from the record or were modified since it was written.
+        """
+        published = dict((source, (destination, state)) for source, destination, state in record["outputs"])
+        plan = []
+        for source, destination, *_ in outputs:
+            if source not in published:
+                return False
+            recorded, state = published[source]
+            if self.state(recorded) != state:
+                logger.info("Recorded output {} has changed since it was published".format(recorded))
+                return False
+            plan.append((recorded, destination))
+
+        for recorded, destination in plan:
+            if recorded.rstrip("/") != destination.rstrip("/"):
+                logger.info("Restoring {} from {}".format(destination, recorded))
+                self.storage._copy_remote(recorded, destination)
+        return True
+
+    def publish(self, fingerprint, outputs):
+        """
+        Record outputs of the step under its fingerprint.
+
+        Parameters
+        ----------
+        fingerprint: str
+        outputs: List[tuple]
+            Outputs of the step, as passed to `Orchestrator`.
+        """
+        record = {
+            "fingerprint": fingerprint,
+            "code_version": self.code_version,
+            "created": datetime.datetime.utcnow().isoformat("T"),
+            "outputs": [(source, destination, self.state(destination)) for source, destination, *_ in outputs],
+        }
+        scheme, bucket, key = io.parse_uri(self._record_uri(fingerprint))
+        self.storage._backend(scheme).write_object(bucket, key, json.dumps(record).encode("utf-8"))
+
+    def _record_uri(self, fingerprint):
+        return "{}/{}.json".format(self.uri, fingerprint)
@@ -1,15 +1,20 @@
 import logging, sys
 
-logging.basicConfig(level=logging.INFO, 
-    format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 from typing import List
 from wo.utils.config import DefaultParamDict
-from wo.frameworks.mlflow import MLflow
+from wo.frameworks.mlflow import MLflow, BufferedLogger
 from wo.orchestrator.kubernetes import Kubernetes
 from wo.orchestrator.kubeflow import Kubeflow
 from wo.orchestrator.storage import Storage
+from wo.orchestrator.memo import StepCache
+from wo.orchestrator.uploader import BackgroundUploader
+from wo.orchestrator.lazy import LazyInputs
+from wo.utils.cache import DownloadCache
+from wo.utils.shard import Shard
+from wo.cloud.metadata import MetadataCache
+from wo.utils.journal import TransferJournal
 import datetime, os
 
 __all__ = ["Orchestrator"]
@@ -18,7 +23,11 @@ __all__ = ["Orchestrator"]
 class Orchestrator(Storage, MLflow):
     
     def __init__(self, inputs=None, outputs=None, logs_file=None, logs_bucket=None, 
-        experiment="Default", default_params=None, mlflow=False, dev=False, kubeflow=True
+        experiment="Default", default_params=None, mlflow=False, dev=False, kubeflow=True,
+        transfer_config=None, download_cache=None, sync=False, sync_delete=False,
+        step_cache=None, code_version=None, background_upload=False, upload_interval=5.0,
+        lazy_inputs=False, prefetch=0, shard=None, packed=False, chunked=False, metadata_ttl=60.0,
+        journal=None, buffered_logging=False, logging_interval=5.0
     ):
         """
         Initialize orchestrator instance. 
@@ -36,6 +45,16 @@ class Orchestrator(Storage, MLflow):
                 assert ps.path.exists("model")
             ```
 
+            Prefix inputs may have a third element, a dictionary of `include`, 
+            `exclude` and `max_depth` options of `download_prefix`, which selects
+            the downloaded files. Literal beginnings of the include patterns are
+            listed instead of the whole prefix.
+
+            ```
+            with wo.Orchestrator(inputs=[("s3://bucket/data", "data", {"include": "train/**/*.npz"})]) as w:
+                # only the files under `data/train` are listed and downloaded
+            ```
+
         outputs: List[tuple]
             Outputs of the step, that should be uploaded to the cloud after execution completes.
             Presented as a list of 2-element tuples, where the first element is a source location 
@@ -46,6 +65,9 @@ class Orchestrator(Storage, MLflow):
                 # execute code 
             ```
 
+            Prefix outputs may have a third element with the same options of 
+            `upload_prefix`, e.g. `{"exclude": "*.tmp"}`.
+
         logs_file=None: str
             File, where logs of the current execution were written. 
         logs_bucket=None: str
@@ -63,7 +85,91 @@ class Orchestrator(Storage, MLflow):
             Flag, indicating whether this execution is orchestrated by Kubeflow. 
         dev=False: bool
             Flag, indicating whether this is a dry run. 
+        transfer_config=None: TransferConfig
+            Configuration of the transfers, e.g. how many files are downloaded 
+            or uploaded at the same time.
+        download_cache=None: DownloadCache
+            Node-local cache of downloaded objects, shared between steps running
+            on the same node. If not specified, the cache is created from the
+            `WO_CACHE_DIR` and `WO_CACHE_SIZE` environment variables, when set.
+            Cache hits are copied into the inputs, unless the cache is created 
+            with `link=True`; then they are hardlinked and the inputs are 
+            read-only.
+        sync=False: bool
+            Flag, indicating whether prefix inputs and outputs should be transferred
+            with `sync_prefix`, comparing a single listing of the remote prefix 
+            against the local tree instead of checking each file separately.
+        sync_delete=False: bool
+            Flag, indicating whether synchronization should remove files, which
+            do not exist in the source prefix.
+        step_cache=None: str
+            Remote prefix, where results of the step are memoized. When an earlier 
+            run with the same inputs, parameters and code version has published 
+            its outputs, they are restored instead of downloading the inputs, and 
+            `cached` is set. The step body should then be skipped.
+
+            ```
+            with wo.Orchestrator(inputs=..., outputs=..., step_cache="s3://bucket/steps/train") as w:
+                if not w.cached:
+                    train()
+            ```
+
+        code_version=None: str
+            Version of the step code, e.g. a git commit, included in the fingerprint 
+            of the step.
+        background_upload=False: bool
+            Flag, indicating whether outputs should be uploaded while the step is 
+            running. Each output file is uploaded once it stays unchanged for
+            `upload_interval` seconds, and uploaded again if it is modified later. 
+            Only the remaining files are uploaded on exit.
+        upload_interval=5.0: float
+            Interval between two scans of the outputs in seconds.
+        lazy_inputs=False: bool
+            Flag, indicating whether inputs should only be listed on enter and their 
+            files downloaded on first access with `path` or `open`.
+
+            ```
+            with wo.Orchestrator(inputs=[("s3://bucket/data", "data")], lazy_inputs=True) as w:
+                with w.open("data/train.csv") as file:
+                    # read the file
+            ```
+
+        prefetch=0: int
+            Number of lazy input files, downloaded ahead of the accessed one, following
+            the order of the listing.
+        shard=None: Shard or bool
+            Shard of the current worker of a distributed job. Only the files of prefix 
+            inputs, assigned to it, are downloaded. If True, the shard is taken from 
+            the environment with `Shard.from_env`.
+        packed=False: bool
+            Flag, indicating whether prefix inputs and outputs are transferred packed
+            into tar shards, see `upload_packed`. Recommended for many small files.
+        chunked=False: bool
+            Flag, indicating whether file inputs and outputs are transferred as
+            deduplicated chunks, see `upload_chunked`. Recommended for large files,
+            which change a little between runs, e.g. checkpoints.
+        metadata_ttl=60.0: float
+            Time in seconds, during which metadata of remote objects, obtained by
+            listings and HEAD requests, is reused within the run, see `MetadataCache`.
+            Objects, written by the run, are looked up again. Caching is disabled,
+            if set to None.
+        journal=None: str
+            Path to the transfer journal, see `TransferJournal`. Interrupted downloads 
+            and uploads are resumed from it, when the step is restarted, and abandoned
+            uploads are aborted on enter. Defaults to the `WO_TRANSFER_JOURNAL` 
+            environment variable, the journal is not kept, if neither is set.
+        buffered_logging=False: bool
+            Flag, indicating whether metrics and parameters, passed to `log_execution`,
+            should be sent to MLflow in batches from a background thread, see
+            `BufferedLogger`, instead of a request per call. The remaining 
+            entries are sent on exit.
+        logging_interval=5.0: float
+            Interval between two batches in seconds.
         """
+        if not logging.getLogger().handlers:
+            logging.basicConfig(level=logging.INFO, 
+                format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
+
         self.inputs = inputs or []
         self.outputs = outputs or []
 
@@ -74,6 +180,25 @@ class Orchestrator(Storage, MLflow):
             {} if not default_params else default_params)
 
         self.experiment = experiment
+        if transfer_config is not None:
+            self.transfer_config = transfer_config
+        if download_cache is None and os.environ.get("WO_CACHE_DIR"):
+            download_cache = DownloadCache(os.environ["WO_CACHE_DIR"])
+            if os.environ.get("WO_CACHE_SIZE"):
+                download_cache.max_bytes = int(os.environ["WO_CACHE_SIZE"])
+        self.download_cache = download_cache
+        self.sync, self.sync_delete = sync, sync_delete
+        self.step_cache = step_cache and StepCache(self, step_cache, code_version)
+        self.fingerprint, self.cached = None, False
+        self.background_upload, self.upload_interval = background_upload, upload_interval
+        self.uploader = None
+        self.lazy_inputs, self.prefetch = lazy_inputs, prefetch
+        self.lazy = None
+        self.shard = Shard.from_env() if shard is True else (shard or None)
+        self.packed, self.chunked = packed, chunked
+        self.metadata_cache = MetadataCache(metadata_ttl) if metadata_ttl else None
+        self.journal = TransferJournal(journal) if journal else TransferJournal.default()
+        self.tracker = BufferedLogger(interval=logging_interval) if mlflow and buffered_logging else None
         self.__kubeflow, self.__mlflow, self.__dev = kubeflow, mlflow, dev
 
         if self.__mlflow:
@@ -83,11 +208,30 @@ class Orchestrator(Storage, MLflow):
             logger.setLevel(logging.DEBUG)     
 
     def __enter__(self):
-        for source, destination in self.inputs:
+        if self.tracker:
+            self.tracker.start()
+        if self.journal:
+            self.abort_abandoned()
+        if self.step_cache:
+            self.fingerprint = self.step_cache.fingerprint(self.inputs, self.get_config())
+            record = self.step_cache.lookup(self.fingerprint)
+            if record and self.step_cache.restore(record, self.outputs):
+                logger.info("Outputs of step {} are restored from cache".format(self.fingerprint))
+                self.cached = True
+                return self
+
+        if self.lazy_inputs:
+            self.lazy = LazyInputs(self, self.inputs, self.prefetch).load()
+        for source, destination, *options in ([] if self.lazy else self.inputs):
             if self.object_exists(source): 
-                self.download_file(source, destination)
+                self.download_file(source, destination, chunked=self.chunked)
+            elif self.sync:
+                self.sync_prefix(source, destination, delete=self.sync_delete, shard=self.shard, **dict(*options))
             else: 
-                self.download_prefix(source, destination)
+                self.download_prefix(source, destination, shard=self.shard, packed=self.packed, **dict(*options))
+        if self.background_upload and self.outputs:
+            self.uploader = BackgroundUploader(
+                self, self.outputs, self.upload_interval, chunked=self.chunked).start()
         return self
 
     def __exit__(self, error_type, error_value, error_traceback):
@@ -101,17 +245,77 @@ class Orchestrator(Storage, MLflow):
             self.upload_file(self.logs_file, logs_path)
             self.log_execution(outputs={"logs_path": logs_path})
 
-        if not error_type:
-            for source, destination in self.outputs:
-                if os.path.isfile(source):
-                    self.upload_prefix(source, destination)
-                else: 
-                    self.upload_prefix(source, destination)
-            return True
-        else:
-            return False
+        if self.lazy:
+            self.lazy.close()
+        try:
+            if not error_type and self.cached:
+                return True
+            if error_type and self.uploader:
+                self.uploader.close()
+            if not error_type:
+                if self.uploader:
+                    self.uploader.flush()
+                for source, destination, *options in self.outputs:
+                    if self.uploader and not (self.sync and os.path.isdir(source)):
+                        # Already uploaded, sync still updates the manifest and deletes files
+                        continue
+                    if os.path.isfile(source):
+                        self.upload_file(source, destination, chunked=self.chunked)
+                    elif self.sync:
+                        self.sync_prefix(source, destination, delete=self.sync_delete, **dict(*options))
+                    else: 
+                        self.upload_prefix(source, destination, packed=self.packed, **dict(*options))
+                if self.step_cache:
+                    self.step_cache.publish(self.fingerprint, self.outputs)
+                return True
+            else:
+                return False
+        finally:
+            # An outage of the tracking server fails neither the step nor its outputs
+            if self.tracker:
+                try:
+                    self.tracker.close()
+                except Exception as e:
+                    logger.warning("Failed to log to MLflow: {!r}".format(e))
         
 
+    def path(self, path):
+        """
+        Get a local input path, downloading it first in the lazy inputs mode.
+
+        Parameters
+        ----------
+        path: str
+            Local path of an input file or directory.
+
+        Returns
+        -------
+        str
+        """
+        return self.lazy.path(path) if self.lazy else path
+
+    def open(self, path, mode=None, **kwargs):
+        """
+        Open a local input file, downloading it first in the lazy inputs mode.
+        Remote URIs are opened with `Storage.open`.
+
+        Parameters
+        ----------
+        path: str
+            Local path of an input file or URI of a remote object.
+        mode=None: str
+            Mode, in which the file is opened. Defaults to "r" for local files
+            and to "rb" for remote objects, as in `Storage.open`.
+
+        Returns
+        -------
+        file object
+        """
+        if "://" in path:
+            return Storage.open(self, path, mode or "rb", **kwargs)
+        mode = mode or "r"
+        return self.lazy.open(path, mode, **kwargs) if self.lazy else open(path, mode, **kwargs)
+
     def get_config(self, **kwargs):
         """
         Get configuration for current execution.
@@ -124,7 +328,7 @@ class Orchestrator(Storage, MLflow):
         return Kubernetes._get_config_map(self.default_params, **kwargs)
 
     def log_execution(self, outputs=None, parameters=None, metrics=None, 
-        logs_file=None, logs_bucket=None, logs_path=None, *args, **kwargs):
+        logs_file=None, logs_bucket=None, logs_path=None, step=None, *args, **kwargs):
         """
         Log all produced information to the underlying infrastructure. 
 
@@ -137,10 +341,16 @@ class Orchestrator(Storage, MLflow):
             Parameters, used in the current execution to configure computation path. 
         metrics=None: dict
             Metrics, generated in the current execution. 
+        step=None: int
+            Step, at which the metrics were recorded, e.g. an epoch. 
         """
         if outputs and self.__kubeflow:
             Kubeflow.export_outputs(outputs, as_root=not self.__dev)
-        if metrics and self.__mlflow:
-            MLflow.log_metrics(metrics)
-        if parameters and self.__mlflow:
+        if metrics and self.tracker:
+            self.tracker.log_metrics(metrics, step=step)
+        elif metrics and self.__mlflow:
+            MLflow.log_metrics(metrics, step=step)
+        if parameters and self.tracker:
+            self.tracker.log_parameters(parameters)
+        elif parameters and self.__mlflow:
             MLflow.log_parameters(parameters)
@@ -1,27 +1,37 @@
 from wo.utils import io
-from wo.cloud.aws import S3
-from wo.cloud.gcp import GoogleStorage
-import urllib.parse, logging, sys, os
+from wo.utils.transfer import TransferConfig, TransferPool, prefetch, temporary_path
+from wo.utils.manifest import Manifest
+from wo.utils.filters import PathFilter
+from wo.utils import pack, chunking
+from wo.cloud.clients import Clients
+from wo.cloud.registry import Backends
+from wo.cloud.metadata import CachedBackend
+import urllib.parse, tempfile, hashlib, logging, random, shutil, sys, os, posixpath, io as _io
 
 __all__ = ["Storage"]
 
-logging.basicConfig(level=logging.INFO, 
-    format="%(asctime)s - %(name)s - %(levelname)s - %(module)s.%(funcName)s.%(lineno)d - %(message)s")
 logger = logging.getLogger(__name__)
 
 class Storage:
 
-    def upload_file(self, source_path, destination_path, cache=True):
+    transfer_config = TransferConfig()
+    download_cache = None
+    metadata_cache = None
+    journal = None
+
+    def upload_file(self, source_path, destination_path, cache=True, chunked=False):
         assert os.path.isfile(source_path), "{} must be file".format(source_path)
+        if chunked:
+            return self.upload_chunked(source_path, destination_path, cache=cache)
         scheme, bucket, key = io.parse_uri(destination_path)
         logger.info("Uploading file {} to {}".format(source_path, destination_path))
 
-        if scheme == "s3":
-            return S3.upload_file(bucket, source_path, key, cache=cache)
-        if scheme == 'gs': 
-            return GoogleStorage.upload_file(bucket, source_path, key, cache=cache)
+        return self._backend(scheme).upload_file(
+            bucket, source_path, key, cache=cache, config=self.transfer_config, journal=self._journal(cache))
 
-    def upload_prefix(self, source_prefix, destination_prefix, cache=True):
+    def upload_prefix(self, source_prefix, destination_prefix, cache=True, concurrency=None, packed=False,
+        include=None, exclude=None, max_depth=None
+    ):
         """
         Upload all files inside source_prefix to destination_prefix.
 
@@ -30,51 +40,941 @@ class Storage:
         source_prefix: str
         destination_prefix: str 
         cache=True: bool
+        concurrency=None: int
+            Number of files, uploaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+        packed=False: bool
+            Flag, indicating whether files should be packed into shards with 
+            `upload_packed`, which is faster for many small files.
+        include=None: str or List[str]
+            Glob patterns of the files to upload, relative to source_prefix, see
+            `PathFilter`. All files are uploaded by default.
+        exclude=None: str or List[str]
+            Glob patterns of the files to skip.
+        max_depth=None: int
+            Maximum number of path components of the uploaded files.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the files could not be uploaded. 
         """
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        if packed:
+            return self.upload_packed(source_prefix, destination_prefix, concurrency=concurrency,
+                include=include, exclude=exclude, max_depth=max_depth)
         assert os.path.isdir(source_prefix), "{} must be directory".format(source_prefix)
         logger.info("Uploading prefix {} to {}".format(source_prefix, destination_prefix))
 
-        for root, _, files in os.walk(source_prefix):
-            for file in files:
-                source_path = os.path.relpath(os.path.join(root, file), source_prefix)
-                destination_path = os.path.join(destination_prefix, source_path)
-                self.upload_file(os.path.join(root, file), destination_path, cache=cache)
+        def tasks():
+            files = io.walk_files(source_prefix)
+            if path_filter is not None:
+                files = path_filter.select(files, key=lambda item: item[1])
+            for path, relpath in files:
+                yield path, os.path.join(destination_prefix, relpath)
+
+        return self._transfer(self.upload_file, tasks(), concurrency, cache=cache)
 
-    def download_file(self, source_path, destination_path, cache=True):
+    def download_file(self, source_path, destination_path, cache=True, chunked=False):
+        if chunked:
+            return self.download_chunked(source_path, destination_path, cache=cache)
         scheme, bucket, key = io.parse_uri(source_path)
         relative_destination_path = io.parse_path(destination_path)
         logger.info("Downloading file {} to {}".format(source_path, relative_destination_path))
 
         dirname = os.path.dirname(relative_destination_path)
         if dirname: os.makedirs(dirname, exist_ok=True)
-        if scheme == "s3": 
-            return S3.download_file(bucket, key, relative_destination_path, cache=cache)
-        if scheme == "gs": 
-            return GoogleStorage.download_file(bucket, key, relative_destination_path, cache=cache)
+        if self.download_cache is not None:
+            return self._download_cached(scheme, bucket, key, relative_destination_path, cache)
+        return self._backend(scheme).download_file(
+            bucket, key, relative_destination_path, cache=cache, config=self.transfer_config, 
+            journal=self._journal(cache))
+
+    def download_prefix(self, source_prefix, destination_prefix, cache=True, concurrency=None, shard=None,
+        packed=False, include=None, exclude=None, max_depth=None
+    ):
+        """
+        Download all files under source_prefix to destination_prefix. Downloads 
+        start as soon as the first page of the listing arrives.
+
+        Parameters
+        ----------
+        source_prefix: str
+        destination_prefix: str 
+        cache=True: bool
+        concurrency=None: int
+            Number of files, downloaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+        shard=None: Shard
+            Shard of the current worker. Only the files, assigned to it, are downloaded.
+        packed=False: bool
+            Flag, indicating whether the prefix was uploaded with `upload_packed`.
+        include=None: str or List[str]
+            Glob patterns of the files to download, relative to source_prefix, see
+            `PathFilter`. Only the literal beginnings of the patterns are listed,
+            e.g. `train/` of `train/**/*.npz`. All files are downloaded by default.
+        exclude=None: str or List[str]
+            Glob patterns of the files to skip.
+        max_depth=None: int
+            Maximum number of path components of the downloaded files, e.g. 1 
+            downloads the files directly under source_prefix.
 
-    def download_prefix(self, source_prefix, destination_prefix, cache=True):
+        Raises
+        ------
+        TransferError
+            Raise if any of the files could not be downloaded. 
+        """
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        if packed:
+            return self.download_packed(source_prefix, destination_prefix, concurrency=concurrency,
+                include=include, exclude=exclude, max_depth=max_depth)
         logger.info("Downloading prefix {} to {}".format(source_prefix, destination_prefix))
+        download_path = io.parse_path(destination_prefix)
+        journal, versions = self._journal(cache), {}
+
+        def tasks():
+            for fullpath, relpath, info in self._list_shard(source_prefix, shard, path_filter):
+                versions[fullpath] = info and info.etag
+                yield fullpath, os.path.join(download_path, relpath)
+
+        def download(source_path, destination_path):
+            # Files, downloaded by an interrupted run, are skipped without a request
+            version = versions.pop(source_path)
+            if journal is None or version is None:
+                return self.download_file(source_path, destination_path, cache=cache)
+            if journal.completed(source_path, destination_path, version):
+                return logger.debug("{} is already downloaded".format(destination_path))
+            self.download_file(source_path, destination_path, cache=cache)
+            journal.complete(source_path, destination_path, version)
+
+        return self._transfer(download, tasks(), concurrency)
+
+    def upload_packed(self, source_prefix, destination_prefix, shard_size=256 * 1024 ** 2, compression=None,
+        concurrency=None, include=None, exclude=None, max_depth=None
+    ):
+        """
+        Upload all files inside source_prefix to destination_prefix, packed into
+        tar shards with an index, so that many small files take a few requests. 
+        Shards are streamed to the storage without temporary files. 
+
+        Parameters
+        ----------
+        source_prefix: str
+        destination_prefix: str 
+        shard_size=256MiB: int
+            Maximum size of the files, packed into a single shard.
+        compression=None: str
+            Compression of the shards, either None or "gz". Files of compressed 
+            shards cannot be read with range requests.
+        concurrency=None: int
+            Number of shards, uploaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+        include=None, exclude=None, max_depth=None
+            Selection of the packed files, see `upload_prefix`.
+
+        Returns
+        -------
+        int
+            Number of uploaded shards.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the shards could not be uploaded. 
+        """
+        assert os.path.isdir(source_prefix), "{} must be directory".format(source_prefix)
+        assert compression in (None, "gz"), "`compression` must be either None or \"gz\""
+        logger.info("Packing prefix {} to {}".format(source_prefix, destination_prefix))
+        files = io.walk_files(source_prefix)
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        if path_filter is not None:
+            files = path_filter.select(files, key=lambda item: item[1])
+        shards = pack.plan_shards(sorted(files, key=lambda item: item[1]), shard_size)
+        index = pack.PackIndex(
+            [pack.PackIndex.shard_name(number, compression) for number in range(len(shards))], {}, compression)
+
+        def upload(number, destination_path):
+            with self.open(destination_path, "wb") as file:
+                members = pack.write_shard(file, shards[number], compression)
+            for relpath, (offset, size) in members.items():
+                index.members[relpath] = [number, offset, size]
+
+        tasks = ((number, posixpath.join(destination_prefix, name)) for number, name in enumerate(index.shards))
+        count = self._transfer(upload, tasks, concurrency)
+        with self.open(posixpath.join(destination_prefix, pack.PackIndex.name), "wb") as file:
+            file.write(index.dumps())
+        return count
+
+    def download_packed(self, source_prefix, destination_prefix, concurrency=None, include=None, exclude=None,
+        max_depth=None
+    ):
+        """
+        Download files of a prefix, uploaded with `upload_packed`. Shards are 
+        unpacked in parallel, while they are being downloaded.
+
+        Parameters
+        ----------
+        source_prefix: str
+        destination_prefix: str 
+        concurrency=None: int
+            Number of shards, downloaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+        include=None, exclude=None, max_depth=None
+            Selection of the extracted files, see `download_prefix`. Only the 
+            shards, which contain any of them, are downloaded.
+
+        Returns
+        -------
+        int
+            Number of downloaded shards.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the shards could not be downloaded. 
+        """
+        logger.info("Unpacking prefix {} to {}".format(source_prefix, destination_prefix))
+        index = self._pack_index(source_prefix)
+        download_path = io.parse_path(destination_prefix)
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        # Members of each shard to extract, None extracts all of them
+        members = dict((number, None) for number in range(len(index.shards)))
+        if path_filter is not None:
+            members = {}
+            for relpath in path_filter.select(index.members):
+                members.setdefault(index.members[relpath][0], set()).add(relpath)
+
+        def download(number, destination_path):
+            source_path = posixpath.join(source_prefix, index.shards[number])
+            with self.open(source_path, "rb", read_ahead=self.transfer_config.part_size) as file:
+                pack.extract_shard(file, destination_path, members[number])
+
+        tasks = ((number, download_path) for number in sorted(members))
+        return self._transfer(download, tasks, concurrency)
+
+    def read_packed(self, source_prefix, relpath):
+        """
+        Read a single file of a prefix, uploaded with `upload_packed`. Files of
+        uncompressed shards are read with a range request.
+
+        Parameters
+        ----------
+        source_prefix: str
+        relpath: str
+            Path of the file, relative to the prefix.
 
-        for fullpath, relpath in self.list_prefix(source_prefix):
-            download_path = io.parse_path(destination_prefix)
-            relative_download_path = os.path.join(download_path, relpath)
-            dirname = os.path.dirname(relative_download_path)
-            if dirname: os.makedirs(dirname, exist_ok=True)
-            self.download_file(fullpath, relative_download_path, cache=cache)
+        Returns
+        -------
+        bytes
 
-    def list_prefix(self, source_prefix):
+        Raises
+        ------
+        FileNotFoundError
+            Raise if there is no such file in the prefix.
+        """
+        index = self._pack_index(source_prefix)
+        if relpath not in index.members:
+            raise FileNotFoundError(posixpath.join(source_prefix, relpath))
+        number, offset, size = index.members[relpath]
+        shard = posixpath.join(source_prefix, index.shards[number])
+
+        if index.compression:
+            with self.open(shard, "rb", read_ahead=self.transfer_config.part_size) as file, \
+                    tempfile.TemporaryDirectory() as directory:
+                pack.extract_shard(file, directory, {relpath})
+                with open(os.path.join(directory, relpath), "rb") as member:
+                    return member.read()
+        with self.open(shard, "rb", block_size=64 * 1024) as file:
+            file.seek(offset)
+            return file.read(size)
+
+    def upload_chunked(self, source_path, destination_path, store=None, cache=True, concurrency=None,
+        min_size=512 * 1024, avg_size=2 * 1024 ** 2, max_size=8 * 1024 ** 2
+    ):
+        """
+        Upload file as content-defined chunks, skipping the chunks, which are 
+        already in the store. A recipe, listing the chunks, is written under 
+        destination_path, so successive versions of a file, which differ in a 
+        small part of their bytes, share most of their chunks.
+
+        Parameters
+        ----------
+        source_path: str
+        destination_path: str
+            URI, where the recipe is written.
+        store=None: str
+            URI of the chunk store. Defaults to `.wo-chunks` in the bucket of 
+            destination_path.
+        cache=True: bool
+            If the recipe already describes the same file, skip uploading.
+        concurrency=None: int
+            Number of chunks, uploaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+        min_size=512KiB: int
+        avg_size=2MiB: int
+        max_size=8MiB: int
+            Chunking parameters, see `chunking.chunk_boundaries`.
+
+        Returns
+        -------
+        int
+            Number of uploaded chunks.
+        """
+        scheme, bucket, key = io.parse_uri(destination_path)
+        store = (store or "{}://{}/{}".format(scheme, bucket, ".wo-chunks")).rstrip("/")
+        store_backend, store_bucket, store_key = self._locate(store)
+        logger.info("Uploading file {} to {} in chunks".format(source_path, destination_path))
+
+        previous = self._recipe(destination_path)
+        if previous is not None and previous.store != store:
+            previous = None
+        chunks, md5 = chunking.chunk_file(source_path, min_size, avg_size, max_size)
+        if cache and previous is not None and previous.md5 == md5:
+            logger.debug("Local and remote objects are the same, skipping upload")
+            return 0
+
+        # Chunks of the previous version are known to be in the store
+        known = set(digest for digest, _ in previous.chunks) if previous is not None else set()
+        unique = dict((digest, (offset, size)) for offset, size, digest in chunks)
+        uploaded = []
+
+        def upload(digest, location):
+            path = posixpath.join(store_key, digest[:2], digest)
+            if digest in known or store_backend.object_exists(store_bucket, path):
+                return
+            with open(source_path, "rb") as file:
+                data = os.pread(file.fileno(), location[1], location[0])
+            store_backend.write_object(store_bucket, path, data)
+            uploaded.append(digest)
+
+        self._transfer(upload, unique.items(), concurrency)
+        recipe = chunking.Recipe(store, [[digest, size] for _, size, digest in chunks], 
+            os.path.getsize(source_path), md5, min_size, avg_size, max_size)
+        self._backend(scheme).write_object(bucket, key, recipe.dumps())
+        logger.info("Uploaded {} of {} chunks".format(len(uploaded), len(chunks)))
+        return len(uploaded)
+
+    def download_chunked(self, source_path, destination_path, cache=True, concurrency=None):
+        """
+        Download file, uploaded with `upload_chunked`. Chunks are fetched in 
+        parallel; chunks, which are present in the existing local file, e.g. 
+        a previous version, are copied from it instead. An object, which is 
+        not a recipe, is downloaded as a plain file.
+
+        Parameters
+        ----------
+        source_path: str
+            URI of the recipe or of a plain object.
+        destination_path: str
+        cache=True: bool
+            If the local file is the same, skip downloading.
+        concurrency=None: int
+            Number of chunks, downloaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+
+        Returns
+        -------
+        int or None
+            Number of downloaded chunks, None if a plain object was downloaded.
+        """
+        recipe = self._recipe(source_path)
+        if recipe is None:
+            # Inputs of a chunked orchestrator may have been uploaded as plain files
+            return self.download_file(source_path, destination_path, cache=cache)
+        store_backend, store_bucket, store_key = self._locate(recipe.store)
+        destination_path = io.parse_path(destination_path)
+        logger.info("Downloading file {} to {} in chunks".format(source_path, destination_path))
+        if os.path.dirname(destination_path):
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+
+        local = {}
+        if os.path.isfile(destination_path):
+            chunks, md5 = chunking.chunk_file(destination_path, recipe.min_size, recipe.avg_size, recipe.max_size)
+            if cache and md5 == recipe.md5:
+                logger.debug("Local and remote objects are the same, skipping download")
+                return 0
+            local = dict((digest, (offset, size)) for offset, size, digest in chunks)
+
+        offsets = {}
+        for digest, offset, _ in recipe.offsets():
+            offsets.setdefault(digest, []).append(offset)
+        downloaded = []
+        temporary = temporary_path(destination_path)
+        descriptor = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        def download(digest, targets):
+            if digest in local:
+                with open(destination_path, "rb") as file:
+                    data = os.pread(file.fileno(), local[digest][1], local[digest][0])
+            else:
+                data = store_backend.read_object(store_bucket, posixpath.join(store_key, digest[:2], digest))
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise IOError("Chunk {} of {} is corrupted".format(digest, source_path))
+                downloaded.append(digest)
+            for offset in targets:
+                os.pwrite(descriptor, data, offset)
+
+        try:
+            os.ftruncate(descriptor, recipe.size)
+            self._transfer(download, offsets.items(), concurrency)
+        except BaseException:
+            os.close(descriptor)
+            os.remove(temporary)
+            raise
+        os.close(descriptor)
+        os.replace(temporary, destination_path)
+        logger.info("Downloaded {} of {} chunks".format(len(downloaded), len(offsets)))
+        return len(downloaded)
+
+    def list_prefix(self, source_prefix, page_size=1000, start_after=None, include=None, exclude=None,
+        max_depth=None, delimiter=None
+    ):
+        """
+        Lazily list all files under source_prefix.
+
+        ```
+        for uri, relpath in storage.list_prefix("s3://bucket/data", include="train/**/*.npz"):
+            # only `data/train/` is listed
+        ```
+
+        Parameters
+        ----------
+        source_prefix: str
+        page_size=1000: int
+            Maximum number of objects, fetched from the storage per request.
+        start_after=None: str
+            Path, relative to source_prefix, after which listing should start.
+            Can be used to resume an interrupted listing.
+        include=None: str or List[str]
+            Glob patterns of the listed files, relative to source_prefix, see 
+            `PathFilter`. Literal beginnings of the patterns are listed instead 
+            of the whole prefix. All files are listed by default.
+        exclude=None: str or List[str]
+            Glob patterns of the files to skip.
+        max_depth=None: int
+            Maximum number of path components of the listed files. Files directly 
+            under source_prefix are listed by delimiter, without enumerating the
+            nested ones.
+        delimiter=None: str
+            Delimiter, e.g. `/`. If set, only the entries directly under 
+            source_prefix are listed, directories are returned once, with a 
+            trailing delimiter in their relative paths.
+
+        Returns
+        -------
+        iter: (full_path, relative_path)
+        """
         scheme, bucket, key = io.parse_uri(source_prefix)
         logger.info("Listing files from {}".format(source_prefix))
+        if start_after:
+            start_after = posixpath.join(key, start_after)
+
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        if path_filter is None and delimiter is None:
+            # The manifest, written by `sync_prefix`, is not a part of the data
+            return ((fullpath, relpath) for fullpath, relpath in 
+                self._backend(scheme).list_folder(bucket, key, page_size=page_size, start_after=start_after)
+                if relpath != Manifest.name)
+        key = key and key + "/"
+        return (("{}://{}/{}".format(scheme, bucket, info.key), info.key[len(key):]) for info in 
+            self._list_filtered(self._backend(scheme), bucket, key, path_filter, page_size, start_after, delimiter))
+
+    def iter_objects(self, source_prefix, shuffle=False, seed=None, depth=None, concurrency=None):
+        """
+        Iterate over contents of all objects under source_prefix, without 
+        storing them on disk. Objects are downloaded ahead of consumption, 
+        keeping at most `depth` of them in memory.
+
+        ```
+        for key, payload in storage.iter_objects("s3://bucket/shards", shuffle=True, seed=epoch):
+            train_on(decode(payload))
+        ```
 
-        if scheme == 's3': 
-            return iter(S3.list_folder(bucket, key))
-        if scheme == 'gs': 
-            return iter(GoogleStorage.list_folder(bucket, key))
+        Parameters
+        ----------
+        source_prefix: str
+        shuffle=False: bool
+            Flag, indicating whether objects should be yielded in a random order
+            instead of the listing order. The whole listing is fetched first.
+        seed=None: int
+            Seed of the shuffle.
+        depth=None: int
+            Maximum number of objects, downloaded ahead of the consumer. Defaults
+            to twice the concurrency.
+        concurrency=None: int
+            Number of objects, downloaded at the same time. Defaults to 
+            `transfer_config.concurrency`.
+
+        Returns
+        -------
+        iter: (relative_path, bytes)
+        """
+        concurrency = concurrency or self.transfer_config.concurrency
+        self._configure_clients(concurrency)
+        objects = self.list_prefix(source_prefix)
+        if shuffle:
+            objects = list(objects)
+            random.Random(seed).shuffle(objects)
+
+        def read(item):
+            scheme, bucket, key = io.parse_uri(item[0])
+            return self._backend(scheme).read_object(bucket, key)
+
+        for (_, relpath), payload in prefetch(read, objects, depth or 2 * concurrency, concurrency):
+            yield relpath, payload
+
+    def open(self, uri, mode="rb", encoding=None, **kwargs):
+        """
+        Open a remote object as a file, without downloading it whole.
+
+        In the read modes the object is read with range requests, through a 
+        read-ahead buffer and a cache of blocks, and can be seeked. In the write
+        modes the data is streamed to a multipart upload, the object appears 
+        once the file is closed.
+
+        ```
+        with storage.open("s3://bucket/data.npz") as file:
+            arrays = numpy.load(file)
+        ```
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        mode="rb": str
+            One of "rb", "r", "wb" or "w".
+        encoding=None: str
+            Encoding of the text modes.
+        **kwargs
+            Parameters of `RemoteReader`: `block_size`, `read_ahead` and `cache_blocks`.
+
+        Returns
+        -------
+        file object
+        """
+        if mode not in ("rb", "r", "wb", "w"):
+            raise ValueError("Unsupported mode {!r}".format(mode))
+        scheme, bucket, key = io.parse_uri(uri)
+        logger.debug("Opening {} in mode {}".format(uri, mode))
+
+        binary = "w" if "w" in mode else "r"
+        if binary == "w" and self.journal is not None:
+            kwargs["journal"] = self.journal
+        file = self._backend(scheme).open(bucket, key, binary + "b", config=self.transfer_config, **kwargs)
+        if "b" in mode:
+            return file
+        if binary == "r":
+            return _io.TextIOWrapper(_io.BufferedReader(file), encoding=encoding)
+        return _TextWriter(_io.BufferedWriter(file), encoding=encoding)
+
+    def copy(self, source_path, destination_path, cache=True):
+        """
+        Copy a remote object to another remote location without downloading it. 
+
+        Within the same storage the object is copied on the server side, large
+        objects in parts (S3 `UploadPartCopy`, GCS rewrite). Between different 
+        storages it is streamed through memory, without touching the disk.
+
+        Parameters
+        ----------
+        source_path: str
+            URI of the source object.
+        destination_path: str
+            URI, where the object should be copied.
+        cache=True: bool
+            If the destination object already has the same contents, skip copying.
+
+        Raises
+        ------
+        FileNotFoundError
+            Raise if there is no source object.
+        """
+        logger.info("Copying {} to {}".format(source_path, destination_path))
+        source_backend, source_bucket, source_key = self._locate(source_path)
+        source_info = source_backend.head_object(source_bucket, source_key)
+        if source_info is None:
+            raise FileNotFoundError(source_path)
+
+        destination_info = None
+        if cache:
+            destination_backend, destination_bucket, destination_key = self._locate(destination_path)
+            destination_info = destination_backend.head_object(destination_bucket, destination_key)
+        self._copy_object(source_path, destination_path, cache, source_info, destination_info)
+
+    def copy_prefix(self, source_prefix, destination_prefix, cache=True, concurrency=None):
+        """
+        Copy all objects under source_prefix to destination_prefix, see `copy`. 
+        Both prefixes are listed once to find objects, which are already copied.
+
+        Parameters
+        ----------
+        source_prefix: str
+        destination_prefix: str 
+        cache=True: bool
+        concurrency=None: int
+            Number of objects, copied at the same time. Defaults to 
+            `transfer_config.concurrency`.
+
+        Returns
+        -------
+        int
+            Number of objects, which were compared against the destination.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the objects could not be copied. 
+        """
+        logger.info("Copying prefix {} to {}".format(source_prefix, destination_prefix))
+        source_scheme, source_bucket, source_key = io.parse_uri(source_prefix)
+        scheme, bucket, key = io.parse_uri(destination_prefix)
+        source_key, key = source_key and source_key + "/", key and key + "/"
+
+        existing, sources = {}, {}
+        if cache:
+            existing = dict((info.key[len(key):], info) for info in self._backend(scheme).list_objects(bucket, key))
+
+        def tasks():
+            for info in self._backend(source_scheme).list_objects(source_bucket, source_key):
+                source_path = "{}://{}/{}".format(source_scheme, source_bucket, info.key)
+                sources[source_path] = info
+                yield source_path, "{}://{}/{}{}".format(scheme, bucket, key, info.key[len(source_key):])
+
+        def copy(source_path, destination_path):
+            info = sources.pop(source_path)
+            self._copy_object(source_path, destination_path, cache, info, existing.get(info.key[len(source_key):]))
+
+        return self._transfer(copy, tasks(), concurrency)
+
+    def sync_prefix(self, source_prefix, destination_prefix, delete=False, concurrency=None, shard=None,
+        include=None, exclude=None, max_depth=None
+    ):
+        """
+        Synchronize destination_prefix with source_prefix, transferring only 
+        missing and changed files. Direction of the transfer is determined by 
+        which of the prefixes is a remote URI.
+
+        The remote prefix is listed once and compared against the local tree, 
+        instead of requesting each object separately. Hashes of the remote 
+        objects are taken from the manifest, written beside the data on upload, 
+        or from the listing itself, if the backend reports them. 
+
+        Parameters
+        ----------
+        source_prefix: str
+        destination_prefix: str 
+        delete=False: bool
+            Remove files from destination_prefix, which do not exist in source_prefix.
+        concurrency=None: int
+            Number of files, transferred at the same time. Defaults to 
+            `transfer_config.concurrency`.
+        shard=None: Shard
+            Shard of the current worker, when downloading. Only the files, assigned
+            to it, are synchronized.
+        include=None, exclude=None, max_depth=None
+            Selection of the synchronized files, see `download_prefix`. Files, 
+            which are not selected, are neither transferred nor deleted.
+
+        Returns
+        -------
+        int
+            Number of files, which were compared against the destination.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the files could not be transferred. 
+        """
+        path_filter = PathFilter.from_options(include, exclude, max_depth)
+        if urllib.parse.urlparse(source_prefix).scheme:
+            return self._sync_download(source_prefix, destination_prefix, delete, concurrency, shard, path_filter)
+        return self._sync_upload(source_prefix, destination_prefix, delete, concurrency, path_filter)
+
+    def _sync_upload(self, source_prefix, destination_prefix, delete, concurrency, path_filter=None):
+        assert os.path.isdir(source_prefix), "{} must be directory".format(source_prefix)
+        logger.info("Synchronizing prefix {} to {}".format(source_prefix, destination_prefix))
+        scheme, bucket, key = io.parse_uri(destination_prefix)
+        backend, key = self._backend(scheme), key and key + "/"
+        # The manifest covers the whole prefix, so the remote state is not filtered
+        remote = self._remote_state(backend, bucket, key)
+        files = io.walk_files(source_prefix)
+        if path_filter is not None:
+            files = path_filter.select(files, key=lambda item: item[1])
+        local = dict((relpath, path) for path, relpath in files)
+        # Hashes of the uploaded contents, the local files may change afterwards
+        hashes = {}
+
+        def upload(source_path, destination_path):
+            relpath = io.parse_path(destination_path)[len(key):]
+            info, before = remote.get(relpath), os.stat(source_path)
+            md5 = io.md5_file(source_path)
+            if info and info.md5 and info.size == before.st_size and info.md5 == md5:
+                hashes[relpath] = info.md5
+                return
+            self.upload_file(source_path, destination_path, cache=bool(info) and not info.md5)
+            after = os.stat(source_path)
+            if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+                hashes[relpath] = md5
+
+        tasks = ((path, "{}://{}/{}{}".format(scheme, bucket, key, relpath)) for relpath, path in local.items())
+        count = self._transfer(upload, tasks, concurrency)
+
+        manifest = Manifest()
+        for info in backend.list_objects(bucket, key):
+            relpath = info.key[len(key):]
+            if relpath in local:
+                # A file, modified during its upload, is left to the hash of the listing
+                if hashes.get(relpath):
+                    manifest.files[relpath] = {"md5": hashes[relpath], "size": info.size, "etag": info.etag}
+            elif path_filter is not None and not path_filter.matches(relpath):
+                if relpath in remote and remote[relpath].md5:
+                    manifest.files[relpath] = {"md5": remote[relpath].md5, "size": info.size, "etag": info.etag}
+            elif delete and relpath != Manifest.name:
+                logger.info("Deleting {}://{}/{}".format(scheme, bucket, info.key))
+                backend.delete_object(bucket, info.key)
+        backend.write_object(bucket, key + Manifest.name, manifest.dumps())
+        return count
+
+    def _sync_download(self, source_prefix, destination_prefix, delete, concurrency, shard=None, path_filter=None):
+        logger.info("Synchronizing prefix {} to {}".format(source_prefix, destination_prefix))
+        scheme, bucket, key = io.parse_uri(source_prefix)
+        backend, key = self._backend(scheme), key and key + "/"
+        listed = remote = self._remote_state(backend, bucket, key, path_filter)
+        if shard is not None:
+            remote = dict(shard.select(remote.items(), key=lambda item: item[0], size=lambda item: item[1].size))
+        download_path = io.parse_path(destination_prefix)
+
+        def download(source_path, destination_path):
+            info = remote[io.parse_path(source_path)[len(key):]]
+            if info.md5 and os.path.isfile(destination_path) \
+                    and info.size == os.path.getsize(destination_path) \
+                    and info.md5 == io.md5_file(destination_path):
+                return
+            self.download_file(source_path, destination_path, cache=not info.md5)
+
+        tasks = (("{}://{}/{}{}".format(scheme, bucket, key, relpath), os.path.join(download_path, relpath))
+            for relpath in remote)
+        count = self._transfer(download, tasks, concurrency)
+
+        if delete and os.path.isdir(download_path):
+            # Files of the other shards are left to their workers
+            for path, relpath in io.walk_files(download_path):
+                if relpath in listed or (shard is not None and not shard.owns(relpath)):
+                    continue
+                if path_filter is None or path_filter.matches(relpath):
+                    logger.info("Deleting {}".format(path))
+                    os.remove(path)
+        return count
+
+    def abort_abandoned(self, max_age=600.0):
+        """
+        Abort multipart uploads, recorded in the journal by another process, 
+        which will not be completed, see `TransferJournal.abandoned`. Uploads 
+        of unchanged files are kept, so that they can be resumed.
+
+        Parameters
+        ----------
+        max_age=600.0: float
+            Time in seconds, after which an upload of a stream is abandoned.
+
+        Returns
+        -------
+        int
+            Number of aborted uploads.
+        """
+        if self.journal is None:
+            return 0
+        count = 0
+        for uri, upload_id in self.journal.abandoned(max_age):
+            scheme, bucket, key = io.parse_uri(uri)
+            logger.info("Aborting abandoned upload of {}".format(uri))
+            try:
+                self._backend(scheme).abort_upload(bucket, key, upload_id)
+            except Exception as e:
+                logger.warning("Failed to abort upload of {}: {!r}".format(uri, e))
+                continue
+            self.journal.finish_upload(upload_id)
+            count += 1
+        return count
+
+    def _journal(self, cache):
+        # Transfers are only resumed, when existing files may be reused
+        return self.journal if cache else None
+
+    def _locate(self, uri):
+        scheme, bucket, key = io.parse_uri(uri)
+        return self._backend(scheme), bucket, key
+
+    def _recipe(self, path):
+        # The object may be a large file, uploaded without chunking, so only
+        # its beginning is read, until it is known to be a recipe.
+        try:
+            with self.open(path, "rb") as file:
+                data = file.read(len(chunking.Recipe.header))
+                if data != chunking.Recipe.header:
+                    return None
+                return chunking.Recipe.loads(data + file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _pack_index(self, source_prefix):
+        scheme, bucket, key = io.parse_uri(source_prefix)
+        return pack.PackIndex.loads(self._backend(scheme).read_object(bucket, posixpath.join(key, pack.PackIndex.name)))
+
+    def _list_shard(self, source_prefix, shard, path_filter=None):
+        if shard is None and path_filter is None and self.metadata_cache is None and self.journal is None:
+            return ((fullpath, relpath, None) for fullpath, relpath in self.list_prefix(source_prefix))
+        scheme, bucket, key = io.parse_uri(source_prefix)
+        key = key and key + "/"
+        # Objects are listed with their metadata, so that it is cached for the downloads
+        if path_filter is None:
+            objects = (info for info in self._backend(scheme).list_objects(bucket, key) 
+                if info.key[len(key):] != Manifest.name)
+        else:
+            objects = self._list_filtered(self._backend(scheme), bucket, key, path_filter)
+        if shard is None and path_filter is None:
+            return self._list_cached(source_prefix, objects, scheme, bucket, key)
+        if shard is None:
+            # A filter may select no files, which is not an error
+            return (("{}://{}/{}".format(scheme, bucket, info.key), info.key[len(key):], info) for info in objects)
+        logger.info("Selecting files of {}".format(shard))
+        if path_filter is None:
+            # A missing prefix is an error, as without a shard, a shard without files is not
+            objects = self._nonempty(objects, source_prefix)
+        return (("{}://{}/{}".format(scheme, bucket, info.key), info.key[len(key):], info) 
+            for info in shard.select(objects, key=lambda info: info.key[len(key):], size=lambda info: info.size))
+
+    @staticmethod
+    def _nonempty(objects, source_prefix):
+        found = False
+        for info in objects:
+            found = True
+            yield info
+        if not found:
+            raise ValueError("Could not find any contents under {}".format(source_prefix))
+
+    def _list_cached(self, source_prefix, objects, scheme, bucket, key):
+        found = False
+        for info in objects:
+            found = True
+            yield "{}://{}/{}".format(scheme, bucket, info.key), info.key[len(key):], info
+        if not found:
+            # The backend decides, whether an empty prefix is an error
+            for fullpath, relpath in self.list_prefix(source_prefix):
+                yield fullpath, relpath, None
+
+    def _list_filtered(self, backend, bucket, key, path_filter=None, page_size=1000, start_after=None,
+        delimiter=None
+    ):
+        prefixes = path_filter.prefixes() if path_filter is not None else [""]
+        query_delimiter = delimiter
+        if delimiter is None and path_filter is not None and path_filter.max_depth == 1:
+            # Nested objects are collapsed by the storage instead of being enumerated
+            query_delimiter = "/"
+        if query_delimiter is not None:
+            # Only the first component of a literal prefix lies directly under the key
+            prefixes = sorted(set(prefix.split(query_delimiter, 1)[0] for prefix in prefixes))
+            prefixes = [prefix for index, prefix in enumerate(prefixes) 
+                if index == 0 or not prefix.startswith(prefixes[index - 1])]
+
+        for prefix in prefixes:
+            if prefix:
+                logger.debug("Listing {}/{}{}".format(bucket, key, prefix))
+            for info in backend.list_objects(bucket, key + prefix, page_size=page_size, start_after=start_after, 
+                    delimiter=query_delimiter):
+                relpath = info.key[len(key):]
+                if relpath == Manifest.name:
+                    continue
+                if info.size is None:
+                    if delimiter is None or (path_filter is not None and not path_filter.contains(relpath)):
+                        continue
+                elif path_filter is not None and not path_filter.matches(relpath):
+                    continue
+                yield info
+
+    def _remote_state(self, backend, bucket, key, path_filter=None):
+        try:
+            manifest = Manifest.loads(backend.read_object(bucket, key + Manifest.name))
+        except FileNotFoundError:
+            manifest = Manifest()
+
+        state = {}
+        objects = backend.list_objects(bucket, key) if path_filter is None \
+            else self._list_filtered(backend, bucket, key, path_filter)
+        for info in objects:
+            relpath = info.key[len(key):]
+            if relpath != Manifest.name:
+                state[relpath] = info._replace(md5=manifest.md5(relpath, info))
+        return state
+
+    def _copy_remote(self, source, destination, concurrency=None):
+        if io.parse_path(source) and self.object_exists(source):
+            return self.copy(source, destination)
+        return self.copy_prefix(source, destination, concurrency=concurrency)
+
+    def _copy_object(self, source_path, destination_path, cache=True, source_info=None, destination_info=None):
+        source_backend, source_bucket, source_key = self._locate(source_path)
+        destination_backend, destination_bucket, destination_key = self._locate(destination_path)
+        same_storage = io.parse_uri(source_path)[0] == io.parse_uri(destination_path)[0]
+
+        if cache and destination_info is not None and source_info.size == destination_info.size:
+            unchanged = (same_storage and source_info.etag == destination_info.etag) \
+                or (source_info.md5 is not None and source_info.md5 == destination_info.md5)
+            if not unchanged and (source_info.md5 is None or destination_info.md5 is None):
+                # Listings of some backends carry no md5 hashes, HEAD requests do
+                source_info = source_backend.head_object(source_bucket, source_key) or source_info
+                destination_info = destination_backend.head_object(destination_bucket, destination_key)
+                unchanged = destination_info is not None and source_info.md5 is not None \
+                    and source_info.md5 == destination_info.md5
+            if unchanged:
+                return logger.debug("Source and destination objects are the same, skipping copy")
+
+        if same_storage:
+            return source_backend.copy_object(
+                source_bucket, source_key, destination_bucket, destination_key, config=self.transfer_config)
+        # Objects cannot be copied between providers on the server side, so they are
+        # streamed through memory, a part at a time.
+        with self.open(source_path, "rb", read_ahead=self.transfer_config.part_size) as source, \
+                self.open(destination_path, "wb") as destination:
+            shutil.copyfileobj(source, destination, self.transfer_config.part_size)
+
+    def _backend(self, scheme):
+        if self.metadata_cache is not None:
+            return CachedBackend(Backends.get(scheme), scheme, self.metadata_cache)
+        return Backends.get(scheme)
+
+    def _download_cached(self, scheme, bucket, key, destination_path, cache):
+        backend = self._backend(scheme)
+        origin = "{}://{}".format(scheme, bucket)
+        digest = backend.object_digest(bucket, key)
+
+        if self.download_cache.fetch(origin, key, digest, destination_path):
+            return
+        backend.download_file(bucket, key, destination_path, cache=cache, config=self.transfer_config, 
+            journal=self._journal(cache))
+        self.download_cache.store(origin, key, digest, destination_path)
+
+    def _transfer(self, function, tasks, concurrency=None, **kwargs):
+        concurrency = concurrency or self.transfer_config.concurrency
+        self._configure_clients(concurrency)
+        pool = TransferPool(concurrency)
+        return pool.run(function, tasks, **kwargs)
+
+    def _configure_clients(self, concurrency):
+        if Clients.max_pool_connections < max(concurrency, self.transfer_config.max_pool_connections):
+            Clients.configure(max(concurrency, self.transfer_config.max_pool_connections))
 
     def object_exists(self, path):
         scheme, bucket, key = io.parse_uri(path)
         
-        if scheme == 's3':
-            return S3.object_exists(bucket, key)
-        if scheme == 'gs':
-            raise NotImplementedError
\ No newline at end of file
+        return self._backend(scheme).object_exists(bucket, key)
+
+
+class _TextWriter(_io.TextIOWrapper):
+    """ Text stream over a remote writer, which discards the upload on errors. """
+
+    def __exit__(self, error_type, error_value, error_traceback):
+        if error_type is not None:
+            # The closed writer makes the wrapper closed, so nothing is flushed
+            self.buffer.raw.abort()
+        return super().__exit__(error_type, error_value, error_traceback)
@@ -0,0 +1,185 @@
+import concurrent.futures, threading, logging, time, os
+
+from wo.utils import io
+from wo.utils.filters import PathFilter
+from wo.utils.transfer import TransferError
+from wo.cloud.clients import Clients
+
+__all__ = ["BackgroundUploader"]
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundUploader:
+    """
+    Uploads outputs of a step, while the step is still running.
+
+    Output sources are scanned every `interval` seconds. A file is uploaded once
+    its size and modification time have stayed the same for `settle` seconds,
+    i.e. once the step has finished writing it. A file, modified after it was
+    uploaded, is uploaded again. Uploads go through `Storage.upload_file`, so a
+    file, whose contents match the remote object, is not sent twice. `flush`
+    uploads all of the remaining files, regardless of whether they have settled.
+    """
+
+    def __init__(self, storage, outputs, interval=5.0, settle=None, concurrency=None, chunked=False):
+        """
+        Parameters
+        ----------
+        storage: Storage
+            Storage, used to upload the files.
+        outputs: List[tuple]
+            Outputs of the step, as passed to `Orchestrator`.
+        interval=5.0: float
+            Interval between two scans of the outputs in seconds.
+        settle=None: float
+            Time in seconds, during which a file must stay unchanged to be uploaded.
+            Defaults to `interval`.
+        concurrency=None: int
+            Number of files, uploaded at the same time. Defaults to 
+            `transfer_config.concurrency` of the storage.
+        chunked=False: bool
+            Flag, indicating whether file outputs should be uploaded in chunks, 
+            see `Storage.upload_chunked`. Files of prefix outputs are uploaded whole.
+        """
+        self.storage, self.outputs, self.interval = storage, outputs, interval
+        self.chunked = chunked
+        self.settle = interval if settle is None else settle
+        self.concurrency = concurrency or storage.transfer_config.concurrency
+        self.uploaded = {}
+        self._seen, self._pending, self._errors, self._failed = {}, {}, {}, {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def start(self):
+        """ Start scanning the outputs in a background thread. """
+        if Clients.max_pool_connections < self.concurrency:
+            Clients.configure(self.concurrency)
+        self._thread = threading.Thread(target=self._run, name="wo-uploader", daemon=True)
+        self._thread.start()
+        return self
+
+    def scan(self, final=False, retry=True):
+        """
+        Scan the outputs once and schedule uploads of the settled files.
+
+        Parameters
+        ----------
+        final=False: bool
+            Flag, indicating whether all of the changed files should be scheduled,
+            whether they have settled or not.
+        retry=True: bool
+            Flag, indicating whether files, whose upload has failed, should be 
+            scheduled again, if they have not changed since.
+
+        Returns
+        -------
+        int
+            Number of scheduled uploads.
+        """
+        now, count = time.monotonic(), 0
+        for path, destination_path in self._files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature = stat.st_size, stat.st_mtime_ns
+            with self._lock:
+                if path in self._pending or self.uploaded.get(path) == signature:
+                    continue
+                if not retry and self._failed.get(path) == signature:
+                    continue
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != signature:
+                self._seen[path] = signature, now
+                if not final:
+                    continue
+            elif not final and now - seen[1] < self.settle:
+                continue
+            self._submit(path, destination_path, signature)
+            count += 1
+        return count
+
+    def flush(self):
+        """
+        Stop scanning, upload all of the remaining files and wait for the uploads
+        to complete. Files, which were modified while they were being uploaded,
+        are uploaded again, until none of them changes.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the files could not be uploaded.
+        """
+        self._halt()
+        self.scan(final=True)
+        # Uploads in flight skip the scan, so their files are checked once they complete
+        while True:
+            with self._lock:
+                pending = list(self._pending.values())
+            concurrent.futures.wait(pending)
+            if not self.scan(final=True, retry=False):
+                break
+        self._executor.shutdown(wait=True)
+        if self._errors:
+            raise TransferError(sorted(self._errors.items()))
+
+    def close(self):
+        """ Stop scanning and cancel scheduled uploads, without flushing. """
+        self._halt()
+        with self._lock:
+            for future in list(self._pending.values()):
+                future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _halt(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.warning("Failed to scan outputs: {!r}".format(e))
+
+    def _files(self):
+        for source, destination, *options in self.outputs:
+            if os.path.isfile(source):
+                yield source, destination
+            elif os.path.isdir(source):
+                files = io.walk_files(source)
+                path_filter = PathFilter.from_options(**dict(*options))
+                if path_filter is not None:
+                    files = path_filter.select(files, key=lambda item: item[1])
+                for path, relpath in files:
+                    yield path, os.path.join(destination, relpath)
+
+    def _submit(self, path, destination_path, signature):
+        with self._lock:
+            future = self._executor.submit(self._upload, path, destination_path, signature)
+            self._pending[path] = future
+
+    def _upload(self, path, destination_path, signature):
+        try:
+            self.storage.upload_file(path, destination_path, 
+                chunked=self.chunked and any(path == source for source, *_ in self.outputs))
+        except Exception as e:
+            if os.path.exists(path):
+                logger.error("Failed to upload {}: {!r}".format(path, e))
+                with self._lock:
+                    self._errors[path] = e
+                    self._failed[path] = signature
+        else:
+            # A file, modified during the upload, differs from the signature 
+            # and is uploaded again.
+            with self._lock:
+                self.uploaded[path] = signature
+                self._errors.pop(path, None)
+                self._failed.pop(path, None)
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
@@ -0,0 +1,190 @@
+import hashlib, logging, threading, shutil, fcntl, errno, time, os, contextlib
+
+__all__ = ["DownloadCache"]
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCache:
+    """
+    Node-local content-addressed cache of downloaded objects.
+
+    Entries are keyed by bucket, key and content hash of the remote object, so
+    a changed object never hits a stale entry. Downloaded files are copied into
+    the cache, cache hits are copied into the destination, so inputs stay 
+    writable. With `link` set, cache hits are hardlinked instead (or copied, 
+    when the destination lives on another file system), which saves the copy, 
+    but makes the inputs read-only. Entries are read-only, and their 
+    modification time is pinned, so that an entry, modified in place despite 
+    that, e.g. by root through a hardlink, is detected and dropped instead of 
+    being served. Recency of use is tracked by the access time. The cache directory may be shared by 
+    several processes, e.g. pods mounting the same hostPath volume; all 
+    modifications are serialized by a lock file.
+    """
+
+    # Modification time of the entries in nanoseconds
+    _sealed_mtime = 0
+
+    def __init__(self, directory, max_bytes=10 * 1024 ** 3, link=False):
+        """
+        Parameters
+        ----------
+        directory: str
+            Directory, where cached objects are stored.
+        max_bytes=10GiB: int
+            Size budget of the cache. When exceeded, least recently used entries
+            are evicted.
+        link=False: bool
+            Flag, indicating whether cache hits should be hardlinked into the
+            destination instead of being copied. Linked inputs are read-only, 
+            since they share their contents with the cache.
+        """
+        self.directory = directory
+        self.max_bytes, self.link = max_bytes, link
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self._counters_lock = threading.Lock()
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+
+    def fetch(self, bucket, key, digest, destination_path):
+        """
+        Materialize cached object at destination path.
+
+        Parameters
+        ----------
+        bucket: str
+            Bucket name with scheme, where the object is located, e.g. `s3://bucket`.
+        key: str
+            Relative path of the object in the bucket.
+        digest: str
+            Content hash of the remote object.
+        destination_path: str
+            Path, where the object should be placed.
+
+        Returns
+        -------
+        bool
+            True if the object was found in the cache, otherwise False.
+        """
+        entry = self._entry(bucket, key, digest)
+        try:
+            stat = os.stat(entry)
+            if stat.st_mtime_ns != self._sealed_mtime:
+                logger.warning("Cache entry of {}/{} was modified, dropping it".format(bucket, key))
+                with self._lock():
+                    os.remove(entry)
+                    self._add_size(-stat.st_size)
+                raise FileNotFoundError(entry)
+            self._place(entry, destination_path)
+        except FileNotFoundError:
+            self._count("misses")
+            return False
+        with contextlib.suppress(OSError):
+            os.utime(entry, ns=(time.time_ns(), self._sealed_mtime))
+        logger.debug("Cache hit for {}/{}".format(bucket, key))
+        self._count("hits")
+        return True
+
+    def store(self, bucket, key, digest, source_path):
+        """
+        Put downloaded object into the cache.
+
+        Parameters
+        ----------
+        bucket: str
+            Bucket name with scheme, where the object is located, e.g. `s3://bucket`.
+        key: str
+            Relative path of the object in the bucket.
+        digest: str
+            Content hash of the remote object.
+        source_path: str
+            Path to the downloaded object.
+        """
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return logger.debug("{} exceeds cache budget, skipping".format(source_path))
+
+        entry = self._entry(bucket, key, digest)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        with self._lock():
+            if os.path.exists(entry):
+                return
+            # The downloaded file is copied, so that it stays writable and 
+            # independent of the entry
+            temporary = "{}.{}.{}.tmp".format(entry, os.getpid(), threading.get_ident())
+            shutil.copyfile(source_path, temporary)
+            os.chmod(temporary, 0o444)
+            os.utime(temporary, ns=(time.time_ns(), self._sealed_mtime))
+            os.replace(temporary, entry)
+            if self._add_size(size) > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        """
+        Get cache counters of this process.
+
+        Returns
+        -------
+        dict
+            Dictionary with the number of hits, misses and evictions.
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _entry(self, bucket, key, digest):
+        name = hashlib.sha256("\0".join((bucket, key, digest)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "objects", name[:2], name)
+
+    def _place(self, source_path, destination_path):
+        temporary = "{}.{}.{}.tmp".format(destination_path, os.getpid(), threading.get_ident())
+        try:
+            if not self.link:
+                raise OSError(errno.EPERM, "Hardlinks are disabled")
+            os.link(source_path, temporary)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(source_path, temporary)
+        os.replace(temporary, destination_path)
+
+    def _count(self, counter, value=1):
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, ".lock"), "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _add_size(self, size):
+        with open(os.path.join(self.directory, ".size"), "a+") as file:
+            file.seek(0)
+            total = int(file.read() or 0) + size
+            file.seek(0); file.truncate()
+            file.write(str(total))
+        return total
+
+    def _evict(self):
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.directory, "objects")):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.debug("Evicting {} from cache".format(path))
+            os.remove(path)
+            total -= size
+            self._count("evictions")
+
+        with open(os.path.join(self.directory, ".size"), "w") as file:
+            file.write(str(total))
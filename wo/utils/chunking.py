@@ -0,0 +1,197 @@
+import hashlib, json, mmap, itertools, os
+
+__all__ = ["Recipe", "chunk_boundaries", "chunk_file"]
+
+_window = 64
+_segment_size = 1024 ** 2
+_gear = [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], "big") for value in range(256)]
+
+
+class Recipe:
+    """
+    Recipe of a chunked object, stored in place of the object itself.
+
+    The recipe lists content hashes and sizes of the chunks of the file, in 
+    order, along with the chunk store, where the chunks are kept under their
+    hashes, and the chunking parameters, so that a local copy of a previous 
+    version can be split the same way and its chunks reused.
+    """
+
+    header = b'{"version": 1, "kind": "wo-chunk-recipe"'
+
+    def __init__(self, store, chunks, size, md5, min_size, avg_size, max_size):
+        """
+        Parameters
+        ----------
+        store: str
+            URI of the chunk store.
+        chunks: List[list]
+            Lists of the sha256 hash and the size of each chunk.
+        size: int
+            Size of the file.
+        md5: str
+            MD5 hash of the file.
+        min_size: int
+        avg_size: int
+        max_size: int
+            Chunking parameters, see `chunk_boundaries`.
+        """
+        self.store, self.chunks, self.size, self.md5 = store, chunks, size, md5
+        self.min_size, self.avg_size, self.max_size = min_size, avg_size, max_size
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Parameters
+        ----------
+        data: bytes
+            Serialized recipe.
+
+        Returns
+        -------
+        Recipe
+
+        Raises
+        ------
+        ValueError
+            Raise if the data is not a recipe.
+        """
+        try:
+            data = json.loads(data.decode("utf-8"))
+            return cls(data["store"], data["chunks"], data["size"], data["md5"], 
+                data["min_size"], data["avg_size"], data["max_size"])
+        except (UnicodeDecodeError, TypeError, KeyError) as e:
+            raise ValueError("Object is not a chunk recipe") from e
+
+    def dumps(self):
+        """
+        Returns
+        -------
+        bytes
+            Serialized recipe.
+        """
+        return json.dumps({"version": 1, "kind": "wo-chunk-recipe", "store": self.store, 
+            "chunks": self.chunks, "size": self.size, "md5": self.md5, "min_size": self.min_size, 
+            "avg_size": self.avg_size, "max_size": self.max_size}).encode("utf-8")
+
+    def offsets(self):
+        """
+        Returns
+        -------
+        iter: (digest, offset, size)
+            Chunks with their offsets in the file.
+        """
+        offset = 0
+        for digest, size in self.chunks:
+            yield digest, offset, size
+            offset += size
+
+
+def chunk_boundaries(data, min_size=512 * 1024, avg_size=2 * 1024 ** 2, max_size=8 * 1024 ** 2):
+    """
+    Split data into content-defined chunks.
+
+    A chunk ends, where a rolling hash of the preceding 64 bytes has its low 
+    bits zeroed, so an insertion or a deletion only moves the boundaries next 
+    to it and the remaining chunks keep their hashes. The rolling hash is the 
+    sum of random values of the window bytes, which is computed with numpy 
+    when it is installed.
+
+    Parameters
+    ----------
+    data: bytes-like
+        Data to split, e.g. a memory-mapped file.
+    min_size=512KiB: int
+        Minimum size of a chunk.
+    avg_size=2MiB: int
+        Expected distance between two boundaries past the minimum size, 
+        rounded down to a power of two.
+    max_size=8MiB: int
+        Maximum size of a chunk.
+
+    Returns
+    -------
+    iter: (offset, size)
+    """
+    mask = (1 << (avg_size.bit_length() - 1)) - 1
+    last, size = 0, len(data)
+    for cut in itertools.chain(_candidates(data, mask), [size]):
+        while cut - last > max_size:
+            yield last, max_size
+            last += max_size
+        if cut - last >= min_size or (cut == size and cut > last):
+            yield last, cut - last
+            last = cut
+
+
+def chunk_file(filename, min_size=512 * 1024, avg_size=2 * 1024 ** 2, max_size=8 * 1024 ** 2):
+    """
+    Split file into content-defined chunks and hash them.
+
+    Parameters
+    ----------
+    filename: str
+        Path to the file.
+    min_size=512KiB: int
+    avg_size=2MiB: int
+    max_size=8MiB: int
+        Chunking parameters, see `chunk_boundaries`.
+
+    Returns
+    -------
+    tuple: (chunks, md5)
+        A list of tuples of the offset, size and sha256 hash of each chunk, and 
+        the MD5 hash of the whole file.
+    """
+    md5, chunks = hashlib.md5(), []
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return chunks, md5.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset, size in chunk_boundaries(view, min_size, avg_size, max_size):
+                    chunk = view[offset:offset + size]
+                    md5.update(chunk)
+                    chunks.append((offset, size, hashlib.sha256(chunk).hexdigest()))
+                    chunk.release()
+            finally:
+                view.release()
+    return chunks, md5.hexdigest()
+
+
+def _candidates(data, mask):
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    segment_size = _segment_size * (16 if numpy is not None else 1)
+    for start in range(0, len(data), segment_size):
+        # Each segment is extended by the window of bytes before it, so that 
+        # hashes across segment borders are the same as in a single pass.
+        base = max(0, start - _window)
+        segment = data[base:start + segment_size]
+        if numpy is not None:
+            cuts = (base + int(cut) for cut in _numpy_candidates(numpy, segment, mask))
+        else:
+            cuts = (base + cut for cut in _python_candidates(segment, mask))
+        for cut in cuts:
+            if cut > start:
+                yield cut
+
+
+def _python_candidates(segment, mask):
+    sums = list(itertools.accumulate(map(_gear.__getitem__, bytes(segment)), initial=0))
+    return [cut for cut, (end, begin) in enumerate(zip(sums[_window:], sums), _window) 
+        if not (end - begin) & mask]
+
+
+def _numpy_candidates(numpy, segment, mask):
+    # Only the low bits of the hash are tested, so sums wrapping around 32 bits 
+    # give the same boundaries as the exact ones.
+    gear = numpy.array([value & 0xFFFFFFFF for value in _gear], dtype=numpy.uint32)
+    sums = numpy.zeros(len(segment) + 1, dtype=numpy.uint32)
+    numpy.cumsum(gear.take(numpy.frombuffer(segment, dtype=numpy.uint8)), dtype=numpy.uint32, out=sums[1:])
+    hashes = sums[_window:] - sums[:-_window]
+    return numpy.flatnonzero((hashes & numpy.uint32(mask)) == 0) + _window
@@ -0,0 +1,169 @@
+import re
+
+__all__ = ["PathFilter"]
+
+_wildcards = re.compile(r"[*?\[]")
+
+
+class PathFilter:
+    """
+    Selection of files of a prefix by glob patterns and depth.
+
+    Patterns are matched against paths, relative to the prefix, using `/` as
+    separator: `*` and `?` match within a single directory, `**` matches any
+    number of directories, `[...]` matches a character of a set. Patterns
+    without `/` are matched against file names at any depth, e.g. `*.npz`,
+    patterns, ending with `/`, select whole directories, e.g. `part=3/`.
+    Literal beginnings of the include patterns, e.g. `train/` of
+    `train/**/*.npz`, are returned by `prefixes`, so that only the matching
+    part of the prefix is listed.
+    """
+
+    def __init__(self, include=None, exclude=None, max_depth=None):
+        """
+        Parameters
+        ----------
+        include=None: str or List[str]
+            Patterns, one of which a path must match. All paths match by default.
+        exclude=None: str or List[str]
+            Patterns, none of which a path may match.
+        max_depth=None: int
+            Maximum number of path components, e.g. 1 selects files directly
+            under the prefix.
+        """
+        self.include = [include] if isinstance(include, str) else list(include or [])
+        self.exclude = [exclude] if isinstance(exclude, str) else list(exclude or [])
+        assert max_depth is None or max_depth >= 1, "`max_depth` must be a positive number"
+        self.max_depth = max_depth
+        self._include = [self._compile(pattern) for pattern in self.include]
+        self._exclude = [self._compile(pattern) for pattern in self.exclude]
+
+    @classmethod
+    def from_options(cls, include=None, exclude=None, max_depth=None):
+        """
+        Create a filter, unless all of the options are empty.
+
+        Returns
+        -------
+        PathFilter or None
+        """
+        if include or exclude or max_depth:
+            return cls(include, exclude, max_depth)
+        return None
+
+    def matches(self, relpath):
+        """
+        Check, whether a path is selected.
+
+        Parameters
+        ----------
+        relpath: str
+            Path, relative to the prefix.
+
+        Returns
+        -------
+        bool
+        """
+        relpath = relpath.strip("/")
+        if self.max_depth is not None and relpath.count("/") >= self.max_depth:
+            return False
+        if self._include and not any(pattern(relpath) for pattern in self._include):
+            return False
+        return not any(pattern(relpath) for pattern in self._exclude)
+
+    def contains(self, directory):
+        """
+        Check, whether a directory may contain selected paths, e.g. to keep it 
+        in a listing by delimiter.
+
+        Parameters
+        ----------
+        directory: str
+            Path of the directory, relative to the prefix.
+
+        Returns
+        -------
+        bool
+        """
+        directory = directory.strip("/") + "/"
+        if self.max_depth is not None and directory.count("/") >= self.max_depth:
+            return False
+        if any(pattern(directory) for pattern in self._exclude):
+            return False
+        return any(prefix.startswith(directory) or directory.startswith(prefix) for prefix in self.prefixes())
+
+    def select(self, items, key=lambda item: item):
+        """
+        Select items, whose paths match the filter.
+
+        Parameters
+        ----------
+        items: iterable
+        key=identity: callable
+            Function, which returns path of an item, relative to the prefix.
+
+        Returns
+        -------
+        iter
+        """
+        return (item for item in items if self.matches(key(item)))
+
+    def prefixes(self):
+        """
+        Get literal prefixes, which cover all of the selected paths.
+
+        Returns
+        -------
+        List[str]
+            Sorted prefixes, none of which is a prefix of another, or `[""]`,
+            if the whole prefix has to be listed.
+        """
+        prefixes = sorted(set(_wildcards.split(pattern.strip("/"), 1)[0] if "/" in pattern else ""
+            for pattern in self.include)) or [""]
+        result = []
+        for prefix in prefixes:
+            if not result or not prefix.startswith(result[-1]):
+                result.append(prefix)
+        return result
+
+    @staticmethod
+    def _compile(pattern):
+        if "/" not in pattern:
+            expression = re.compile(PathFilter._translate(pattern))
+            return lambda relpath: expression.match(relpath.rsplit("/", 1)[-1]) is not None
+        if pattern.endswith("/"):
+            pattern += "**"
+        expression = re.compile(PathFilter._translate(pattern.strip("/")))
+        return lambda relpath: expression.match(relpath) is not None
+
+    @staticmethod
+    def _translate(pattern):
+        index, result = 0, []
+        while index < len(pattern):
+            if pattern.startswith("**/", index):
+                result.append("(?:.*/)?")
+                index += 3
+                continue
+            if pattern.startswith("**", index):
+                result.append(".*")
+                index += 2
+                continue
+            char = pattern[index]
+            end = pattern.find("]", index + 2) if char == "[" else -1
+            if char == "*":
+                result.append("[^/]*")
+            elif char == "?":
+                result.append("[^/]")
+            elif end != -1:
+                members = pattern[index + 1:end]
+                if members.startswith("!"):
+                    members = "^" + members[1:]
+                result.append("[{}]".format(members.replace("\\", "\\\\")))
+                index = end
+            else:
+                result.append(re.escape(char))
+            index += 1
+        return "".join(result) + r"\Z"
+
+    def __repr__(self):
+        return "PathFilter(include={}, exclude={}, max_depth={})".format(self.include, self.exclude, self.max_depth)
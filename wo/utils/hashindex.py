@@ -0,0 +1,134 @@
+import logging, threading, contextlib, sqlite3, os
+
+__all__ = ["HashIndex"]
+
+logger = logging.getLogger(__name__)
+
+
+class HashIndex:
+    """
+    Persistent index of file hashes.
+
+    A hash is stored along with the inode, size, modification and change time
+    of the file, so the stored value is only returned while the file stays
+    unchanged. The index is kept in a SQLite database, which may be shared by
+    several threads and processes.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+            Path to the database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @classmethod
+    def default(cls):
+        """
+        Get the process-wide index. Database location is taken from the
+        `WO_HASH_INDEX` environment variable and defaults to `wo/hashes.db` 
+        in the cache directory of the user, `$XDG_CACHE_HOME` or `~/.cache`,
+        so that it never ends up among the outputs of a step. Setting the 
+        variable to an empty string disables the index.
+
+        Returns
+        -------
+        HashIndex or None
+        """
+        path = os.environ.get("WO_HASH_INDEX")
+        if path is None:
+            cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+            path = os.path.join(cache, "wo", "hashes.db")
+        if not path:
+            return None
+        with cls._default_lock:
+            if cls._default is None or cls._default.path != path:
+                cls._default = cls(path)
+            return cls._default
+
+    @classmethod
+    def reset(cls):
+        """ Drop the process-wide index, e.g. in the child process after fork. """
+        cls._default_lock = threading.Lock()
+        cls._default = None
+
+    def lookup(self, filename, stat, algorithm="md5"):
+        """
+        Look up stored hash of the file.
+
+        Parameters
+        ----------
+        filename: str
+            Path to the file.
+        stat: os.stat_result
+            Current status of the file.
+        algorithm="md5": str
+            Name of the hashing algorithm.
+
+        Returns
+        -------
+        str or None
+            Stored hash if the file has not changed since it was stored, otherwise None.
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT digest FROM hashes WHERE path = ? AND algorithm = ? AND inode = ? "
+                    "AND size = ? AND mtime = ? AND ctime = ?",
+                    (os.path.abspath(filename), algorithm, *self._signature(stat))).fetchone()
+        except sqlite3.Error as e:
+            logger.debug("Failed to read hash index: {!r}".format(e))
+            return None
+        return row and row[0]
+
+    def store(self, filename, stat, digest, algorithm="md5"):
+        """
+        Store hash of the file.
+
+        Parameters
+        ----------
+        filename: str
+            Path to the file.
+        stat: os.stat_result
+            Status of the file, at which the hash was computed.
+        digest: str
+            Hash of the file.
+        algorithm="md5": str
+            Name of the hashing algorithm.
+        """
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (os.path.abspath(filename), algorithm, *self._signature(stat), digest))
+                connection.commit()
+        except sqlite3.Error as e:
+            logger.debug("Failed to update hash index: {!r}".format(e))
+
+    @staticmethod
+    def _signature(stat):
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns
+
+    def _connect(self):
+        if self._connection is None:
+            # An unwritable location fails the connection, so the index is skipped
+            with contextlib.suppress(OSError):
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (path TEXT, algorithm TEXT, inode INTEGER, "
+                "size INTEGER, mtime INTEGER, ctime INTEGER, digest TEXT, PRIMARY KEY (path, algorithm))")
+        return self._connection
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=HashIndex.reset)
@@ -1,9 +1,126 @@
-import hashlib
-import urllib.parse
+import hashlib, os, mmap, threading, itertools
+import urllib.parse, concurrent.futures
+from wo.utils.hashindex import HashIndex
+from wo.cloud.registry import Backends
+
+_buffer_size = 1024 ** 2
+_mmap_threshold = 64 * 1024 ** 2
+_local = threading.local()
+
+
+class _CRC32C:
+    """ hashlib-compatible wrapper around `google_crc32c`. """
+
+    def __init__(self):
+        import google_crc32c
+        self._checksum = google_crc32c.Checksum()
+
+    def update(self, data):
+        # The C extension accepts read-only buffers only.
+        view = memoryview(data)
+        for offset in range(0, len(view), _buffer_size):
+            self._checksum.update(view[offset:offset + _buffer_size].tobytes())
+
+    def hexdigest(self):
+        return self._checksum.digest().hex()
+
+
+def new_hash(algorithm="md5"):
+    """ 
+    Create a hash object.
+
+    Parameters
+    ----------
+    algorithm="md5": str
+        Name of the hashing algorithm. Either one of the `hashlib` algorithms 
+        or `crc32c`, which requires `google-crc32c` to be installed.
+    
+    Returns
+    --------
+    object
+        Hash object with `update` and `hexdigest` methods.
+    """
+    if algorithm == "crc32c":
+        return _CRC32C()
+    return hashlib.new(algorithm)
+
+
+def hash_file(filename, algorithm="md5"):
+    """ 
+    Calculate hash of file contents. The hash is looked up in the persistent
+    hash index first and the file is only read, if it has changed since it was
+    last hashed. Large files are memory-mapped, smaller ones are read into 
+    a reusable buffer.
+
+    Parameters
+    ----------
+    filename: str
+        Path to a file of which hash should be calculated.
+    algorithm="md5": str
+        Name of the hashing algorithm, see `new_hash`.
+    
+    Returns
+    --------
+    str
+        Hex-encoded hash of the file. 
+    """
+    index, stat = HashIndex.default(), os.stat(filename)
+    digest = index and index.lookup(filename, stat, algorithm)
+    if digest:
+        return digest
+
+    hasher = new_hash(algorithm)
+    with open(filename, "rb") as f:
+        if stat.st_size >= _mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+        else:
+            if not hasattr(_local, "buffer"):
+                _local.buffer = memoryview(bytearray(_buffer_size))
+            buffer = _local.buffer
+            for size in iter(lambda: f.readinto(buffer), 0):
+                hasher.update(buffer[:size])
+    digest = hasher.hexdigest()
+
+    if index and HashIndex._signature(os.stat(filename)) == HashIndex._signature(stat):
+        index.store(filename, stat, digest, algorithm)
+    return digest
+
+
+def hash_files(filenames, algorithm="md5", processes=None):
+    """ 
+    Calculate hash of each file in parallel.
+
+    Parameters
+    ----------
+    filenames: List[str]
+        Paths to files of which hashes should be calculated.
+    algorithm="md5": str
+        Name of the hashing algorithm, see `new_hash`.
+    processes=None: int
+        Number of worker processes. Defaults to the number of CPUs. Files are 
+        hashed in the current process, if set to 1.
+    
+    Returns
+    --------
+    List[str]
+        Hex-encoded hashes in the order of `filenames`. 
+    """
+    filenames = list(filenames)
+    processes = min(processes or os.cpu_count() or 1, len(filenames))
+    if processes <= 1:
+        return [hash_file(filename, algorithm) for filename in filenames]
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(hash_file, filenames, itertools.repeat(algorithm), 
+            chunksize=max(1, len(filenames) // (processes * 4))))
+
 
 def md5_file(filename):
     """ 
-    Calculate md5 hash of file contents. 
+    Calculate md5 hash of file contents. The hash is looked up in the persistent
+    hash index first and the file is only read, if it has changed since it was
+    last hashed.
 
     Parameters
     ----------
@@ -15,35 +132,119 @@ def md5_file(filename):
     hash_md5: str
         MD5 hash of the file. 
     """
-    hash_md5 = hashlib.md5()
-    with open(filename, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    return hash_file(filename, "md5")
 
 
-def md5_files(filenames):
+def indexed_md5(filename):
     """ 
-    Calculate md5 hash of each files' contents. 
+    Look up md5 hash of the file in the persistent hash index without reading 
+    the file. 
 
     Parameters
     ----------
     filename: str
-        Path to a file of which md5 should be calculated.
+        Path to a file of which md5 should be looked up.
+    
+    Returns
+    --------
+    str or None
+        MD5 hash of the file, if the file has not changed since it was last hashed.
+    """
+    index = HashIndex.default()
+    return index and index.lookup(filename, os.stat(filename))
+
+
+def remember_md5(filename, stat, digest):
+    """ 
+    Store md5 hash of the file, computed elsewhere, in the persistent hash index.
+    Nothing is stored, if the file has changed since `stat` was taken.
+
+    Parameters
+    ----------
+    filename: str
+        Path to a file of which md5 was calculated.
+    stat: os.stat_result
+        Status of the file before its contents were read.
+    digest: str
+        MD5 hash of the file.
+    """
+    index = HashIndex.default()
+    if index and HashIndex._signature(os.stat(filename)) == HashIndex._signature(stat):
+        index.store(filename, stat, digest)
+
+
+def walk_files(prefix, hidden=False):
+    """
+    Walk all files under a local directory. Bookkeeping files of `wo`, whose 
+    names start with `.wo-`, e.g. manifests, are skipped.
+
+    Parameters
+    ----------
+    prefix: str
+        Path to the directory.
+    hidden=False: bool
+        Flag, indicating whether bookkeeping files should be walked as well.
+
+    Returns
+    -------
+    iter: (path, relative_path)
+        Returns an iterator, which produces a tuple of a path to the file and
+        a relative path from a given `prefix`, using `/` as separator.
+    """
+    for root, _, files in os.walk(prefix):
+        for file in files:
+            if not hidden and file.startswith(".wo-"):
+                continue
+            path = os.path.join(root, file)
+            yield path, os.path.relpath(path, prefix).replace(os.sep, "/")
+
+
+def md5_files(filenames):
+    """ 
+    Calculate md5 hash of the concatenated contents of the files.
+
+    Parameters
+    ----------
+    filenames: List[str]
+        Paths to files of which md5 should be calculated.
     
     Returns
     --------
     hash_md5: str
-        MD5 hash of the file. 
+        MD5 hash of the files. 
     """
-    hash_md5 = hashlib.md5()
+    hash_md5 = new_hash("md5")
+    if not hasattr(_local, "buffer"):
+        _local.buffer = memoryview(bytearray(_buffer_size))
+    buffer = _local.buffer
     for filename in filenames: 
         with open(filename, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
+            for size in iter(lambda: f.readinto(buffer), 0):
+                hash_md5.update(buffer[:size])
     return hash_md5.hexdigest()
 
 
+def combined_md5(filenames, processes=None):
+    """ 
+    Calculate md5 hash of the md5 hashes of the files, taken in the given 
+    order. Unlike `md5_files`, the files are hashed in parallel and the 
+    hashes of unchanged files are taken from the hash index.
+
+    Parameters
+    ----------
+    filenames: List[str]
+        Paths to files of which md5 should be calculated.
+    processes=None: int
+        Number of worker processes, see `hash_files`.
+    
+    Returns
+    --------
+    str
+        MD5 hash of the hashes of the files. 
+    """
+    return md5_string("".join(hash_files(filenames, "md5", processes)))
+
+
 def md5_string(string):
     """ 
     Calculate md5 hash of the given string 
@@ -73,14 +274,15 @@ def parse_uri(uri):
     Returns
     -------
     tuple: (scheme, bucket_name, key)
-        A tuple, which contains bucket scheme (either s3 or gs), a bucket name 
-        and key/prefix representing relative path in the bucket.
+        A tuple, which contains bucket scheme (one of the schemes, registered in 
+        `Backends`, e.g. s3 or gs), a bucket name and key/prefix representing 
+        relative path in the bucket.
     """
     result = urllib.parse.urlparse(uri)
     if not result.scheme:
         raise ValueError("URI must contain scheme and a bucket name")
-    if result.scheme not in ('s3', 'gs'):
-        raise ValueError("Only s3 and gs are supported")
+    if result.scheme not in Backends.schemes():
+        raise ValueError("Only {} are supported".format(", ".join(Backends.schemes())))
     return result.scheme, result.netloc, result.path.strip("/")
 
 
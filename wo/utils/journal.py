@@ -0,0 +1,292 @@
+import logging, threading, sqlite3, time, uuid, os
+
+__all__ = ["TransferJournal"]
+
+logger = logging.getLogger(__name__)
+
+
+class TransferJournal:
+    """
+    Persistent journal of transfers, which lets a restarted step resume them.
+
+    The journal records downloaded files along with the version of the remote
+    object and the status of the local file, byte ranges of partially
+    downloaded files, and multipart uploads with their uploaded parts. It is
+    kept in a SQLite database, which should live on a volume, which survives
+    restarts of the step, e.g. beside the data. Uploads, started by another
+    process, which cannot be resumed, are reported by `abandoned`, so that they
+    can be aborted.
+    """
+
+    _owner = uuid.uuid4().hex
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+            Path to the database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @classmethod
+    def default(cls):
+        """
+        Get the journal, configured with the `WO_TRANSFER_JOURNAL` environment
+        variable, which contains path to the database file.
+
+        Returns
+        -------
+        TransferJournal or None
+            None if the variable is not set.
+        """
+        path = os.environ.get("WO_TRANSFER_JOURNAL")
+        return cls(path) if path else None
+
+    @classmethod
+    def reset(cls):
+        """ Assign a new owner of the uploads, e.g. in the child process after fork. """
+        cls._owner = uuid.uuid4().hex
+
+    def completed(self, uri, path, version):
+        """
+        Check, whether the object was downloaded to path and neither of them has
+        changed since.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        path: str
+            Path to the downloaded file.
+        version: str
+            Version of the object, e.g. its ETag.
+
+        Returns
+        -------
+        bool
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        row = self._query("SELECT 1 FROM files WHERE uri = ? AND path = ? AND version = ? "
+            "AND inode = ? AND size = ? AND mtime = ?", (uri, os.path.abspath(path), version, *self._signature(stat)))
+        return bool(row)
+
+    def complete(self, uri, path, version):
+        """
+        Record a completed download.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the object.
+        path: str
+            Path to the downloaded file.
+        version: str
+            Version of the object, e.g. its ETag.
+        """
+        self._execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (uri, os.path.abspath(path), version, *self._signature(os.stat(path))))
+
+    def ranges(self, path, version, size, part_size):
+        """
+        Get byte ranges of a partially downloaded file. Ranges, recorded for
+        another version of the object or another partitioning, are dropped.
+
+        Parameters
+        ----------
+        path: str
+            Path to the partially downloaded file.
+        version: str
+            Version of the object.
+        size: int
+            Size of the object.
+        part_size: int
+            Size of a single range.
+
+        Returns
+        -------
+        set
+            Offsets of the downloaded ranges.
+        """
+        path = os.path.abspath(path)
+        rows = self._query("SELECT start FROM ranges WHERE path = ? AND version = ? AND size = ? AND part_size = ?",
+            (path, version, size, part_size), many=True)
+        if not rows:
+            self._execute("DELETE FROM ranges WHERE path = ?", (path,))
+        return set(start for start, in rows)
+
+    def add_range(self, path, version, size, part_size, start):
+        """
+        Record a downloaded byte range. Its data must be on disk already.
+
+        Parameters
+        ----------
+        path: str
+        version: str
+        size: int
+        part_size: int
+            See `ranges`.
+        start: int
+            Offset of the range.
+        """
+        self._execute("INSERT OR REPLACE INTO ranges VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(path), version, size, part_size, start))
+
+    def forget_ranges(self, path):
+        """
+        Drop byte ranges of the file, once it is complete.
+
+        Parameters
+        ----------
+        path: str
+        """
+        self._execute("DELETE FROM ranges WHERE path = ?", (os.path.abspath(path),))
+
+    def start_upload(self, uri, upload_id, source=None, part_size=None):
+        """
+        Record a started multipart upload.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the uploaded object.
+        upload_id: str
+            Identifier of the upload.
+        source=None: str
+            Path to the uploaded file. Uploads of a stream, which cannot be
+            resumed, have no source.
+        part_size=None: int
+            Size of a single part.
+        """
+        inode, size, mtime = self._signature(os.stat(source)) if source else (None, None, None)
+        self._execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (upload_id, uri, source and os.path.abspath(source), inode, size, mtime, part_size,
+                self._owner, time.time()))
+
+    def find_upload(self, uri, source, part_size):
+        """
+        Find an unfinished upload of the same file, which can be resumed.
+
+        Parameters
+        ----------
+        uri: str
+            URI of the uploaded object.
+        source: str
+            Path to the uploaded file.
+        part_size: int
+            Size of a single part.
+
+        Returns
+        -------
+        tuple: (upload_id, parts) or None
+            Identifier of the upload and a dictionary, which maps numbers of the
+            uploaded parts to their ETags.
+        """
+        row = self._query("SELECT upload_id FROM uploads WHERE uri = ? AND source = ? AND inode = ? "
+            "AND size = ? AND mtime = ? AND part_size = ?",
+            (uri, os.path.abspath(source), *self._signature(os.stat(source)), part_size))
+        if not row:
+            return None
+        parts = self._query("SELECT number, etag FROM parts WHERE upload_id = ?", (row[0],), many=True)
+        self._execute("UPDATE uploads SET owner = ?, updated = ? WHERE upload_id = ?",
+            (self._owner, time.time(), row[0]))
+        return row[0], dict(parts)
+
+    def add_part(self, upload_id, number, etag):
+        """
+        Record an uploaded part.
+
+        Parameters
+        ----------
+        upload_id: str
+        number: int
+            Number of the part.
+        etag: str
+            ETag of the part.
+        """
+        self._execute("INSERT OR REPLACE INTO parts VALUES (?, ?, ?)", (upload_id, number, etag))
+        self._execute("UPDATE uploads SET updated = ? WHERE upload_id = ?", (time.time(), upload_id))
+
+    def finish_upload(self, upload_id):
+        """
+        Drop a completed or aborted upload.
+
+        Parameters
+        ----------
+        upload_id: str
+        """
+        self._execute("DELETE FROM parts WHERE upload_id = ?", (upload_id,))
+        self._execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+    def abandoned(self, max_age=600.0):
+        """
+        Find uploads of other processes, which will not be completed: uploads
+        of streams, which were not updated for `max_age` seconds, and uploads
+        of files, which have changed or were removed since.
+
+        Parameters
+        ----------
+        max_age=600.0: float
+            Time in seconds, after which an upload of a stream is abandoned.
+
+        Returns
+        -------
+        List[tuple]: (uri, upload_id)
+        """
+        rows = self._query("SELECT upload_id, uri, source, inode, size, mtime, updated FROM uploads "
+            "WHERE owner != ?", (self._owner,), many=True)
+        result = []
+        for upload_id, uri, source, inode, size, mtime, updated in rows:
+            if source is None:
+                if updated < time.time() - max_age:
+                    result.append((uri, upload_id))
+                continue
+            try:
+                if self._signature(os.stat(source)) == (inode, size, mtime):
+                    continue
+            except FileNotFoundError:
+                pass
+            result.append((uri, upload_id))
+        return result
+
+    @staticmethod
+    def _signature(stat):
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _query(self, statement, parameters, many=False):
+        with self._lock:
+            cursor = self._connect().execute(statement, parameters)
+            return cursor.fetchall() if many else cursor.fetchone()
+
+    def _execute(self, statement, parameters):
+        with self._lock:
+            connection = self._connect()
+            connection.execute(statement, parameters)
+            connection.commit()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS files (uri TEXT, path TEXT, version TEXT, inode INTEGER, "
+                "size INTEGER, mtime INTEGER, PRIMARY KEY (uri, path))")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS ranges (path TEXT, version TEXT, size INTEGER, part_size INTEGER, "
+                "start INTEGER, PRIMARY KEY (path, start))")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS uploads (upload_id TEXT PRIMARY KEY, uri TEXT, source TEXT, "
+                "inode INTEGER, size INTEGER, mtime INTEGER, part_size INTEGER, owner TEXT, updated REAL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS parts (upload_id TEXT, number INTEGER, etag TEXT, "
+                "PRIMARY KEY (upload_id, number))")
+        return self._connection
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=TransferJournal.reset)
@@ -0,0 +1,70 @@
+import json
+
+__all__ = ["Manifest"]
+
+
+class Manifest:
+    """
+    Manifest of a remote prefix, stored as an object beside the data.
+
+    For each file the manifest records its MD5 hash, size and the ETag of the
+    remote object at the time of upload. An entry is only trusted, while the
+    ETag and size reported by a listing still match, so objects modified by
+    other tools are never skipped by mistake.
+    """
+
+    name = ".wo-manifest.json"
+
+    def __init__(self, files=None):
+        """
+        Parameters
+        ----------
+        files=None: dict
+            Dictionary, mapping a relative path of the file to a dictionary with
+            `md5`, `size` and `etag` keys.
+        """
+        self.files = files or {}
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Parameters
+        ----------
+        data: bytes
+            Serialized manifest.
+
+        Returns
+        -------
+        Manifest
+        """
+        return cls(json.loads(data.decode("utf-8")).get("files", {}))
+
+    def dumps(self):
+        """
+        Returns
+        -------
+        bytes
+            Serialized manifest.
+        """
+        return json.dumps({"version": 1, "files": self.files}, sort_keys=True).encode("utf-8")
+
+    def md5(self, relpath, info):
+        """
+        Resolve MD5 hash of the listed remote object.
+
+        Parameters
+        ----------
+        relpath: str
+            Path of the object, relative to the manifest.
+        info: ObjectInfo
+            Listing of the remote object.
+
+        Returns
+        -------
+        str or None
+            MD5 hash of the object, if known.
+        """
+        entry = self.files.get(relpath)
+        if entry and entry.get("etag") == info.etag and entry.get("size") == info.size:
+            return entry["md5"]
+        return info.md5
@@ -0,0 +1,153 @@
+import tarfile, shutil, json, os
+
+__all__ = ["PackIndex", "plan_shards", "write_shard", "extract_shard"]
+
+
+class PackIndex:
+    """
+    Index of a packed prefix, stored as an object beside the shards.
+
+    Files of a packed prefix are stored in tar shards. For each file the index
+    records its shard, the offset of its contents in the uncompressed shard and
+    its size, so a single file of an uncompressed shard is read with one range
+    request.
+    """
+
+    name = ".wo-pack.json"
+
+    def __init__(self, shards=None, members=None, compression=None):
+        """
+        Parameters
+        ----------
+        shards=None: List[str]
+            Names of the shards, relative to the index.
+        members=None: dict
+            Dictionary, mapping a relative path of the file to a list of the 
+            shard number, the offset and the size of its contents.
+        compression=None: str
+            Compression of the shards, either None or "gz".
+        """
+        self.shards, self.members, self.compression = shards or [], members or {}, compression
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Parameters
+        ----------
+        data: bytes
+            Serialized index.
+
+        Returns
+        -------
+        PackIndex
+        """
+        data = json.loads(data.decode("utf-8"))
+        return cls(data["shards"], data["members"], data.get("compression"))
+
+    def dumps(self):
+        """
+        Returns
+        -------
+        bytes
+            Serialized index.
+        """
+        return json.dumps({"version": 1, "compression": self.compression, "shards": self.shards, 
+            "members": self.members}, sort_keys=True).encode("utf-8")
+
+    @staticmethod
+    def shard_name(number, compression=None):
+        return "shard-{:05d}.tar{}".format(number, "." + compression if compression else "")
+
+
+def plan_shards(files, shard_size):
+    """
+    Group files into shards of bounded size, keeping their order.
+
+    Parameters
+    ----------
+    files: iter
+        Iterator, which produces a tuple of a path to the file and its relative path.
+    shard_size: int
+        Maximum size of the contents of a shard. A larger file takes a shard alone.
+
+    Returns
+    -------
+    List[List[tuple]]
+    """
+    shards, current, size = [], [], 0
+    for path, relpath in files:
+        file_size = os.path.getsize(path)
+        if current and size + file_size > shard_size:
+            shards.append(current)
+            current, size = [], 0
+        current.append((path, relpath))
+        size += file_size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def write_shard(fileobj, files, compression=None):
+    """
+    Write files into a tar shard. The shard is written as a stream, so 
+    `fileobj` does not need to be seekable.
+
+    Parameters
+    ----------
+    fileobj: file object
+        Binary file, where the shard is written.
+    files: List[tuple]
+        Tuples of a path to the file and its relative path in the shard.
+    compression=None: str
+        Compression of the shard, either None or "gz".
+
+    Returns
+    -------
+    dict
+        Dictionary, mapping a relative path of the file to the offset and size 
+        of its contents in the uncompressed shard.
+    """
+    members = {}
+    with tarfile.open(fileobj=fileobj, mode="w|" + (compression or ""), format=tarfile.PAX_FORMAT) as tar:
+        for path, relpath in files:
+            info = tar.gettarinfo(path, arcname=relpath)
+            info.uid = info.gid = 0
+            info.uname = info.gname = ""
+            with open(path, "rb") as file:
+                tar.addfile(info, file)
+            padded = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            members[relpath] = (tar.offset - padded, info.size)
+    return members
+
+
+def extract_shard(fileobj, destination, members=None):
+    """
+    Extract files of a tar shard, read as a stream.
+
+    Parameters
+    ----------
+    fileobj: file object
+        Binary file, from which the shard is read.
+    destination: str
+        Directory, where the files are extracted.
+    members=None: set
+        Relative paths of the files to extract. All files are extracted by default.
+
+    Returns
+    -------
+    int
+        Number of extracted files.
+    """
+    count, root = 0, os.path.abspath(destination)
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for info in tar:
+            if not info.isfile() or (members is not None and info.name not in members):
+                continue
+            path = os.path.abspath(os.path.join(root, info.name))
+            if not path.startswith(root + os.sep):
+                raise ValueError("Member {} is outside of the destination".format(info.name))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                shutil.copyfileobj(tar.extractfile(info), file)
+            count += 1
+    return count
@@ -0,0 +1,219 @@
+import concurrent.futures, collections, hashlib, logging, io
+
+__all__ = ["RemoteReader", "RemoteWriter"]
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteReader(io.RawIOBase):
+    """
+    Seekable read-only file object over a remote object.
+
+    Reads are served from a cache of fixed-size blocks, missing blocks are 
+    fetched with range requests. A read, which continues the previous one, 
+    fetches `read_ahead` bytes at once, so sequential reads are served by a 
+    few large requests, while reads after a seek, e.g. of a header or footer,
+    fetch only the blocks they need.
+    """
+
+    def __init__(self, size, read_range, block_size=1024 ** 2, read_ahead=8 * 1024 ** 2, 
+        cache_blocks=32, name=None
+    ):
+        """
+        Parameters
+        ----------
+        size: int
+            Size of the object in bytes.
+        read_range: callable
+            Function, which takes the first and the last (inclusive) byte offsets 
+            of a range and returns its contents.
+        block_size=1MiB: int
+            Size of a cached block.
+        read_ahead=8MiB: int
+            Number of bytes, fetched at once by sequential reads.
+        cache_blocks=32: int
+            Maximum number of cached blocks.
+        name=None: str
+            Name of the object, e.g. its URI.
+        """
+        self.size, self.name = size, name
+        self.block_size, self.read_ahead, self.cache_blocks = block_size, read_ahead, cache_blocks
+        self.requests = 0
+        self._read_range = read_range
+        self._blocks = collections.OrderedDict()
+        self._position, self._last_end = 0, None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError("Invalid whence ({})".format(whence))
+        if offset < 0:
+            raise ValueError("Negative seek position {}".format(offset))
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        start, end = self._position, min(self.size, self._position + len(view))
+        if start >= end:
+            return 0
+
+        sequential = start == self._last_end
+        offset = start
+        while offset < end:
+            index = offset // self.block_size
+            block = self._block(index, (end - 1) // self.block_size, sequential)
+            chunk = block[offset - index * self.block_size:end - index * self.block_size]
+            view[offset - start:offset - start + len(chunk)] = chunk
+            offset += len(chunk)
+
+        self._position = self._last_end = end
+        return end - start
+
+    def readall(self):
+        return self.read(max(0, self.size - self._position))
+
+    def _block(self, index, last, sequential):
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+
+        count = last - index + 1
+        if sequential:
+            count = max(count, self.read_ahead // self.block_size)
+        start = index * self.block_size
+        end = min(self.size, start + count * self.block_size) - 1
+        data = self._read_range(start, end)
+        self.requests += 1
+        if len(data) != end - start + 1:
+            raise IOError("Range {}-{} of {} is incomplete".format(start, end, self.name))
+
+        for offset in range(0, len(data), self.block_size):
+            self._blocks[index + offset // self.block_size] = data[offset:offset + self.block_size]
+        while len(self._blocks) > max(self.cache_blocks, count):
+            self._blocks.popitem(last=False)
+        return self._blocks[index]
+
+
+class RemoteWriter(io.RawIOBase):
+    """
+    Write-only file object, which streams data to a remote object.
+
+    Written data is cut into parts of `part_size`, which are uploaded while 
+    writing continues, at most `concurrency` of them at the same time. Data, 
+    which fits into a single part, is uploaded with one request on close. The
+    object only appears once the file is closed; leaving a `with` block with 
+    an exception, calling `abort`, or dropping the writer without closing it
+    discards the upload.
+    """
+
+    def __init__(self, put, start, part_size, concurrency=4, name=None):
+        """
+        Parameters
+        ----------
+        put: callable
+            Function, which takes the whole contents and their md5 hash and 
+            uploads them with a single request.
+        start: callable
+            Function, which starts a multipart upload and returns an object with 
+            `upload_part(number, data)`, `complete(parts, md5)` and `abort()` 
+            methods. `complete` receives the results of `upload_part` in order.
+        part_size: int
+            Size of a single part.
+        concurrency=4: int
+            Maximum number of parts, uploaded at the same time.
+        name=None: str
+            Name of the object, e.g. its URI.
+        """
+        self.part_size, self.concurrency, self.name = part_size, concurrency, name
+        self._put, self._start = put, start
+        self._buffer, self._md5 = bytearray(), hashlib.md5()
+        self._upload, self._executor = None, None
+        self._futures, self._pending = [], set()
+        self.committed = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        data = memoryview(data).cast("B")
+        self._buffer += data
+        self._md5.update(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit(part)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload is None:
+                self._put(bytes(self._buffer), self._md5.hexdigest())
+            else:
+                if self._buffer:
+                    self._submit(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                self._upload.complete(parts, self._md5.hexdigest())
+            self.committed = True
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self):
+        """ Discard written data and the parts, which have been uploaded. """
+        if self.closed:
+            return
+        for future in self._futures:
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._upload is not None:
+            self._upload.abort()
+        super().close()
+
+    def __exit__(self, error_type, error_value, error_traceback):
+        if error_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        # IOBase closes dropped files, which would commit a truncated object
+        if not self.closed:
+            logger.warning("{} was not closed, discarding the upload".format(self.name))
+            self.abort()
+
+    def _submit(self, part):
+        if self._upload is None:
+            self._upload = self._start()
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        future = self._executor.submit(self._upload.upload_part, len(self._futures) + 1, part)
+        self._futures.append(future)
+        self._pending.add(future)
+        if len(self._pending) >= self.concurrency:
+            done, self._pending = concurrent.futures.wait(
+                self._pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                future.result()
@@ -0,0 +1,129 @@
+import hashlib, logging, heapq, json, os
+
+__all__ = ["Shard"]
+
+logger = logging.getLogger(__name__)
+
+_environments = [
+    ("RANK", "WORLD_SIZE"),
+    ("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE"),
+    ("PMI_RANK", "PMI_SIZE"),
+    ("SLURM_PROCID", "SLURM_NTASKS"),
+]
+
+
+class Shard:
+    """
+    Deterministic subset of objects, assigned to one of the workers of a job.
+
+    By default an object belongs to the worker, selected by a stable hash of 
+    its key, so every worker computes the same assignment from its own listing
+    without coordination, and the listing can be consumed lazily. With `balance`
+    set, the whole listing is taken and objects are assigned greedily, largest 
+    first, to the worker with the fewest bytes so far.
+    """
+
+    def __init__(self, rank, world_size, balance=False):
+        """
+        Parameters
+        ----------
+        rank: int
+            Index of the worker, from 0 to world_size - 1.
+        world_size: int
+            Number of workers.
+        balance=False: bool
+            Flag, indicating whether shards should be balanced by object size.
+        """
+        assert world_size >= 1, "`world_size` must be a positive number"
+        assert 0 <= rank < world_size, "`rank` must be in [0, world_size)"
+        self.rank, self.world_size, self.balance = rank, world_size, balance
+
+    @classmethod
+    def from_env(cls, balance=False):
+        """
+        Create shard of the current worker from the environment. The variables
+        of torch.distributed (`RANK`, `WORLD_SIZE`), Open MPI, MPICH, Slurm and
+        the `TF_CONFIG` of TensorFlow jobs are recognized.
+
+        Parameters
+        ----------
+        balance=False: bool
+            Flag, indicating whether shards should be balanced by object size.
+
+        Returns
+        -------
+        Shard or None
+            None if the worker is not a part of a distributed job.
+        """
+        for rank, world_size in _environments:
+            if os.environ.get(rank) and os.environ.get(world_size):
+                return cls(int(os.environ[rank]), int(os.environ[world_size]), balance)
+
+        if os.environ.get("TF_CONFIG"):
+            config = json.loads(os.environ["TF_CONFIG"])
+            roles = [role for role in ("chief", "master", "worker") if role in config.get("cluster", {})]
+            task = config.get("task", {})
+            if task.get("type") in roles:
+                offset = sum(len(config["cluster"][role]) for role in roles[:roles.index(task["type"])])
+                world_size = sum(len(config["cluster"][role]) for role in roles)
+                return cls(offset + int(task.get("index", 0)), world_size, balance)
+        return None
+
+    def select(self, items, key, size=None):
+        """
+        Select items of this shard.
+
+        Parameters
+        ----------
+        items: iter
+            Items to select from, e.g. a listing of objects.
+        key: callable
+            Function, which returns the key of an item, e.g. its relative path.
+        size=None: callable
+            Function, which returns the size of an item. Required with `balance`.
+
+        Returns
+        -------
+        iter
+            Selected items, in the order of `items`.
+        """
+        if self.world_size == 1:
+            return iter(items)
+        if not self.balance:
+            return (item for item in items if self.owns(key(item)))
+
+        assert size is not None, "`size` must be provided to balance shards"
+        items = list(items)
+        workers = [(0, rank) for rank in range(self.world_size)]
+        selected = set()
+        for index in sorted(range(len(items)), key=lambda index: (-size(items[index]), key(items[index]))):
+            load, rank = heapq.heappop(workers)
+            if rank == self.rank:
+                selected.add(index)
+            heapq.heappush(workers, (load + size(items[index]), rank))
+        return (item for index, item in enumerate(items) if index in selected)
+
+    def owns(self, key):
+        """
+        Check whether a key belongs to this shard by its hash. With `balance`,
+        the assignment depends on the whole listing, so this only tells, which
+        worker is responsible for a key, which is not listed, e.g. a local file
+        of a deleted object.
+
+        Parameters
+        ----------
+        key: str
+            Key of an item, e.g. its relative path.
+
+        Returns
+        -------
+        bool
+        """
+        return self.world_size == 1 or self._hash(key) % self.world_size == self.rank
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+    def __repr__(self):
+        return "Shard(rank={}, world_size={}, balance={})".format(self.rank, self.world_size, self.balance)
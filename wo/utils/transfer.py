@@ -0,0 +1,286 @@
+import concurrent.futures, collections, threading, logging, itertools, fcntl, os
+
+__all__ = ["TransferConfig", "TransferError", "TransferPool", "download_ranges", "prefetch", "temporary_path"]
+
+logger = logging.getLogger(__name__)
+
+
+class TransferConfig:
+    """ Tunables, shared by all transfers of a storage instance. """
+
+    def __init__(self, concurrency=8, max_pool_connections=None, multipart_threshold=64 * 1024 ** 2,
+        part_size=16 * 1024 ** 2, part_concurrency=4
+    ):
+        """
+        Parameters
+        ----------
+        concurrency=8: int
+            Maximum number of files, transferred at the same time.
+        max_pool_connections=None: int
+            Size of the HTTP connection pool of the shared cloud clients. 
+            Defaults to `concurrency * part_concurrency`.
+        multipart_threshold=64MiB: int
+            Size of the file, starting from which it is transferred in parts.
+        part_size=16MiB: int
+            Size of a single part of a multipart upload or a ranged download.
+        part_concurrency=4: int
+            Maximum number of parts of a single file, transferred at the same time.
+        """
+        assert concurrency >= 1, "`concurrency` must be a positive number"
+        assert part_concurrency >= 1, "`part_concurrency` must be a positive number"
+        self.concurrency = concurrency
+        self.max_pool_connections = max_pool_connections or concurrency * part_concurrency
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.part_concurrency = part_concurrency
+
+
+class TransferError(Exception):
+    """ Raised when one or more files of a batch transfer have failed. """
+
+    def __init__(self, errors):
+        """
+        Parameters
+        ----------
+        errors: List[tuple]
+            A list of 2-element tuples, where the first element is a source location
+            of the failed file and the second element is the raised exception.
+        """
+        self.errors = list(errors)
+        super().__init__("{} file(s) failed to transfer:\n{}".format(
+            len(self.errors), "\n".join("{}: {!r}".format(p, e) for p, e in self.errors)))
+
+
+class TransferPool:
+    """ Bounded worker pool, which runs transfers of a batch of files concurrently. """
+
+    def __init__(self, concurrency=8):
+        """
+        Parameters
+        ----------
+        concurrency=8: int
+            Number of worker threads.
+        """
+        assert concurrency >= 1, "`concurrency` must be a positive number"
+        self.concurrency = concurrency
+
+    def run(self, function, tasks, **kwargs):
+        """
+        Call `function(source, destination, **kwargs)` for each task.
+
+        Tasks are consumed lazily, at most `2 * concurrency` of them are kept in
+        flight, so transfers start before the task iterator is exhausted. A failed
+        task does not interrupt the others.
+
+        Parameters
+        ----------
+        function: callable
+            Function, which transfers a single file.
+        tasks: iter
+            Iterator, which produces a tuple of source and destination locations.
+
+        Returns
+        -------
+        int
+            Number of transferred files.
+
+        Raises
+        ------
+        TransferError
+            Raise if any of the tasks has failed, after all tasks have completed.
+        """
+        errors, count = [], 0
+        tasks = iter(tasks)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = {}
+
+            def submit(limit):
+                for source, destination in itertools.islice(tasks, limit):
+                    future = executor.submit(function, source, destination, **kwargs)
+                    pending[future] = source
+
+            try:
+                submit(2 * self.concurrency)
+                while pending:
+                    done, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        source = pending.pop(future)
+                        count += 1
+                        if future.exception() is not None:
+                            logger.error("Failed to transfer {}: {!r}".format(source, future.exception()))
+                            errors.append((source, future.exception()))
+                    submit(len(done))
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        if errors:
+            raise TransferError(errors)
+        return count
+
+
+def prefetch(function, items, depth, concurrency):
+    """
+    Lazily map function over items in background threads, keeping the order.
+
+    At most `depth` results are computed ahead of the consumer, so memory use 
+    stays bounded however long the iterator is. Results, which have not been 
+    consumed when the iterator is closed, are discarded.
+
+    Parameters
+    ----------
+    function: callable
+        Function, which takes a single item.
+    items: iter
+        Iterator over the items.
+    depth: int
+        Maximum number of results, computed ahead of the consumer.
+    concurrency: int
+        Maximum number of items, processed at the same time.
+
+    Returns
+    -------
+    iter: (item, result)
+    """
+    assert depth >= 1, "`depth` must be a positive number"
+    items = iter(items)
+    queue = collections.deque()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for item in itertools.islice(items, depth):
+                queue.append((item, executor.submit(function, item)))
+            while queue:
+                item, future = queue.popleft()
+                result = future.result()
+                # Schedule the next item before handing the result over, so
+                # that downloads go on while the consumer processes it.
+                for following in itertools.islice(items, 1):
+                    queue.append((following, executor.submit(function, following)))
+                yield item, result
+        finally:
+            for _, future in queue:
+                future.cancel()
+
+
+def download_ranges(destination_path, size, read_range, part_size, concurrency, journal=None, version=None):
+    """
+    Download an object by byte ranges concurrently. 
+
+    Ranges are written with positional writes straight into a preallocated 
+    temporary file, which replaces the destination once all of the ranges 
+    have been downloaded. The temporary file is private to the download, see
+    `temporary_path`. With a journal, it has a stable name instead, so that 
+    a download of the same version of the object by a restarted process 
+    continues from the missing ranges: each range is recorded once it is on 
+    disk, the file is locked while it is written and kept on failure. A 
+    concurrent download to the same path falls back to a private file.
+
+    Parameters
+    ----------
+    destination_path: str
+        Path, where the object should be downloaded.
+    size: int
+        Size of the object in bytes.
+    read_range: callable
+        Function, which takes the first and the last (inclusive) byte offsets 
+        of a range and returns an iterator over chunks of its contents.
+    part_size: int
+        Size of a single range.
+    concurrency: int
+        Maximum number of ranges, downloaded at the same time.
+    journal=None: TransferJournal
+        Journal of the downloaded ranges.
+    version=None: str
+        Version of the object, e.g. its ETag. Required to resume the download.
+    """
+    journal = journal if version is not None else None
+    temporary, descriptor = None, None
+    if journal is not None:
+        temporary, descriptor = _open_resumable(destination_path + ".wo-part")
+        if descriptor is None:
+            logger.debug("{} is being downloaded by another process, not resuming".format(destination_path))
+            journal = None
+    if descriptor is None:
+        temporary = temporary_path(destination_path)
+        descriptor = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    done = set()
+    if journal is not None and os.fstat(descriptor).st_size == size:
+        done = journal.ranges(temporary, version, size, part_size)
+        if done:
+            logger.info("Resuming download of {}, {} of {} bytes are present".format(
+                destination_path, sum(min(part_size, size - start) for start in done), size))
+
+    def download(start):
+        offset, end = start, min(start + part_size, size) - 1
+        for chunk in read_range(start, end):
+            view = memoryview(chunk)
+            while view:
+                written = os.pwrite(descriptor, view, offset)
+                view, offset = view[written:], offset + written
+        if offset != end + 1:
+            raise IOError("Range {}-{} of {} is incomplete".format(start, end, destination_path))
+        if journal is not None:
+            # The range is recorded only once its data survives a crash
+            getattr(os, "fdatasync", os.fsync)(descriptor)
+            journal.add_range(temporary, version, size, part_size, start)
+
+    try:
+        if not done:
+            os.ftruncate(descriptor, 0)
+            _preallocate(descriptor, size)
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+            for _ in executor.map(download, [start for start in range(0, size, part_size) if start not in done]):
+                pass
+    except BaseException:
+        if journal is None:
+            os.remove(temporary)
+        os.close(descriptor)
+        raise
+    # The file is replaced before the lock is released, see `_open_resumable`
+    os.replace(temporary, destination_path)
+    os.close(descriptor)
+    if journal is not None:
+        journal.forget_ranges(temporary)
+
+
+def temporary_path(destination_path):
+    """
+    Get path of a temporary file, private to the calling process and thread,
+    where a download to destination_path is written.
+
+    Parameters
+    ----------
+    destination_path: str
+
+    Returns
+    -------
+    str
+    """
+    return "{}.{}.{}.wo-part".format(destination_path, os.getpid(), threading.get_ident())
+
+
+def _open_resumable(temporary):
+    descriptor = os.open(temporary, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # The file may have replaced the destination, since it was opened
+        if os.fstat(descriptor).st_ino == os.stat(temporary).st_ino:
+            return temporary, descriptor
+    except OSError:
+        pass
+    os.close(descriptor)
+    return temporary, None
+
+
+def _preallocate(descriptor, size):
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            return os.posix_fallocate(descriptor, 0, size)
+        except OSError as e:
+            logger.debug("Failed to preallocate file: {!r}".format(e))
+    os.ftruncate(descriptor, size)